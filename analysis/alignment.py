@@ -0,0 +1,224 @@
+"""
+Alignment of data logged with different time bases onto a common time grid.
+
+The data is linearly interpolated as np.interp does (the first and last
+values are held outside the time range of the source). The position of
+every time of the grid within the source time base (an alignment plan) is
+found only once per time base, and is then applied to all the columns that
+share it as a single array operation, so aligning more columns, or the same
+columns onto a grid with a different rate or time window, is cheap.
+
+The plans can also be saved in a folder (e.g. next to the raw data they
+align), one file per source time base and target grid, and are then loaded
+instead of calculated again (see cached_plan).
+"""
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+
+def time_grid(rate=1, start=0, end=3600):
+    """
+    Returns a uniform time grid
+
+    Parameters:
+    ----------
+    rate: samples per second (e.g. 10 or 0.1)
+        float
+
+    start, end: first and last time of the grid in seconds
+        float
+
+    Returns:
+    -------
+    time: times of the grid
+        np.ndarray
+    """
+    time = np.linspace(start, end, int(round((end - start) * rate)) + 1)
+
+    return time
+
+
+def alignment_plan(source_time, target_time, extrapolate=False):
+    """
+    Finds where every time of a target grid falls within a source time base
+
+    Parameters:
+    ----------
+    source_time: times of the source, in increasing order
+        np.ndarray
+
+    target_time: times to align the source onto
+        np.ndarray
+
+    extrapolate: True to extrapolate the first and last two samples
+                 outside the time range of the source (as interp1d with
+                 fill_value = "extrapolate") instead of holding the first
+                 and last values
+        bool
+
+    Returns:
+    -------
+    plan: "lower" and "upper" (indices of the source samples before and
+          after each target time), "weight" (of the upper sample) and
+          "exact" (target times taken from a single sample: on a sample or,
+          if not extrapolating, outside the time range of the source)
+        dict
+    """
+    source_time = np.asarray(source_time, dtype = "float64")
+    target_time = np.asarray(target_time, dtype = "float64")
+    last = len(source_time) - 1
+
+    lower = np.clip(np.searchsorted(source_time, target_time,
+                                    side = "right") - 1, 0, max(last - 1, 0))
+    upper = np.minimum(lower + 1, last)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        weight = (target_time - source_time[lower]) / (
+            source_time[upper] - source_time[lower])
+
+    # values held before the first and after the last sample
+    if not extrapolate:
+        weight[target_time <= source_time[0]] = 0
+        after = target_time >= source_time[last]
+        lower[after] = last
+        weight[after] = 0
+
+    weight = np.nan_to_num(weight)
+    plan = {"lower": lower,
+            "upper": upper,
+            "weight": weight,
+            "exact": weight == 0}
+
+    return plan
+
+
+def apply_plan(plan, values):
+    """
+    Interpolates the columns of an array with an alignment plan
+
+    Parameters:
+    ----------
+    plan: see alignment_plan
+        dict
+
+    values: values of the source (source times x columns, or a single
+            column)
+        np.ndarray
+
+    Returns:
+    -------
+    aligned: values at the target times (target times x columns, or a
+             single column)
+        np.ndarray
+    """
+    values = np.asarray(values, dtype = "float64")
+    weight = plan["weight"].reshape(-1, *[1] * (values.ndim - 1))
+
+    lower = values[plan["lower"]]
+    aligned = lower + (values[plan["upper"]] - lower) * weight
+
+    # a missing neighbour does not affect the values taken from one sample
+    aligned[plan["exact"]] = lower[plan["exact"]]
+
+    return aligned
+
+
+def time_base_key(time):
+    """
+    Returns a key that identifies a time base (see align_sources)
+    """
+    time = np.ascontiguousarray(time, dtype = "float64")
+
+    return hashlib.blake2b(time.tobytes(), digest_size = 16).hexdigest()
+
+
+def cached_plan(source_time, target_time, folder=None):
+    """
+    Returns the alignment plan of a source time base onto a target grid,
+    from a folder of saved plans if it was already calculated
+
+    Parameters:
+    ----------
+    source_time, target_time: see alignment_plan
+        np.ndarray
+
+    folder: folder of the saved plans (created if it does not exist). None
+            not to save the plan
+        str
+
+    Returns:
+    -------
+    plan: see alignment_plan
+        dict
+    """
+    if folder is None:
+        return alignment_plan(source_time, target_time)
+
+    address = os.path.join(folder, f"{time_base_key(source_time)}_"
+                           f"{time_base_key(target_time)}.npz")
+    if os.path.exists(address):
+        with np.load(address) as saved:
+            plan = {name: saved[name] for name in ["lower", "upper",
+                                                   "weight"]}
+        plan["exact"] = plan["weight"] == 0
+        return plan
+
+    plan = alignment_plan(source_time, target_time)
+    os.makedirs(folder, exist_ok = True)
+    np.savez(address, lower = plan["lower"], upper = plan["upper"],
+             weight = plan["weight"])
+
+    return plan
+
+
+def align_sources(sources, target_time, time_column="testing_time",
+                  plan_folder=None):
+    """
+    Aligns the columns of several data frames onto the same time grid
+
+    Parameters:
+    ----------
+    sources: (data frame, names of the columns to align) of each source
+        list
+
+    target_time: times to align the sources onto
+        np.ndarray
+
+    time_column: name of the time column of the sources and of the output
+        str
+
+    plan_folder: folder of the saved plans (see cached_plan). None not to
+                 save them
+        str
+
+    Returns:
+    -------
+    aligned: time and aligned columns, in the order of the sources. A column
+             found in more than one source keeps its first position and the
+             values of the last source
+        pd.DataFrame
+    """
+    target_time = np.asarray(target_time, dtype = "float64")
+    plans = {}
+    columns = {time_column: target_time}
+
+    for df, names in sources:
+        names = list(names)
+        if not names:
+            continue
+
+        # one plan per time base
+        source_time = df[time_column].to_numpy(dtype = "float64")
+        key = time_base_key(source_time)
+        if key not in plans:
+            plans[key] = cached_plan(source_time, target_time, plan_folder)
+
+        aligned = apply_plan(plans[key], df[names].to_numpy(dtype = "float64"))
+        for i, name in enumerate(names):
+            columns[name] = aligned[:, i]
+
+    aligned = pd.DataFrame(columns)
+
+    return aligned
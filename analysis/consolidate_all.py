@@ -1,117 +1,173 @@
 """
 This script loads all the data, interpolates it to a 1Hz data frame and saves
 it per experiment into a dictionary, which is then saved as an excel file
+
+The data is read from the columnar store (see data_store.py), and only the
+columns that are consolidated are loaded. A family that is not in the store
+yet is imported from its pickle in the processed data folder, and an error
+is raised if an experiment is missing from both. The columns are aligned
+onto the time grid with one alignment plan per time base (see alignment.py),
+so the same data can also be aligned at other rates or in other time
+windows (see aligned_data).
 """
 
 import os
 import pickle
-import numpy as np
+import sys
 import pandas as pd
 
-address_processed_data = (r"C:\Users\s1475174\Documents\Python_Projects\T"
-                          r"hermalRadiation_BREexperiments\processed_data")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from alignment import align_sources, time_grid
+from experiment_registry import address_processed_data, experiments_with
+from data_store import (address_store,
+                        import_pickle,
+                        list_columns,
+                        list_experiments,
+                        load)
+
+experiments = ["Alpha2", "Beta1", "Beta2", "Gamma"]
+
+
+def doorframe_columns(column):
+    """Velocities, mass flows and smoothed neutral plane of the door frame"""
+    return (("V_" in column) or ("mass_in" in column) or
+            ("mass_out" in column) or ("Neutral_Plane_Smooth" in column))
+
+
+def flame_columns(column):
+    """Smoothed flame dimensions (except the ellipse fits and the depth
+    profile)"""
+    return ("time" not in column) and ("ellipse" not in column) and (
+        "profile" not in column) and ("smooth" in column)
+
+
+def other_columns(column):
+    """Every column except the time"""
+    return "time" not in column
+
+
+# families of the store that are consolidated and the columns used from them
+consolidated_families = {"doorframe_ALLdata": doorframe_columns,
+                         "Flame_Dimensions": flame_columns,
+                         "TSC": other_columns,
+                         "temperatures_condensed": other_columns,
+                         "HRR_total": other_columns,
+                         "HRR_internal_massin": other_columns}
+
+# section of the registry of every family (the experiments it must have)
+family_sections = {"doorframe_ALLdata": "door_frame",
+                   "Flame_Dimensions": "video",
+                   "TSC": "tsc",
+                   "temperatures_condensed": "temperatures",
+                   "HRR_total": "hrr",
+                   "HRR_internal_massin": "door_frame"}
+
+
+def stored_experiments(family):
+    """
+    Returns the experiments of a family in the store, importing the family
+    from its pickle in the processed data folder if it is not in the store
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    Returns:
+    -------
+    stored: names of the experiments
+        list
+    """
+    stored = list_experiments(family)
+    if not stored and os.path.exists(os.path.join(address_processed_data,
+                                                  f"{family}.pkl")):
+        import_pickle(family)
+        stored = list_experiments(family)
+
+    return stored
 
-# create dictionary of dataframes and introduce testing time column
-all_data = {"Alpha2": 0, "Beta1": 0, "Beta2": 0, "Gamma": 0}
-for experiment in all_data:
-    all_data[experiment] = pd.DataFrame()
-    all_data[experiment].loc[:, "testing_time"] = np.linspace(0, 3600, 3601)
 
+def aligned_data(rate=1, start=0, end=3600):
+    """
+    Interpolates the processed data of every experiment onto a uniform time
+    grid
 
-# interpolate all the data to a 1Hz frequency and copy into data frame
-for file in os.listdir(address_processed_data):
-    if ".xlsx" in file:
-        continue
-    with open(os.path.join(address_processed_data, file), "rb") as handle:
-        data = pickle.load(handle)
-        for experiment in data.keys():
-            if experiment == "Alpha1":
+    Parameters:
+    ----------
+    rate: samples per second of the grid (e.g. 10 or 0.1)
+        float
+
+    start, end: first and last time of the grid in seconds
+        float
+
+    Returns:
+    -------
+    all_data: data frame of each experiment (testing time and the
+              consolidated columns of every family)
+        dict
+    """
+    # every family must have the experiments of its section of the registry
+    stored = {family: stored_experiments(family)
+              for family in consolidated_families}
+    missing = [f"{family}/{experiment}" for family in consolidated_families
+               for experiment in experiments_with(family_sections[family])
+               if experiment in experiments and
+               experiment not in stored[family]]
+    if missing:
+        raise FileNotFoundError(
+            f"Missing from the store ({address_store}) and from the pickles "
+            f"of the processed data folder: {', '.join(missing)}. Run the "
+            f"stages that save them first (see run_pipeline.py)")
+
+    # columns of every family to align, per experiment
+    sources = {experiment: [] for experiment in experiments}
+    for family, is_consolidated in consolidated_families.items():
+        for experiment in stored[family]:
+            if experiment not in sources:
+                continue
+
+            # only load the columns that are consolidated
+            columns = [column for column in list_columns(family, experiment)
+                       if is_consolidated(column)]
+            if not columns:
                 continue
-            df = data[experiment]
-            # parse door frame data
-            if file == "doorframe_ALLdata.pkl":
-                for column in df.columns:
-                    if ("V_" not in column) and (
-                        "mass_in" not in column) and (
-                        "mass_out" not in column) and (
-                        "Neutral_Plane_Smooth" not in column):
-                        continue
-                    else:
-                        x = all_data[experiment].loc[:, "testing_time"].values
-                        xp = df.loc[:, "testing_time"].values
-                        fp = df.loc[:, column].astype("float64").values
-                        all_data[experiment].loc[:, column] = np.interp(
-                            x, xp, fp)
-
-            # parse flame dimensions data
-            if file == "Flame_Dimensions.pkl":
-                for column in df.columns:
-                    if ("time" in column) or ("ellipse" in column):
-                        continue
-                    elif ("smooth" not in column):
-                        continue
-                    else:
-                        x = all_data[experiment].loc[:, "testing_time"].values
-                        xp = df.loc[:, "testing_time"].values
-                        fp = df.loc[:, column].astype("float64").values
-                        all_data[experiment].loc[:, column] = np.interp(
-                            x, xp, fp)
-
-            # parse data thermal radiation data
-            if file == "TSC.pkl":
-                for column in df.columns:
-                    if ("time" in column):
-                        continue
-                    else:
-                        x = all_data[experiment].loc[:, "testing_time"].values
-                        xp = df.loc[:, "testing_time"].values
-                        fp = df.loc[:, column].values 
-                        all_data[experiment].loc[:, column] = np.interp(
-                            x, xp, fp)
-
-            # parse gas phase temperature data
-            if file == "temperatures_condensed.pkl":
-                for column in df.columns:
-                    if ("time" in column):
-                        continue
-                    else:
-                        x = all_data[experiment].loc[:, "testing_time"].values
-                        xp = df.loc[:, "testing_time"].values
-                        fp = df.loc[:, column].values 
-                        all_data[experiment].loc[:, column] = np.interp(
-                            x, xp, fp)
-
-            # parse the HRR data
-            if file == "HRR_total.pkl":
-                for column in df.columns:
-                    if ("time" in column):
-                        continue
-                    else:
-                        x = all_data[experiment].loc[:, "testing_time"].values
-                        xp = df.loc[:, "testing_time"].values
-                        fp = df.loc[:, column].values 
-                        all_data[experiment].loc[:, column] = np.interp(
-                            x, xp, fp)
-            if file == "HRR_internal_massin.pkl":
-                for column in df.columns:
-                    if ("time" in column):
-                            continue
-                    else:
-                        x = all_data[experiment].loc[:, "testing_time"].values
-                        xp = df.loc[:, "testing_time"].values
-                        fp = df.loc[:, column].values 
-                        all_data[experiment].loc[:, column] = np.interp(
-                            x, xp, fp)
-
-# save as a pickle
-with open(os.path.join(address_processed_data,
-                       "all_data_BREexperiments.pkl"), "wb") as handle:
-    pickle.dump(all_data, handle)
-
-
-# save data into an excel file
-with pd.ExcelWriter (os.path.join(address_processed_data,
-                                  "all_data_BREexperiments.xlsx")) as writer:
-    for experiment in all_data:
-        df = all_data[experiment]
-        df.to_excel(writer, sheet_name=experiment)
\ No newline at end of file
+            sources[experiment].append((load(family, experiment, columns),
+                                        columns))
+
+    # align all the sources of each experiment at once
+    time = time_grid(rate, start, end)
+    all_data = {experiment: align_sources(sources[experiment], time)
+                for experiment in experiments}
+
+    return all_data
+
+
+def consolidate():
+    """
+    Interpolates the processed data of every experiment to 1 Hz and saves it
+    as a pickle and as an excel file in the processed data folder
+
+    Returns:
+    -------
+    None
+    """
+    all_data = aligned_data()
+
+    # save as a pickle
+    with open(os.path.join(address_processed_data,
+                           "all_data_BREexperiments.pkl"), "wb") as handle:
+        pickle.dump(all_data, handle)
+
+
+    # save data into an excel file
+    with pd.ExcelWriter (os.path.join(address_processed_data,
+                                      "all_data_BREexperiments.xlsx")) as writer:
+        for experiment in all_data:
+            df = all_data[experiment]
+            df.to_excel(writer, sheet_name=experiment)
+
+    return None
+
+
+if __name__ == "__main__":
+    consolidate()
@@ -0,0 +1,287 @@
+"""
+Columnar store for the processed data.
+
+Instead of one pickled {experiment: DataFrame} dictionary per variable
+family, every experiment of every family is saved as an uncompressed
+Feather (Arrow) file in processed_data/store/{family}/{experiment}.feather.
+The loader reads only the requested columns and time range, and the files
+are memory-mapped, so loading Neutral_Plane_Smooth for one test does not
+read the rest of the door frame data.
+
+The save functions of the stages write into the store next to the pickles.
+Run this script to create the store from the pickles already in the
+processed data folder.
+
+Requires pyarrow.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from experiment_registry import address_processed_data
+
+address_store = os.path.join(address_processed_data, "store")
+
+
+def dataset_address(family, experiment):
+    """
+    Returns the address of the dataset of one experiment of a family
+
+    Parameters:
+    ----------
+    family: name of the variable family (e.g. "Neutral_Plane" or "TSC")
+        str
+
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    address: address of the feather file
+        str
+    """
+    address = os.path.join(address_store, family, f"{experiment}.feather")
+
+    return address
+
+
+def save_dataset(family, experiment, df):
+    """
+    Saves the data of one experiment of a family into the store
+
+    The index of the data frame is not saved, the names of the columns are
+    saved as strings and numeric columns of dtype object as floats.
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    experiment: name of the experiment
+        str
+
+    df: data of the experiment
+        pd.DataFrame
+
+    Returns:
+    -------
+    None
+    """
+    address = dataset_address(family, experiment)
+    os.makedirs(os.path.dirname(address), exist_ok = True)
+
+    df = df.rename(columns = str)
+
+    # numeric columns stored as objects (e.g. values returned by interp1d)
+    # are saved as floats
+    for column in df.columns[df.dtypes == object]:
+        try:
+            df[column] = df[column].astype("float64")
+        except (TypeError, ValueError):
+            pass
+
+    table = pa.Table.from_pandas(df, preserve_index = False)
+
+    # uncompressed so that the file can be memory-mapped when loading
+    feather.write_feather(table, address, compression = "uncompressed")
+
+    return None
+
+
+def save_family(family, data):
+    """
+    Saves a {experiment: DataFrame} dictionary into the store
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    data: data frame of each experiment
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    for experiment, df in data.items():
+        save_dataset(family, experiment, df)
+
+    return None
+
+
+def list_experiments(family):
+    """
+    Returns the experiments saved in the store for a family
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    Returns:
+    -------
+    experiments: names of the experiments
+        list
+    """
+    folder = os.path.join(address_store, family)
+    if not os.path.isdir(folder):
+        return []
+
+    experiments = sorted(os.path.splitext(file)[0]
+                         for file in os.listdir(folder)
+                         if file.endswith(".feather"))
+
+    return experiments
+
+
+def list_columns(family, experiment):
+    """
+    Returns the columns of a dataset without loading its data
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    columns: names of the columns
+        list
+    """
+    # feather files are Arrow IPC files, whose schema is read from the footer
+    with pa.memory_map(dataset_address(family, experiment)) as source:
+        columns = pa.ipc.open_file(source).schema.names
+
+    return list(columns)
+
+
+def load(family, experiment, columns=None, time_range=None,
+         time_column="testing_time"):
+    """
+    Loads data of one experiment from the store
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    experiment: name of the experiment
+        str
+
+    columns: columns to load (None for all). The time column is always
+             loaded
+        list
+
+    time_range: (start, end) in seconds. Only rows with start <= time <= end
+                are loaded (None for all)
+        tuple
+
+    time_column: name of the time column
+        str
+
+    Returns:
+    -------
+    df: requested data
+        pd.DataFrame
+    """
+    address = dataset_address(family, experiment)
+
+    if columns is not None:
+        columns = [time_column] + [column for column in columns
+                                   if column != time_column]
+    table = feather.read_table(address, columns = columns,
+                               memory_map = True)
+
+    if time_range is not None:
+        time = table.column(time_column).to_numpy()
+        mask = (time >= time_range[0]) & (time <= time_range[1])
+        rows = np.flatnonzero(mask)
+
+        # a contiguous range (sorted time) is a zero-copy slice
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            table = table.slice(rows[0], len(rows))
+        else:
+            table = table.filter(pa.array(mask))
+
+    df = table.to_pandas()
+
+    return df
+
+
+def load_family(family, columns=None, time_range=None):
+    """
+    Loads a {experiment: DataFrame} dictionary from the store, as the pickled
+    files in the processed data folder
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    columns: columns to load (None for all)
+        list
+
+    time_range: (start, end) in seconds (None for all)
+        tuple
+
+    Returns:
+    -------
+    data: data frame of each experiment
+        dict
+    """
+    data = {experiment: load(family, experiment, columns, time_range)
+            for experiment in list_experiments(family)}
+
+    return data
+
+
+def import_pickle(family):
+    """
+    Saves the pickled {experiment: DataFrame} dictionary of a family in the
+    processed data folder ({family}.pkl) into the store
+
+    Parameters:
+    ----------
+    family: name of the variable family
+        str
+
+    Returns:
+    -------
+    None
+    """
+    # read_pickle also reads pickles written by older versions of pandas
+    data = pd.read_pickle(os.path.join(address_processed_data,
+                                       f"{family}.pkl"))
+    print(f"Saving {family}.pkl into the store")
+    save_family(family, data)
+
+    return None
+
+
+def import_pickles():
+    """
+    Saves the pickled {experiment: DataFrame} dictionaries of the processed
+    data folder into the store, so the store can be created without running
+    the analysis again
+
+    Returns:
+    -------
+    None
+    """
+    for file in sorted(os.listdir(address_processed_data)):
+        if not file.endswith(".pkl") or file.startswith("all_data"):
+            continue
+        import_pickle(os.path.splitext(file)[0])
+
+    return None
+
+
+if __name__ == "__main__":
+    import_pickles()
@@ -0,0 +1,91 @@
+"""
+Benchmarks the vectorized door flow calculation (door_flow) against the
+original row by row loop used in calculation_massflow, and checks that both
+return the same values for the five tests
+"""
+
+import pickle
+import time
+import numpy as np
+
+# import my own functions
+from data_processing import (calculation_area,
+                             calculation_velocity,
+                             calculation_massflow)
+
+
+def massflow_loop(df):
+    """
+    Original implementation of the inflow and outflow calculation, iterating
+    over every row of the data frame. Kept only for benchmarking.
+
+    Parameters:
+    ----------
+    df: pandas DataFrame containing the M_ columns (already calculated)
+        pd.DataFrame
+
+    Returns:
+    -------
+    df_loop: copy of df with mass_in, mass_out, mass_average and
+             hrr_internal_allmassin
+        pd.DataFrame
+    """
+    df_loop = df.copy()
+    mass_columns = [f"M_{height}" for height in range(20,200,20)]
+
+    for index, row in df_loop.loc[:, mass_columns].iterrows():
+        positives = 0
+        negatives = 0
+        for item in row:
+            if item > 0:
+                positives += item
+            else:
+                negatives += np.abs(item)
+        df_loop.loc[index, "mass_in"] = positives
+        df_loop.loc[index, "mass_out"] = negatives
+    df_loop.loc[:, "mass_average"] = df_loop.loc[
+        :, ["mass_in", "mass_out"]].mean(axis = 1)
+    df_loop.loc[:, "hrr_internal_allmassin"] = 0.233 * df_loop.loc[
+        :, "mass_in"] * 13100
+
+    return df_loop
+
+
+# upload the data from the excel spreadsheets
+file_address = ("C:/Users/s1475174/Documents/Python_Projects/Thermal"
+                r"Radiation_BREexperiments/unprocessed_data/door_frame/D"
+                r"oorFrame_unprocessed.pkl")
+with open(file_address, "rb") as handle:
+    DoorFrame = pickle.load(handle)
+
+areas = calculation_area()
+output_columns = ["mass_in", "mass_out", "mass_average",
+                  "hrr_internal_allmassin"]
+
+for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
+
+    # same preparation as in main_doorframe.py
+    df = DoorFrame[test_name].iloc[:, :22].copy()
+    df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"] * 60
+    calculation_velocity(df, test_name)
+
+    # vectorized implementation (also calculates the M_ columns)
+    start = time.time()
+    calculation_massflow(df, areas)
+    time_vectorized = time.time() - start
+
+    # original loop
+    start = time.time()
+    df_loop = massflow_loop(df)
+    time_loop = time.time() - start
+
+    # check that both implementations agree
+    same_values = np.allclose(df.loc[:, output_columns].values,
+                              df_loop.loc[:, output_columns].values,
+                              equal_nan = True)
+
+    print(f"{test_name}: {len(df)} samples. loop {np.round(time_loop, 3)} s,"
+          f" vectorized {np.round(time_vectorized, 3)} s"
+          f" (x{np.round(time_loop / time_vectorized, 1)}). Same values:"
+          f" {same_values}")
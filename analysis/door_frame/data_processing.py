@@ -3,10 +3,33 @@ Functions used to calculate velocity and mass flow at the door from the
 doorway pressure probe and temperature data
 """
 
-from scipy.signal import savgol_filter
+import os
+import sys
 import numpy as np
+import pandas as pd
 from scipy import interpolate
 
+# import my own functions
+from sensor_repair import repair_sensors
+
+# the experiment registry is shared by all the analysis folders
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from alignment import alignment_plan, apply_plan
+from experiment_registry import experiment_config
+from smoothing import family_settings, smooth, smooth_family
+
+# pressure transducers used for each probe
+omega = ["P1.20", "P2.40", "P3.40", "P4.40", "P5.60", "P6.80"]
+gems = ["P7.100", "P8.120", "P9.140", "P10.160", "P11.160", "P12.160",
+        "P13.180"]
+
+# probe of each height with a single probe (0.4 and 1.6 m are averaged from
+# the probes listed in the registry)
+height_probes = {"PP_20": "P1.20", "PP_60": "P5.60", "PP_80": "P6.80",
+                 "PP_100": "P7.100", "PP_120": "P8.120", "PP_140": "P9.140",
+                 "PP_180": "P13.180"}
+
+
 def calculation_area(number_of_heights=9, delta_height=0.2, door_width=0.8):
     """
     Returns a list with the equivalent area fraction of the door for each
@@ -36,7 +59,7 @@ def calculation_area(number_of_heights=9, delta_height=0.2, door_width=0.8):
 
 
 def calculation_velocity(df, test_name, gamma=0.94, omega_factor=2.49,
-                         gems_factor=10, window_length=31, polyorder=2):
+                         gems_factor=10, window_length=None, polyorder=None):
     """
     Calculates gas flow velocity from the pressure probe readings
     
@@ -55,15 +78,17 @@ def calculation_velocity(df, test_name, gamma=0.94, omega_factor=2.49,
         int
 
     window_length: the length of the filter window for the Savitsky-Golay
-                   filter
+                   filter. None for the setting of the door_pressure family
+                   (see smoothing.py)
         int
         
     polyorder: the order of the polynomial used to fit the samples with the
-               Savitsky-Golay filter
+               Savitsky-Golay filter. None for the setting of the
+               door_pressure family
         int
 
-    test_name: name of the test. Required to perform individualized cleaning
-               of the data
+    test_name: name of the test. Used to retrieve the probe groupings and
+               sensor repairs of the test from the experiment registry
         str
         
     Returns:
@@ -71,20 +96,13 @@ def calculation_velocity(df, test_name, gamma=0.94, omega_factor=2.49,
     df: pandas DataFrame with the formatted and calculated data
         pd.DataFrame
     """
+    config = experiment_config(test_name, "door_frame")
+
     # create a mask to access values before start test
     mask_prestart = df.loc[:, "testing_time"] < 0
     
-    # fix temperature TDD.40 for Beta2 by interpolating from the other TCs
-    if test_name == "Beta2":
-        
-        # extrapolate to obtain temperature at 0.4 meters
-        df.loc[:, "TDD.40"] = df.loc[:, ["TDD.60", "TDD.80", "TDD.100",
-                                         "TDD.120", "TDD.140", "TDD.160",
-                                         "TDD.180"]].apply(
-                                             lambda row: extrapolate(
-                                                 [60, 80, 100, 120, 140, 160,
-                                                  180], row.values, 40),
-                                             axis=1)
+    # fix damaged thermocouples (TDD.40 for Beta2) from the other TCs
+    repair_sensors(df, config["temperature_repairs"])
     
     # ambient temperature is mean value before start and assing to h = 20 cm.
     temperature_columns = []
@@ -99,16 +117,63 @@ def calculation_velocity(df, test_name, gamma=0.94, omega_factor=2.49,
     pressure_columns = [x for x in df.columns if "P" in x]
     pressure_prestart_mean = df.loc[mask_prestart, pressure_columns].mean()
     
+    # calculate the zeroed values and the pressure difference
+    pressure_differences(df, pressure_prestart_mean, omega_factor,
+                         gems_factor)
+
+    # drop all nan values before continuing with smoothing
+    df.dropna(axis = 0, inplace = True)
+
+    # smooth all the pressure readings at once (savitsky-golay filter)
+    smooth_family(df, [column for column in df if "DeltaP" in column],
+                  "door_pressure", window_length = window_length,
+                  polyorder = polyorder)
+
+    # pressure, temperature, density and velocity at each height
+    velocity_profiles(df, config, temperature_ambient, gamma)
+
+    # calculate neutral plane by interpolating the velocity values
+    columns_velocity = []
+    for column in df:
+        if "V_" in column:
+            columns_velocity.append(column)
+    heights = np.linspace(0.2,1.8,9)
+
+    df.loc[:, "Neutral_Plane"] = neutral_plane(
+        df.loc[:, columns_velocity].to_numpy(dtype = "float64"), heights)
+    df.loc[:, "Neutral_Plane_Smooth"] = df.loc[
+        :,"Neutral_Plane"].rolling(30).mean()
+    
+    return
+
+
+def pressure_differences(df, pressure_prestart_mean, omega_factor=2.49,
+                         gems_factor=10):
+    """
+    Zeroes the pressure channels and converts them into pressure differences
+    (the _zeroed and _DeltaP columns)
+
+    Parameters:
+    ----------
+    df: pandas DataFrame with the raw test data. Modified in place
+        pd.DataFrame
+
+    pressure_prestart_mean: mean value of each pressure channel before the
+                            start of the test
+        pd.Series
+
+    omega_factor, gems_factor: see calculation_velocity
+
+    Returns:
+    -------
+    None
+    """
     # calculate the zeroed values for the pressure channels
     for column in pressure_prestart_mean.index:
         df.loc[:, f"{column}_zeroed"] = df.loc[:, column] - pressure_prestart_mean[column]
     
-    # determine which pressure transducers were used for each sensor
-    omega = ["P1.20", "P2.40", "P3.40", "P4.40", "P5.60", "P6.80"]
-    gems = ["P7.100", "P8.120", "P9.140", "P10.160", "P11.160", "P12.160",
-            "P13.180"]
-
-    # calculate the pressure difference from the zeroed values
+    # calculate the pressure difference from the zeroed values (see omega
+    # and gems for the transducer of each probe)
     for column in df:
         if "zeroed" not in column:
             pass
@@ -119,140 +184,49 @@ def calculation_velocity(df, test_name, gamma=0.94, omega_factor=2.49,
             elif probe in gems:
                 df.loc[:, f"{probe}_DeltaP"] = df.loc[:, column] * gems_factor
 
-    # drop all nan values before continuing with smoothing
-    df.dropna(axis = 0, inplace = True)
+    return
 
-    # smooth the pressure readings using a savitsky-golay filter
-    for column in df:
-        if "DeltaP" in column:
-            df.loc[:, f"{column}_smooth"] = savgol_filter(df.loc[:, column],
-                                                          window_length, polyorder)
-
-    # average probes 0.4 from the ground
-    if test_name in ["Alpha1","Alpha2", "Beta2", "Gamma"]:
-        df.loc[:, "PP_40"] = df.loc[:, ["P2.40_DeltaP_smooth",
-                                        "P3.40_DeltaP_smooth",
-                                        "P4.40_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Beta1"]:
-        df.loc[:, "PP_40"] = df.loc[:, ["P2.40_DeltaP_smooth",
-                                        "P4.40_DeltaP_smooth"]].mean(axis = 1)
-
-    # average probes 1.6 meters from the ground
-    if test_name in ["Alpha1","Alpha2"]:
-        df.loc[:, "PP_160"] = df.loc[
-            :, ["P12.160_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Beta1"]:
-        df.loc[:, "PP_160"] = df.loc[
-            :, ["P10.160_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Beta2"]:
-        df.loc[:, "PP_160"] = df.loc[
-            :, ["P10.160_DeltaP_smooth",
-                "P12.160_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Gamma"]:
-        df.loc[:, "PP_160"] = df.loc[
-            :, ["P10.160_DeltaP_smooth", "P11.160_DeltaP_smooth",
-                "P12.160_DeltaP_smooth"]].mean(axis = 1)
+
+def velocity_profiles(df, config, temperature_ambient, gamma=0.94):
+    """
+    Calculates the pressure difference (PP_), temperature (TC_), density
+    (Rho_) and velocity (V_) at each height from the smoothed pressure
+    differences. Every sample is calculated independently of the others
+
+    Parameters:
+    ----------
+    df: pandas DataFrame with the _DeltaP_smooth columns. Modified in place
+        pd.DataFrame
+
+    config: door_frame section of the registry of the test
+        dict
+
+    temperature_ambient: ambient temperature (mean before the start)
+        float
+
+    gamma: calibration constant for the pressure probe
+        float
+
+    Returns:
+    -------
+    None
+    """
+    # average probes 0.4 and 1.6 meters from the ground
+    df.loc[:, "PP_40"] = df.loc[:, [f"{probe}_DeltaP_smooth" for probe in
+                                    config["probes_40"]]].mean(axis = 1)
+    df.loc[:, "PP_160"] = df.loc[:, [f"{probe}_DeltaP_smooth" for probe in
+                                     config["probes_160"]]].mean(axis = 1)
         
     # assing new columns with useful data to their respective heights. 
     # I do this instead of renaming to preserve all data
-    column_new_name = ["PP_20", "PP_60", "PP_80", "PP_100", "PP_120", "PP_140",
-                       "PP_180"]
-    for i, column_old_name in enumerate(
-            ["P1.20_DeltaP_smooth", "P5.60_DeltaP_smooth",
-             "P6.80_DeltaP_smooth", "P7.100_DeltaP_smooth",
-             "P8.120_DeltaP_smooth", "P9.140_DeltaP_smooth",
-             "P13.180_DeltaP_smooth"]):
-            df.loc[:, column_new_name[i]] = df.loc[:, column_old_name]
+    for column_new_name, probe in height_probes.items():
+        df.loc[:, column_new_name] = df.loc[:, f"{probe}_DeltaP_smooth"]
 
     """
     Clean up the data for each test by interpolating and extrapolating to
-    substitute damaged data
-    """
-    if test_name == "Alpha2":
-        # between 5 min and 15 min, interpolate PP120 and PP140
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 5) & (
-            df.loc[:, "testing_time"]/60 < 15)
-        df.loc[mask_interpolation, "PP_120"] = df.loc[
-            mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(120,[100,160], row.values), axis = 1)
-        df.loc[mask_interpolation, "PP_140"] = df.loc[
-            mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(140,[100,160], row.values), axis = 1)
-
-        # between 0 and 5 min, then between 12 and 20 and after 40 minutes
-        # extrapolate for PP180
-        mask_extrapolation = (((df.loc[:, "testing_time"]/60 > 0) &
-                               (df.loc[:, "testing_time"]/60 < 6)) |
-                              ((df.loc[:, "testing_time"]/60 > 12) &
-                               (df.loc[:, "testing_time"]/60 < 21))|
-                              (df.loc[:, "testing_time"]/60 > 40))
-        df.loc[mask_extrapolation, "PP_180"] = df.loc[
-            mask_extrapolation, ["PP_100", "PP_120", "PP_140","PP_160"]].apply(
-                lambda row: extrapolate([100,120,140,160], row.values, 180),
-                axis = 1)
-
-    if test_name == "Beta1":
-
-        # between 10 min and 20 min extrapolate PP_120 and PP_140
-        mask_extrapolation = (df.loc[:, "testing_time"]/60 > 10) & (
-            df.loc[:, "testing_time"]/60 < 20)
-        df.loc[mask_extrapolation, "PP_20"] = df.loc[mask_extrapolation,
-                                                     ["PP_60", "PP_80"]].apply(
-                lambda row: extrapolate([60,80], row.values, 20), axis = 1)
-        df.loc[mask_extrapolation, "PP_40"] = df.loc[mask_extrapolation,
-                                                     ["PP_60", "PP_80"]].apply(
-                lambda row: extrapolate([60,80], row.values, 40), axis = 1)
-
-        # between 7 min and 11 min interpolate PP_100
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 7) & (
-            df.loc[:, "testing_time"]/60 < 11)
-        df.loc[mask_interpolation, "PP_100"] = df.loc[
-            mask_interpolation, ["PP_80", "PP_120"]].apply(
-                lambda row: np.interp(100,[80,120], row.values), axis = 1)
-
-        # between 6 min and 20 min extrapolate PP_160 and PP_180
-        mask_extrapolation = (df.loc[:, "testing_time"]/60 > 6) & (
-            df.loc[:, "testing_time"] / 60 < 60)
-        df.loc[mask_extrapolation, "PP_160"] = df.loc[
-            mask_extrapolation, ["PP_20", "PP_40","PP_60", "PP_80", "PP_100",
-                                 "PP_120", "PP_140"]].apply(
-                lambda row: extrapolate([20,40,60,80,100,120,140], row.values,
-                                        160), axis = 1)
-        df.loc[mask_extrapolation, "PP_180"] = df.loc[
-            mask_extrapolation, ["PP_20", "PP_40","PP_60", "PP_80", "PP_100",
-                                 "PP_120", "PP_140", "PP_160"]].apply(
-                lambda row: extrapolate([20,40,60,80,100,120,140, 160],
-                                        row.values, 180), axis = 1)
-
-    if test_name == "Beta2":
-        
-        # between 0 min and 15 min extrapolate PP_180
-        mask_extrapolation = (df.loc[:, "testing_time"]/60 > 0) & (
-            df.loc[:, "testing_time"]/60 < 15)
-        df.loc[mask_extrapolation, "PP_180"] = df.loc[
-            mask_extrapolation, ["PP_20", "PP_40","PP_60", "PP_80", "PP_100",
-                                 "PP_120", "PP_140", "PP_160"]].apply(
-                lambda row: extrapolate([20,40,60,80,100,120,140, 160],
-                                        row.values, 180), axis = 1)
-            
-        # between 8 min and 10 min interpolate PP_100
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 8) & (
-            df.loc[:, "testing_time"]/60 < 10)
-        df.loc[mask_interpolation, "PP_100"] = df.loc[
-            mask_interpolation, ["PP_80", "PP_120"]].apply(
-                lambda row: np.interp(100,[80,120], row.values), axis = 1)
-
-    if test_name == "Gamma":
-
-        # between 7 min and 16 min interpolate PP_120 and PP_140
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 7) & (
-            df.loc[:, "testing_time"]/60 < 16)
-        df.loc[mask_interpolation, "PP_120"] = df.loc[
-            mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(120,[100,160],row.values), axis = 1)
-        df.loc[mask_interpolation, "PP_140"] = df.loc[
-            mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(140,[100,160],row.values), axis = 1)
+    substitute damaged data (see sensor_repair.py and the registry)
+    """
+    repair_sensors(df, config["pressure_repairs"])
 
     # If delta p is positive then temperature equals ambient temperature
     df.loc[:, "TC_20"] = df.loc[:, "TDD.20"]
@@ -282,18 +256,6 @@ def calculation_velocity(df, test_name, gamma=0.94, omega_factor=2.49,
         df.loc[mask_negatives,f"V_{height}"] = df.loc[
             mask_negatives,f"V_{height}"] * -1
 
-    # calculate neutral plane by interpolating the velocity values
-    columns_velocity = []
-    for column in df:
-        if "V_" in column:
-            columns_velocity.append(column)
-    heights = np.linspace(0.2,1.8,9)
-
-    df.loc[:, "Neutral_Plane"] = df.loc[:, columns_velocity].apply(
-        lambda row: find_neutral_plane(row, heights), axis = 1)
-    df.loc[:, "Neutral_Plane_Smooth"] = df.loc[
-        :,"Neutral_Plane"].rolling(30).mean()
-    
     return
 
 
@@ -366,6 +328,52 @@ def find_neutral_plane(x,y):
     return neutral_plane
 
 
+def neutral_plane(velocities, heights):
+    """
+    Interpolates the velocity profiles of all samples at once to find the
+    neutral plane.
+    
+    Gives the same result as find_neutral_plane applied row by row: the
+    neutral plane is where the line through the first negative velocity
+    (ignoring the lowest probe) and the velocity right below it crosses
+    zero. If there is no such negative velocity the result is nan.
+    
+    Parameters:
+    ----------
+    velocities: velocities at each height (n_samples x n_heights)
+        np.ndarray
+        
+    heights: heights of the probes
+        np.ndarray
+        
+    Returns:
+    -------
+    neutral_plane: height of the neutral plane for each sample
+        np.ndarray
+    """
+    velocities = np.asarray(velocities, dtype = "float64")
+    heights = np.asarray(heights, dtype = "float64")
+    
+    # index of the first negative velocity above the lowest probe
+    negatives = velocities[:, 1:] < 0
+    found = negatives.any(axis = 1)
+    i_neg = negatives.argmax(axis = 1) + 1
+    i_pos = i_neg - 1
+    
+    rows = np.arange(velocities.shape[0])
+    v_pos = velocities[rows, i_pos]
+    v_neg = velocities[rows, i_neg]
+    h_pos = heights[i_pos]
+    h_neg = heights[i_neg]
+    
+    # evaluate the straight line through both points at zero velocity
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        neutral_plane = h_pos - v_pos * (h_neg - h_pos) / (v_neg - v_pos)
+    neutral_plane[~found] = np.nan
+    
+    return neutral_plane
+
+
 def calculation_massflow(df, areas, Cd=0.68):
     """
     Calculates the mass flow from the velocities and areas already determined.
@@ -391,40 +399,84 @@ def calculation_massflow(df, areas, Cd=0.68):
         df.loc[:, f"M_{height}"] = Cd * df.loc[
             :, f"Rho_{height}"] * df.loc[:,f"V_{height}"] * areas[i]
 
-    mass_columns = [x for x in df.columns if "M_" in x]
+    mass_columns = [f"M_{height}" for height in range(20,200,20)]
 
-    # sum positives and negatives to obtain mass_in and mass_out (slow and dirty implementation)
-    for index, row in df.loc[:, mass_columns].iterrows():
-        positives = 0
-        negatives = 0
-        for item in row:
-            if item > 0:
-                positives += item
-            else:
-                negatives += np.abs(item)
-        df.loc[index, "mass_in"] = positives
-        df.loc[index, "mass_out"] = negatives
-    df.loc[:, "mass_average"] = df.loc[:, ["mass_in", "mass_out"]].mean(axis = 1)
+    # sum positives and negatives to obtain mass_in and mass_out
+    mass_in, mass_out, mass_average, hrr_internal_allmassin = door_flow(
+        df.loc[:, mass_columns].to_numpy(dtype = "float64"))
+    df.loc[:, "mass_in"] = mass_in
+    df.loc[:, "mass_out"] = mass_out
+    df.loc[:, "mass_average"] = mass_average
 
     """
     Calculate HRR assuming all O2 in gets oxydised
     (I later use the juanalyser as well to run a different HRR calc)
     """
-    df.loc[:, "hrr_internal_allmassin"] = 0.233 * df.loc[:, "mass_in"] * 13100
-            
+    df.loc[:, "hrr_internal_allmassin"] = hrr_internal_allmassin
+
     return
 
 
+def door_flow(mass_flows, Y_O2=0.233, E_O2=13100):
+    """
+    Calculates the inflow, outflow, mean flow and the internal HRR (assuming
+    all O2 in gets oxydised) for every sample at once
+    
+    Parameters:
+    ----------
+    mass_flows: mass flow through each door segment (n_samples x n_heights).
+                Positive values are inflow and negative values outflow
+        np.ndarray
+        
+    Y_O2: mass fraction of oxygen in the incoming air
+        float
+        
+    E_O2: energy released per unit mass of oxygen consumed (kJ/kg)
+        float
+    
+    Returns:
+    -------
+    mass_in: total inflow of gases to the compartment
+        np.ndarray
+        
+    mass_out: total outflow of gases from the compartment
+        np.ndarray
+        
+    mass_average: mean of inflow and outflow
+        np.ndarray
+        
+    hrr_internal_allmassin: internal HRR assuming all O2 in gets oxydised
+        np.ndarray
+    """
+    mass_flows = np.asarray(mass_flows, dtype = "float64")
+    inflow = mass_flows > 0
+    
+    # any value that is not positive (including nan) counts as outflow
+    mass_in = np.where(inflow, mass_flows, 0).sum(axis = 1)
+    mass_out = np.abs(np.where(inflow, 0, mass_flows)).sum(axis = 1)
+    
+    # mass_in is never nan, so (as pandas does) skip a nan mass_out in the mean
+    mass_average = np.where(np.isnan(mass_out), mass_in,
+                            (mass_in + mass_out) / 2)
+    hrr_internal_allmassin = Y_O2 * mass_in * E_O2
+    
+    return mass_in, mass_out, mass_average, hrr_internal_allmassin
+
+
 def calculation_HRR(df, df_mass, alpha = 1.105, 
                     XO2_0 = 0.2095, XCO2_0 = 0.0004 ,E_02 = 13100, ECO_CO2 = 17600,
                     M_a = 29, M_O2 = 32, M_CO2 = 44, M_CO = 28,
-                    window_length = 31, polyorder = 2):
+                    window_length = None, polyorder = None):
     """
     Calculates the HRR from Oxygen Calorimetry using the mass flow calculated
     above and the gas analysis results from the Juanalyser
     
     Parameters:
     ----------
+    window_length, polyorder: settings of the Savitsky-Golay filter of the
+                              gases. None for those of the gas_analysis
+                              family (see smoothing.py)
+        int
     
     
     Returns:
@@ -436,39 +488,251 @@ def calculation_HRR(df, df_mass, alpha = 1.105,
     This is because this was logged with a different
     datalogger and so it has a different time stamp
     """
-    mass_interpolating_function = interpolate.interp1d(
-        x=df_mass.loc[:, "testing_time"],
-        y=df_mass.loc[:, "mass_average"],
-        kind='linear',
-        fill_value='extrapolate')
-
-    df.loc[:, "mass_average"] = mass_interpolating_function(
-        df.loc[:, "testing_time"])
+    df.loc[:, "mass_average"] = aligned_mass_flow(
+        df.loc[:, "testing_time"].to_numpy(dtype = "float64"),
+        df_mass.loc[:, "testing_time"].to_numpy(dtype = "float64"),
+        df_mass.loc[:, "mass_average"].to_numpy(dtype = "float64"))
     
-    # first, smoothe O2, CO and CO2 values
-    for column_name in ["CO2", "CO", "O2"]:
-        df.loc[:, f"{column_name}_smooth"] = savgol_filter(
-            df.loc[:,column_name], window_length, polyorder)
+    # first, smoothe O2, CO and CO2 values (all at once)
+    smooth_family(df, ["CO2", "CO", "O2"], "gas_analysis",
+                  window_length = window_length, polyorder = polyorder)
         
     # convert from % volume to mole (assumes ideal gas so % volume == % mol)
     for column_name in ["CO2_smooth", "CO_smooth", "O2_smooth"]:
         df.loc[:, f"{column_name}_mol"] = df.loc[:, column_name]/100
         
-    # calculate oxygen depletion factor
-    XO2 = df.loc[:, "O2_smooth_mol"]
-    XCO = df.loc[:, "CO_smooth_mol"]
-    XCO2 = df.loc[:, "CO2_smooth_mol"]
-    
-    df.loc[:, "oxygen_depletion_factor"] = (
-        XO2_0 * (1 - XCO2 - XCO) - XO2 * (1 - XCO2_0)) / (
-            XO2_0 * (1 - XO2 - XCO2 - XCO))
+    # calculate oxygen depletion factor and the HRR
+    O2_dep_fac, hrr_internal = oxygen_calorimetry(
+        df.loc[:, "O2_smooth_mol"].to_numpy(dtype = "float64"),
+        df.loc[:, "CO_smooth_mol"].to_numpy(dtype = "float64"),
+        df.loc[:, "CO2_smooth_mol"].to_numpy(dtype = "float64"),
+        df.loc[:, "mass_average"].to_numpy(dtype = "float64"),
+        alpha, XO2_0, XCO2_0, E_02, ECO_CO2, M_a, M_O2)
+    df.loc[:, "oxygen_depletion_factor"] = O2_dep_fac
+    df.loc[:, "hrr_internal"] = hrr_internal
+
+    return
+
+
+def oxygen_calorimetry(XO2, XCO, XCO2, me, alpha=1.105, XO2_0=0.2095,
+                       XCO2_0=0.0004, E_02=13100, ECO_CO2=17600, M_a=29,
+                       M_O2=32):
+    """
+    Calculates the oxygen depletion factor and the HRR from the gas
+    concentrations and the mass flow (see calculation_HRR)
+
+    Parameters:
+    ----------
+    XO2, XCO, XCO2: mole fractions of O2, CO and CO2
+        np.ndarray
+
+    me: mean mass flow through the door
+        np.ndarray
+
+    alpha, XO2_0, XCO2_0, E_02, ECO_CO2, M_a, M_O2: see calculation_HRR
+
+    Returns:
+    -------
+    O2_dep_fac: oxygen depletion factor
+        np.ndarray
 
-    # calculate the HRR
-    O2_dep_fac = df.loc[:, "oxygen_depletion_factor"]
-    me = df.loc[:, "mass_average"]
+    hrr_internal: HRR
+        np.ndarray
+    """
+    O2_dep_fac = (XO2_0 * (1 - XCO2 - XCO) - XO2 * (1 - XCO2_0)) / (
+        XO2_0 * (1 - XO2 - XCO2 - XCO))
     
-    df.loc[:, "hrr_internal"] = (E_02 * O2_dep_fac - (
+    hrr_internal = (E_02 * O2_dep_fac - (
         (ECO_CO2 - E_02)*((1 - O2_dep_fac)/2) * (XCO/XO2))) * (
             (me/(1 + O2_dep_fac*(alpha - 1)))*(M_O2/M_a)*XO2_0)
 
-    return
+    return O2_dep_fac, hrr_internal
+
+
+def aligned_mass_flow(testing_time, mass_time, mass_average, offset=0):
+    """
+    Interpolates the mean mass flow through the door at the testing times of
+    another logger (linearly, and extrapolated outside the door frame data
+    as interp1d with fill_value = 'extrapolate')
+
+    Parameters:
+    ----------
+    testing_time: testing times of the other logger in seconds
+        np.ndarray
+
+    mass_time: testing times of the door frame data in seconds
+        np.ndarray
+
+    mass_average: mean mass flow through the door (see door_flow)
+        np.ndarray
+
+    offset: added to testing_time, e.g. an error of the ignition offset of
+            the other logger (any shape that broadcasts with testing_time)
+        float or np.ndarray
+
+    Returns:
+    -------
+    me: mean mass flow at the testing times (broadcast shape of
+        testing_time and offset)
+        np.ndarray
+    """
+    times = np.asarray(testing_time, dtype = "float64") + np.asarray(
+        offset, dtype = "float64")
+
+    # a single plan for the times of every offset
+    plan = alignment_plan(mass_time, times.ravel(), extrapolate = True)
+    me = apply_plan(plan, mass_average).reshape(times.shape)
+
+    return me
+
+
+def hrr_kernel(XO2, XCO, XCO2, testing_time, mass_time, mass_average,
+               alpha=1.105, Cd=0.68, E_02=13100, XO2_0=0.2095, offset=0,
+               Cd_mass=0.68, XCO2_0=0.0004, ECO_CO2=17600, M_a=29,
+               M_O2=32):
+    """
+    Calculates the oxygen depletion factor and the HRR from oxygen
+    calorimetry for many sets of parameters at once (e.g. Monte-Carlo
+    samples or a sensitivity study, see hrr_bands)
+
+    The parameters alpha, Cd, E_02, XO2_0 and offset are single values or
+    arrays with one value per set (broadcast together), and every set is
+    evaluated at all the samples in a single array operation. The mass flow
+    is proportional to the discharge coefficient, so the mass flow
+    calculated with Cd_mass is scaled instead of calculated again.
+
+    Parameters:
+    ----------
+    XO2, XCO, XCO2: mole fractions of O2, CO and CO2 (smoothed)
+        np.ndarray
+
+    testing_time: testing times of the gas analysis in seconds
+        np.ndarray
+
+    mass_time, mass_average: testing times and mean mass flow of the door
+                             frame data (see aligned_mass_flow)
+        np.ndarray
+
+    alpha, E_02, XO2_0: see calculation_HRR
+        float or np.ndarray
+
+    Cd: discharge coefficient of the door
+        float or np.ndarray
+
+    offset: error of the ignition offset of the gas analysis in seconds
+            (see aligned_mass_flow)
+        float or np.ndarray
+
+    Cd_mass: discharge coefficient used to calculate mass_average (see
+             calculation_massflow)
+        float
+
+    XCO2_0, ECO_CO2, M_a, M_O2: see calculation_HRR
+        float
+
+    Returns:
+    -------
+    O2_dep_fac: oxygen depletion factor (sets x samples, or samples if all
+                the parameters are single values)
+        np.ndarray
+
+    hrr_internal: HRR (same shape as O2_dep_fac)
+        np.ndarray
+    """
+    alpha, Cd, E_02, XO2_0, offset = [
+        parameter[..., None] for parameter in np.broadcast_arrays(*[
+            np.asarray(parameter, dtype = "float64")
+            for parameter in [alpha, Cd, E_02, XO2_0, offset]])]
+
+    me = aligned_mass_flow(testing_time, mass_time, mass_average,
+                           offset) * (Cd / Cd_mass)
+    O2_dep_fac, hrr_internal = oxygen_calorimetry(
+        XO2, XCO, XCO2, me, alpha, XO2_0, XCO2_0, E_02, ECO_CO2, M_a, M_O2)
+
+    return O2_dep_fac, hrr_internal
+
+
+def sample_parameters(n_sets, uncertainties, seed=None):
+    """
+    Draws sets of parameters of hrr_kernel from normal distributions
+
+    Parameters:
+    ----------
+    n_sets: number of sets
+        int
+
+    uncertainties: (mean, standard deviation) of each parameter, e.g.
+                   {"alpha": (1.105, 0.05), "Cd": (0.68, 0.05),
+                   "offset": (0, 5)}. The other parameters keep their
+                   default values
+        dict
+
+    seed: seed of the random numbers (None for a different draw each time)
+        int
+
+    Returns:
+    -------
+    parameters: values of each parameter (one per set)
+        dict
+    """
+    rng = np.random.default_rng(seed)
+    parameters = {name: rng.normal(mean, deviation, n_sets)
+                  for name, (mean, deviation) in uncertainties.items()}
+
+    return parameters
+
+
+def hrr_bands(df, df_mass, parameters, quantiles=(0.05, 0.5, 0.95),
+              Cd_mass=0.68, window_length=None, polyorder=None):
+    """
+    Calculates bands of the HRR from oxygen calorimetry over many sets of
+    parameters (see calculation_HRR for a single set)
+
+    Parameters:
+    ----------
+    df: gas analysis (testing_time, CO2, CO and O2 in % volume)
+        pd.DataFrame
+
+    df_mass: door frame data with the testing_time and mass_average
+        pd.DataFrame
+
+    parameters: values of the parameters of hrr_kernel, one per set (see
+                sample_parameters, or e.g. {"alpha": np.linspace(1, 1.2, 21)}
+                for a sensitivity study)
+        dict
+
+    quantiles: quantiles of the HRR over the sets at every sample
+        tuple
+
+    Cd_mass: see hrr_kernel
+        float
+
+    window_length, polyorder: see calculation_HRR
+
+    Returns:
+    -------
+    bands: testing_time and hrr_internal_p<quantile as a percentage> (e.g.
+           hrr_internal_p5, hrr_internal_p50, hrr_internal_p95)
+        pd.DataFrame
+    """
+    testing_time = df.loc[:, "testing_time"].to_numpy(dtype = "float64")
+
+    # the gases are smoothed once for all the sets
+    gases = smooth(df.loc[:, ["CO2", "CO", "O2"]].to_numpy(dtype = "float64"),
+                   **family_settings("gas_analysis",
+                                     window_length = window_length,
+                                     polyorder = polyorder))
+    XCO2, XCO, XO2 = (gases / 100).T
+
+    _, hrr_internal = hrr_kernel(
+        XO2, XCO, XCO2, testing_time,
+        df_mass.loc[:, "testing_time"].to_numpy(dtype = "float64"),
+        df_mass.loc[:, "mass_average"].to_numpy(dtype = "float64"),
+        Cd_mass = Cd_mass, **parameters)
+    values = np.nanquantile(np.atleast_2d(hrr_internal), quantiles, axis = 0)
+
+    bands = pd.DataFrame({"testing_time": testing_time,
+                          **{f"hrr_internal_p{100 * quantile:g}": value
+                             for quantile, value in zip(quantiles, values)}})
+
+    return bands
@@ -0,0 +1,376 @@
+"""
+Streaming mode of the door frame analysis, for logger files too long to be
+held in memory.
+
+The logger data is read in chunks (from a csv file or from a data frame)
+and goes through the same calculations as calculation_velocity and
+calculation_massflow, in two passes:
+
+1. the samples before the start of the test are read to calculate the
+   ambient temperature and the mean of every pressure channel (stops at the
+   first sample after the start)
+2. every chunk is zeroed, smoothed, converted into velocities and mass flows
+   and appended to the output file. The Savitsky-Golay filter holds the last
+   rows of each chunk until the rows after them arrive (see
+   smoothing.smooth_stream), and the last values of the neutral plane are
+   carried over to the next chunk for its rolling mean, so the output is the
+   same as analysing the whole test at once
+
+The output is an Arrow (feather) file written one chunk at a time, with the
+same columns as DoorFrame_full (see main_doorframe.py), so only a few
+chunks are ever in memory.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+# import my own functions
+from data_processing import (calculation_area,
+                             calculation_massflow,
+                             neutral_plane,
+                             pressure_differences,
+                             velocity_profiles)
+from sensor_repair import repair_sensors
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import experiment_config
+from smoothing import open_stream, smooth_stream
+
+# samples of each chunk
+chunk_size = 10000
+
+# samples of the rolling mean of the neutral plane
+neutral_plane_window = 30
+
+
+def csv_chunks(file_address, chunk_size=chunk_size):
+    """
+    Reads a logger csv file (with the same columns as the door frame sheets
+    of the summary spreadsheet) in chunks
+
+    Parameters:
+    ----------
+    file_address: address of the csv file
+        str
+
+    chunk_size: samples of each chunk
+        int
+
+    Yields:
+    -------
+    chunk: next samples
+        pd.DataFrame
+    """
+    with pd.read_csv(file_address, chunksize = chunk_size) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def frame_chunks(df, chunk_size=chunk_size):
+    """
+    Splits the logger data already in a data frame into chunks
+
+    Parameters:
+    ----------
+    df: door frame data of a test (a sheet of the summary spreadsheet)
+        pd.DataFrame
+
+    chunk_size: samples of each chunk
+        int
+
+    Yields:
+    -------
+    chunk: next samples
+        pd.DataFrame
+    """
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def prepare_chunk(chunk):
+    """
+    Keeps the pressure probe and temperature columns of a chunk and converts
+    the testing time into seconds (as main_doorframe.analyse_doorframe)
+
+    Parameters:
+    ----------
+    chunk: samples of the logger data
+        pd.DataFrame
+
+    Returns:
+    -------
+    df: testing time (s), pressure probes and temperatures
+        pd.DataFrame
+    """
+    df = chunk.iloc[:, :22].copy()
+    df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"] * 60
+
+    return df
+
+
+def prestart_state(chunks, config):
+    """
+    Calculates the ambient temperature and the mean of every pressure
+    channel before the start of the test (first pass)
+
+    Parameters:
+    ----------
+    chunks: chunks of the logger data (see csv_chunks), in order of time
+        iterable
+
+    config: door_frame section of the registry of the test
+        dict
+
+    Returns:
+    -------
+    prestart: "temperature_ambient" and "pressure_means" (pd.Series)
+        dict
+    """
+    sums, counts = None, None
+    for chunk in chunks:
+        df = prepare_chunk(chunk)
+        repair_sensors(df, config["temperature_repairs"])
+        columns = [column for column in df if "TDD" in column or
+                   "P" in column]
+        before = df.loc[df.loc[:, "testing_time"] < 0, columns].astype(
+            "float64")
+        if sums is None:
+            sums = pd.Series(0.0, index = columns)
+            counts = pd.Series(0, index = columns)
+        sums += before.sum()
+        counts += before.notna().sum()
+
+        # the test has started
+        if len(before) < len(df):
+            break
+
+    means = sums / counts
+    temperature_columns = [column for column in means.index
+                           if "TDD" in column]
+    prestart = {"temperature_ambient": means[temperature_columns].mean(),
+                "pressure_means": means.drop(temperature_columns)}
+
+    return prestart
+
+
+def open_door_stream(test_name, prestart, output_address, gamma=0.94,
+                     omega_factor=2.49, gems_factor=10, window_length=None,
+                     polyorder=None, Cd=0.68):
+    """
+    Opens the stream of the second pass of the analysis of a test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    prestart: see prestart_state
+        dict
+
+    output_address: address of the output feather file
+        str
+
+    gamma, omega_factor, gems_factor, window_length, polyorder: see
+        data_processing.calculation_velocity
+
+    Cd: see data_processing.calculation_massflow
+        float
+
+    Returns:
+    -------
+    stream: state of the stream
+        dict
+    """
+    stream = {"config": experiment_config(test_name, "door_frame"),
+              "prestart": prestart,
+              "gamma": gamma,
+              "omega_factor": omega_factor,
+              "gems_factor": gems_factor,
+              "Cd": Cd,
+              "areas": calculation_area(),
+              "smoothing": open_stream("door_pressure",
+                                       window_length = window_length,
+                                       polyorder = polyorder),
+              "neutral_plane": np.zeros(0),
+              "output_address": output_address,
+              "writer": None,
+              "schema": None,
+              "rows": 0}
+
+    return stream
+
+
+def process_chunk(stream, chunk, final=False):
+    """
+    Analyses the next chunk of the logger data of a test and appends the
+    samples completed to the output file
+
+    Parameters:
+    ----------
+    stream: see open_door_stream
+        dict
+
+    chunk: next samples (None if there are no more)
+        pd.DataFrame
+
+    final: True for the last chunk
+        bool
+
+    Returns:
+    -------
+    None
+    """
+    prestart = stream["prestart"]
+    df = None
+    if chunk is not None:
+        df = prepare_chunk(chunk)
+        repair_sensors(df, stream["config"]["temperature_repairs"])
+        df["TDD.20"] = prestart["temperature_ambient"]
+        pressure_differences(df, prestart["pressure_means"],
+                             stream["omega_factor"], stream["gems_factor"])
+        df.dropna(axis = 0, inplace = True)
+
+    # smooth the pressure differences across the chunks
+    columns = None if df is None else [column for column in df
+                                       if "DeltaP" in column]
+    df = smooth_stream(stream["smoothing"], df, columns, final)
+    if len(df) == 0:
+        return None
+
+    velocity_profiles(df, stream["config"], prestart["temperature_ambient"],
+                      stream["gamma"])
+
+    # neutral plane, with the rolling mean continued from the previous chunk
+    columns_velocity = [column for column in df if "V_" in column]
+    values = neutral_plane(df.loc[:, columns_velocity].to_numpy(
+        dtype = "float64"), np.linspace(0.2, 1.8, 9))
+    carried = np.concatenate([stream["neutral_plane"], values])
+    df.loc[:, "Neutral_Plane"] = values
+    df.loc[:, "Neutral_Plane_Smooth"] = pd.Series(carried).rolling(
+        neutral_plane_window).mean().to_numpy()[-len(values):]
+    stream["neutral_plane"] = carried[-(neutral_plane_window - 1):]
+
+    calculation_massflow(df, stream["areas"], stream["Cd"])
+    write_chunk(stream, df)
+
+    return None
+
+
+def write_chunk(stream, df):
+    """
+    Appends the samples of a chunk to the output file
+
+    Parameters:
+    ----------
+    stream: see open_door_stream
+        dict
+
+    df: analysed samples
+        pd.DataFrame
+
+    Returns:
+    -------
+    None
+    """
+    table = pa.Table.from_pandas(df, preserve_index = False)
+    if stream["writer"] is None:
+        stream["schema"] = table.schema
+        stream["writer"] = pa.ipc.new_file(stream["output_address"],
+                                           table.schema)
+    stream["writer"].write_table(table.cast(stream["schema"]))
+    stream["rows"] += len(df)
+
+    return None
+
+
+def close_door_stream(stream):
+    """
+    Analyses the samples still held by a stream and closes its output file
+
+    Parameters:
+    ----------
+    stream: see open_door_stream
+        dict
+
+    Returns:
+    -------
+    rows: number of samples written
+        int
+    """
+    process_chunk(stream, None, final = True)
+    if stream["writer"] is not None:
+        stream["writer"].close()
+
+    return stream["rows"]
+
+
+def stream_doorframe(test_name, read_chunks, output_address, **settings):
+    """
+    Analyses the logger data of a test chunk by chunk, writing the results
+    into a feather file as they are calculated
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    read_chunks: function that returns a new iterator over the chunks of
+                 the logger data every time it is called (e.g.
+                 lambda: csv_chunks(file_address)), since the data is read
+                 twice
+        callable
+
+    output_address: address of the output feather file
+        str
+
+    settings: see open_door_stream
+
+    Returns:
+    -------
+    rows: number of samples written
+        int
+    """
+    config = experiment_config(test_name, "door_frame")
+    prestart = prestart_state(read_chunks(), config)
+
+    stream = open_door_stream(test_name, prestart, output_address, **settings)
+    for chunk in read_chunks():
+        process_chunk(stream, chunk)
+    rows = close_door_stream(stream)
+
+    return rows
+
+
+def load_stream_output(output_address, columns=None):
+    """
+    Loads the output of stream_doorframe
+
+    Parameters:
+    ----------
+    output_address: address of the feather file
+        str
+
+    columns: names of the columns to load (None for all)
+        list
+
+    Returns:
+    -------
+    df: analysed samples
+        pd.DataFrame
+    """
+    df = feather.read_feather(output_address, columns = columns)
+
+    return df
+
+
+if __name__ == "__main__":
+    # e.g. python door_stream.py Gamma Gamma_logger.csv Gamma_doorframe.feather
+    test_name, file_address, output_address = sys.argv[1:4]
+    rows = stream_doorframe(test_name, lambda: csv_chunks(file_address),
+                            output_address)
+    print(f"{rows} samples of {test_name} written to {output_address}")
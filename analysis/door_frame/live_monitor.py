@@ -0,0 +1,535 @@
+"""
+Live monitor of the door frame during a test.
+
+Follows the logger data as it is written (a csv file the logger appends to,
+or a local socket sending the same csv rows) and calculates, for every
+sample as soon as it arrives, the velocities, neutral plane, mass flows and
+internal HRR of the door frame (and the HRR from oxygen calorimetry if the
+feed has the CO2, CO and O2 columns of the gas analysis).
+
+The calculations are those of data_processing.py, with a state of constant
+size instead of the whole test:
+
+- the mean of every pressure channel and the ambient temperature are the
+  running means of the samples before the start of the test (fixed after
+  the start)
+- the pressure differences and the gases are smoothed with a causal
+  Savitsky-Golay filter (the polynomial fitted to the last window_length
+  samples evaluated at the newest one), kept in a ring buffer
+- the rolling mean of the neutral plane is taken from a ring buffer of its
+  last 30 values
+
+So the results differ from those of the offline analysis only because the
+smoothing only uses past samples.
+
+Every result is passed to a publish function (by default printed) with the
+time taken to calculate it since the sample was received.
+
+Run as python live_monitor.py test_name file.csv, or test_name host:port to
+read from a socket. serve_csv replays a csv file through a socket at the
+logger rate, as a stand-in for the logger.
+"""
+
+import os
+import socket
+import sys
+import time
+import numpy as np
+from scipy.signal import savgol_coeffs
+
+# import my own functions
+from data_processing import (calculation_area,
+                             door_flow,
+                             gems,
+                             height_probes,
+                             neutral_plane,
+                             omega,
+                             oxygen_calorimetry)
+from sensor_repair import probe_height, repair_weights, window_mask
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import experiment_config
+from smoothing import family_settings
+
+# heights of the door frame (cm)
+heights = list(range(20, 200, 20))
+
+# samples of the rolling mean of the neutral plane
+neutral_plane_window = 30
+
+# columns of the gas analysis (% volume)
+gas_columns = ["CO2", "CO", "O2"]
+
+# time between two reads of a csv file that has no new rows (s)
+poll_interval = 0.05
+
+
+def open_filter(family, n_channels, **settings):
+    """
+    Opens a causal Savitsky-Golay filter (see filter_sample)
+
+    Parameters:
+    ----------
+    family: family of the smoothed variables (see smoothing.py), for the
+            window length and the order of the polynomial
+        str
+
+    n_channels: number of channels filtered together
+        int
+
+    settings: window_length and polyorder instead of those of the family
+        int
+
+    Returns:
+    -------
+    filter_state: "coefficients" for every number of samples up to the
+                  window length, "ring" buffer of the last samples,
+                  "position" of the next sample in it and "count" of samples
+                  received
+        dict
+    """
+    settings = family_settings(family, **settings)
+    window_length, polyorder = settings["window_length"], settings["polyorder"]
+
+    # fewer samples than the window at the start: fit all the samples
+    coefficients = [savgol_coeffs(n, min(polyorder, n - 1), pos = n - 1,
+                                  use = "dot")
+                    for n in range(1, window_length + 1)]
+    filter_state = {"coefficients": coefficients,
+                    "ring": np.zeros((window_length, n_channels)),
+                    "position": 0,
+                    "count": 0}
+
+    return filter_state
+
+
+def filter_sample(filter_state, values):
+    """
+    Adds a sample to a causal Savitsky-Golay filter and returns its
+    smoothed value
+
+    Parameters:
+    ----------
+    filter_state: see open_filter
+        dict
+
+    values: value of each channel
+        np.ndarray
+
+    Returns:
+    -------
+    smoothed: smoothed value of each channel
+        np.ndarray
+    """
+    ring = filter_state["ring"]
+    ring[filter_state["position"]] = values
+    filter_state["position"] = (filter_state["position"] + 1) % len(ring)
+    filter_state["count"] = min(filter_state["count"] + 1, len(ring))
+
+    # the samples in the order they were received
+    count = filter_state["count"]
+    samples = np.roll(ring, -filter_state["position"], axis = 0)[-count:]
+    smoothed = filter_state["coefficients"][count - 1] @ samples
+
+    return smoothed
+
+
+def prepare_repairs(repairs, columns):
+    """
+    Converts the repairs of the registry (see sensor_repair.py) into indices
+    and weights of the values of a sample
+
+    Parameters:
+    ----------
+    repairs: repairs of the registry
+        list
+
+    columns: names of the values of the sample
+        list
+
+    Returns:
+    -------
+    prepared: (target, low source, high source, low weight, high weight,
+              windows) of every repair
+        list
+    """
+    prepared = []
+    for repair in repairs:
+        sources = repair["sources"]
+        (i_low, i_high), (w_low, w_high) = repair_weights(
+            [probe_height(column) for column in sources],
+            probe_height(repair["target"]))
+        prepared.append((columns.index(repair["target"]),
+                         columns.index(sources[i_low]),
+                         columns.index(sources[i_high]),
+                         w_low, w_high, repair["windows"]))
+
+    return prepared
+
+
+def repair_sample(values, repairs, testing_time):
+    """
+    Substitutes the values of the damaged sensors of a sample (in place)
+
+    Parameters:
+    ----------
+    values: values of the sample
+        np.ndarray
+
+    repairs: see prepare_repairs
+        list
+
+    testing_time: testing time of the sample in seconds
+        float
+
+    Returns:
+    -------
+    None
+    """
+    for target, low, high, w_low, w_high, windows in repairs:
+        if window_mask(np.array([testing_time]), windows)[0]:
+            values[target] = w_low * values[low] + w_high * values[high]
+
+    return None
+
+
+def open_monitor(test_name, header, gamma=0.94, omega_factor=2.49,
+                 gems_factor=10, window_length=None, polyorder=None,
+                 Cd=0.68):
+    """
+    Opens the monitor of a test
+
+    Parameters:
+    ----------
+    test_name: name of the test (for its door_frame section of the registry)
+        str
+
+    header: names of the columns of the feed (as the door frame sheets of
+            the summary spreadsheet: the time in minutes, the pressure
+            probes, the TDD thermocouples and optionally CO2, CO and O2)
+        list
+
+    gamma, omega_factor, gems_factor, window_length, polyorder: see
+        data_processing.calculation_velocity
+
+    Cd: see data_processing.calculation_massflow
+        float
+
+    Returns:
+    -------
+    monitor: state of the monitor
+        dict
+    """
+    config = experiment_config(test_name, "door_frame")
+    header = [column.strip() for column in header]
+    probes = [column for column in header if column in omega + gems]
+    temperatures = [column for column in header if column.startswith("TDD")]
+    pressures = [f"PP_{height}" for height in heights]
+
+    monitor = {
+        "gamma": gamma,
+        "Cd": Cd,
+        "areas": np.array(calculation_area()),
+
+        # positions of the columns of the feed
+        "time": header.index("Time [min]"),
+        "probes": [header.index(probe) for probe in probes],
+        "temperatures": [header.index(column) for column in temperatures],
+        "gases": ([header.index(column) for column in gas_columns]
+                  if all(column in header for column in gas_columns)
+                  else None),
+
+        # pressure differences and temperatures of each height
+        "factors": np.array([omega_factor if probe in omega else gems_factor
+                             for probe in probes]),
+        "averaged": {heights.index(40): [probes.index(probe) for probe in
+                                         config["probes_40"]],
+                     heights.index(160): [probes.index(probe) for probe in
+                                          config["probes_160"]]},
+        "single": {heights.index(probe_height(column)): probes.index(probe)
+                   for column, probe in height_probes.items()},
+        "height_temperatures": [temperatures.index(f"TDD.{height}")
+                                if f"TDD.{height}" in temperatures else None
+                                for height in heights],
+        "temperature_repairs": prepare_repairs(config["temperature_repairs"],
+                                               temperatures),
+        "pressure_repairs": prepare_repairs(config["pressure_repairs"],
+                                            pressures),
+
+        # running means before the start
+        "pressure_sums": np.zeros(len(probes)),
+        "pressure_counts": np.zeros(len(probes)),
+        "temperature_sums": np.zeros(len(temperatures)),
+        "temperature_counts": np.zeros(len(temperatures)),
+
+        # causal smoothing and rolling mean of the neutral plane
+        "pressure_filter": open_filter("door_pressure", len(probes),
+                                       window_length = window_length,
+                                       polyorder = polyorder),
+        "gas_filter": open_filter("gas_analysis", len(gas_columns)),
+        "neutral_plane": np.full(neutral_plane_window, np.nan),
+        "neutral_plane_position": 0,
+        "samples": 0}
+
+    return monitor
+
+
+def process_sample(monitor, values):
+    """
+    Calculates the door flow of the next sample of the feed
+
+    Parameters:
+    ----------
+    monitor: see open_monitor
+        dict
+
+    values: values of the sample, in the order of the header (nan for the
+            missing ones)
+        np.ndarray
+
+    Returns:
+    -------
+    record: testing_time, V_ and M_ of each height, Neutral_Plane,
+            Neutral_Plane_Smooth, mass_in, mass_out, mass_average,
+            hrr_internal_allmassin and, if the feed has the gases,
+            oxygen_depletion_factor and hrr_internal. None if the sample
+            has missing values (as the rows dropped by calculation_velocity)
+        dict
+    """
+    testing_time = values[monitor["time"]] * 60
+    pressures = values[monitor["probes"]]
+    temperatures = values[monitor["temperatures"]].copy()
+    repair_sample(temperatures, monitor["temperature_repairs"], testing_time)
+
+    # running means before the start of the test
+    if testing_time < 0:
+        for sums, counts, channel in [
+                ("pressure_sums", "pressure_counts", pressures),
+                ("temperature_sums", "temperature_counts", temperatures)]:
+            valid = ~np.isnan(channel)
+            monitor[sums][valid] += channel[valid]
+            monitor[counts][valid] += 1
+    if np.isnan(pressures).any() or np.isnan(temperatures).any():
+        return None
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        pressure_means = monitor["pressure_sums"] / monitor["pressure_counts"]
+        temperature_ambient = np.mean(monitor["temperature_sums"] /
+                                      monitor["temperature_counts"])
+
+    # zeroed and smoothed pressure differences
+    delta_p = filter_sample(monitor["pressure_filter"],
+                            (pressures - pressure_means) * monitor["factors"])
+
+    # pressure difference of each height
+    PP = np.zeros(len(heights))
+    for i, probes in monitor["averaged"].items():
+        PP[i] = delta_p[probes].mean()
+    for i, probe in monitor["single"].items():
+        PP[i] = delta_p[probe]
+    repair_sample(PP, monitor["pressure_repairs"], testing_time)
+
+    # temperature (ambient if the flow goes in), density and velocity
+    TC = np.array([temperature_ambient if i is None else temperatures[i]
+                   for i in monitor["height_temperatures"]])
+    TC[PP > 0] = temperature_ambient
+    Rho = 353 / (TC + 273)
+    V = monitor["gamma"] * (2 * np.abs(PP) / Rho)**0.5
+    V[PP < 0] *= -1
+
+    # neutral plane and its rolling mean
+    plane = neutral_plane(V[None, :], np.array(heights) / 100)[0]
+    monitor["neutral_plane"][monitor["neutral_plane_position"]] = plane
+    monitor["neutral_plane_position"] = (
+        monitor["neutral_plane_position"] + 1) % neutral_plane_window
+    monitor["samples"] += 1
+    plane_smooth = np.nan
+    if monitor["samples"] >= neutral_plane_window:
+        plane_smooth = monitor["neutral_plane"].mean()
+
+    # mass flows
+    M = monitor["Cd"] * Rho * V * monitor["areas"]
+    mass_in, mass_out, mass_average, hrr_internal_allmassin = [
+        value[0] for value in door_flow(M[None, :])]
+
+    record = {"testing_time": testing_time,
+              **{f"V_{height}": V[i] for i, height in enumerate(heights)},
+              "Neutral_Plane": plane,
+              "Neutral_Plane_Smooth": plane_smooth,
+              **{f"M_{height}": M[i] for i, height in enumerate(heights)},
+              "mass_in": mass_in,
+              "mass_out": mass_out,
+              "mass_average": mass_average,
+              "hrr_internal_allmassin": hrr_internal_allmassin}
+
+    # oxygen calorimetry, if the feed has the gases
+    if monitor["gases"] is not None:
+        gases = values[monitor["gases"]]
+        if not np.isnan(gases).any():
+            XCO2, XCO, XO2 = filter_sample(monitor["gas_filter"], gases) / 100
+            record["oxygen_depletion_factor"], record["hrr_internal"] = (
+                oxygen_calorimetry(XO2, XCO, XCO2, mass_average))
+
+    return record
+
+
+def parse_row(line):
+    """
+    Converts a csv row into values (nan for the empty ones)
+    """
+    values = np.array([float(value) if value.strip() else np.nan
+                       for value in line.split(",")])
+
+    return values
+
+
+def tail_csv(file_address, idle_timeout=None):
+    """
+    Follows a csv file that a logger is appending rows to
+
+    Parameters:
+    ----------
+    file_address: address of the csv file
+        str
+
+    idle_timeout: seconds without new rows after which it stops (None to
+                  follow the file forever)
+        float
+
+    Yields:
+    -------
+    line: header, and then every complete row as it is written
+        str
+    """
+    pending = ""
+    last_row = time.monotonic()
+    with open(file_address) as handle:
+        while True:
+            line = handle.readline()
+            if line:
+                pending += line
+                if pending.endswith("\n"):
+                    yield pending.rstrip("\r\n")
+                    pending = ""
+                    last_row = time.monotonic()
+                continue
+            if (idle_timeout is not None and
+                    time.monotonic() - last_row > idle_timeout):
+                return
+            time.sleep(poll_interval)
+
+
+def socket_rows(host, port):
+    """
+    Reads csv rows sent through a local socket (e.g. by serve_csv)
+
+    Parameters:
+    ----------
+    host, port: address of the logger
+        str, int
+
+    Yields:
+    -------
+    line: header, and then every row as it is received
+        str
+    """
+    with socket.create_connection((host, port)) as connection:
+        with connection.makefile("r") as handle:
+            for line in handle:
+                yield line.rstrip("\r\n")
+
+
+def serve_csv(file_address, host="localhost", port=5025, rate=1):
+    """
+    Sends the rows of a csv file through a local socket at the logger rate,
+    as a stand-in for the logger (to one connection)
+
+    Parameters:
+    ----------
+    file_address: address of the csv file
+        str
+
+    host, port: address to listen on
+        str, int
+
+    rate: rows sent per second (None to send them all at once)
+        float
+
+    Returns:
+    -------
+    None
+    """
+    with socket.create_server((host, port)) as server:
+        connection, _ = server.accept()
+        with connection, open(file_address) as handle:
+            for i, line in enumerate(handle):
+                connection.sendall(line.encode())
+                if rate is not None and i > 0:
+                    time.sleep(1 / rate)
+
+    return None
+
+
+def print_record(record):
+    """
+    Prints the main results of a sample (default publish function)
+    """
+    text = (f"t = {record['testing_time']:8.1f} s  "
+            f"NP = {record['Neutral_Plane_Smooth']:5.2f} m  "
+            f"in = {record['mass_in']:6.3f} kg/s  "
+            f"out = {record['mass_out']:6.3f} kg/s  "
+            f"HRR (all O2 in) = {record['hrr_internal_allmassin']:8.1f} kW")
+    if "hrr_internal" in record:
+        text += f"  HRR (O2) = {record['hrr_internal']:8.1f} kW"
+    print(f"{text}  [{1000 * record['latency']:.2f} ms]")
+
+    return None
+
+
+def run_monitor(test_name, lines, publish=print_record, **settings):
+    """
+    Monitors a test from a feed of csv rows
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    lines: header and rows of the feed (see tail_csv and socket_rows)
+        iterable
+
+    publish: function called with every record (see process_sample), which
+             also has the "latency" (s) from the reception of the sample
+        callable
+
+    settings: see open_monitor
+
+    Returns:
+    -------
+    samples: number of samples published
+        int
+    """
+    lines = iter(lines)
+    monitor = open_monitor(test_name, next(lines).split(","), **settings)
+
+    samples = 0
+    for line in lines:
+        received = time.perf_counter()
+        if not line.strip():
+            continue
+        record = process_sample(monitor, parse_row(line))
+        if record is not None:
+            record["latency"] = time.perf_counter() - received
+            publish(record)
+            samples += 1
+
+    return samples
+
+
+if __name__ == "__main__":
+    test_name, source = sys.argv[1:3]
+    if os.path.exists(source):
+        lines = tail_csv(source)
+    else:
+        host, port = source.rsplit(":", 1)
+        lines = socket_rows(host, int(port))
+    run_monitor(test_name, lines)
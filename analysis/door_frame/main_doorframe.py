@@ -1,62 +1,88 @@
 """
 This script analyses door frame data (pressure probes and temperatures) to
 calculate mass flow, neutral plane height and internal HRR.
+
+The analysis of each test is cached (see stage_cache.py), so it is only
+recalculated when the raw data, the door_frame section of the test in the
+experiment registry, the settings of the analysis (see doorframe_settings)
+or its code change.
 """
 
+import os
 import pickle
+import sys
 
 # import my own functions
 from data_processing import (calculation_area,
                              calculation_velocity,
                              calculation_massflow,
                              calculation_HRR)
+from sensor_repair import repair_sensors
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import (address_doorframe_raw,
+                                 address_processed_data,
+                                 experiment_config,
+                                 experiments_with)
+from alignment import alignment_plan
+from data_store import save_family
+from smoothing import family_settings
+from stage_cache import (cached_stage, function_defaults, saved_results,
+                         stage_code)
+
+# names of the files saved in the processed data folder
+data_names = ["Velocities", "Neutral_Plane", "Mass_Flow", "Door_Temperatures",
+              "HRR_internal_massin", "HRR_internal_juanalyser"]
+address_doorframe_fulldata = os.path.join(address_processed_data,
+                                          "doorframe_ALLdata.pkl")
+
+
+def analyse_doorframe(test_name):
+    """
+    Calculates velocities, neutral plane, mass flow and internal HRR for one
+    test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    results: data frames with the data saved in the processed data folder
+             (keys in data_names) and all the door frame data (DoorFrame_full)
+        dict
+    """
+    config = experiment_config(test_name, "door_frame")
+    results = {}
+
+    # upload the raw data (see uploadraw_pickleandsave.py)
+    with open(address_doorframe_raw, "rb") as handle:
+        DoorFrame = pickle.load(handle)
 
-DoorFrame = {}
-DoorFrame_full = {}
-
-# dictionaries used to save the data separately in the data processed folder
-Velocities = {}
-Temperatures = {}
-Neutral_Plane = {}
-Mass_Flow = {}
-HRR_internal_massin = {}    
-HRR_internal_juanalyser = {}
-
-# upload the data from the excel spreadsheets
-file_address = ("C:/Users/s1475174/Documents/Python_Projects/Thermal"
-                r"Radiation_BREexperiments/unprocessed_data/door_frame/D"
-                r"oorFrame_unprocessed.pkl")
-with open(file_address, "rb") as handle:
-    DoorFrame = pickle.load(handle)
-
-# iterate over the four tests to be analysed
-for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
-    
-    print(f"Analysing experiment {test_name}")
-    
     # extract data and divide into temperature/pressure_probe and gas analysis
     df_full = DoorFrame[test_name]
     df = df_full.iloc[:, :22].copy()
-    
+
     # start with analysis of temperature/pressure_probe data
     df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
-    
+
     # modify testing time to show in seconds
     df.loc[:, "testing_time"] = df.loc[:, "testing_time"] * 60
-    
+
     # calculate areas
     areas = calculation_area()
-    
+
     # calculate velocities
     calculation_velocity(df, test_name)
-    
+
     # calculate massflow
     calculation_massflow(df, areas)
-    
-    # store in DoorFrame_full for plotting below
-    DoorFrame_full[test_name] = df
-    
-    # save data into independent dictionaries
+
+    # store in DoorFrame_full for plotting
+    results["DoorFrame_full"] = df
+
+    # save data into independent data frames
     v_columns = [col for col in df.columns if "V_" in col]
     m_columns = [col for col in df.columns if "mass_" in col]
     t_columns = [col for col in df.columns if "TC_" in col]
@@ -64,56 +90,139 @@ for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
         lst.append("testing_time")
     np_columns = ["testing_time", "Neutral_Plane", "Neutral_Plane_Smooth"]
     hrr_massin_columns = ["testing_time", "hrr_internal_allmassin"]
-    
-    Velocities[test_name] = df.loc[:, v_columns]
-    Mass_Flow[test_name] = df.loc[:, m_columns]
-    Temperatures[test_name] = df.loc[:, t_columns]
-    Neutral_Plane[test_name] = df.loc[:, np_columns]
-    HRR_internal_massin[test_name] = df.loc[:, hrr_massin_columns]
-    
+
+    results["Velocities"] = df.loc[:, v_columns]
+    results["Mass_Flow"] = df.loc[:, m_columns]
+    results["Door_Temperatures"] = df.loc[:, t_columns]
+    results["Neutral_Plane"] = df.loc[:, np_columns]
+    results["HRR_internal_massin"] = df.loc[:, hrr_massin_columns]
+
     # Heat Release Rate calculations
     df_juanalyser = df_full.iloc[:, 23:].copy()
     df_juanalyser.rename(columns = {"Time": "testing_time"},
                          inplace = True)
     df_juanalyser.loc[:, "testing_time"] = df_juanalyser.loc[
         :, "testing_time"]*60
-    
+
     """
     the ignition delay was not added to the spreadsheets for Beta1 and Beta2,
-    so I am adding it manually.
+    so it is added from the registry.
     """
-    if test_name == "Beta1":
-        df_juanalyser.loc[:, "testing_time"] = df_juanalyser.loc[
-            :, "testing_time"] - 4*60
-    if test_name == "Beta2":
-        df_juanalyser.loc[:, "testing_time"] = df_juanalyser.loc[
-            :, "testing_time"] - 18*60
+    df_juanalyser.loc[:, "testing_time"] = df_juanalyser.loc[
+        :, "testing_time"] + config["ignition_offset"]
     calculation_HRR(df_juanalyser, df)
-    
-    # save internal HRR data into independent dictionary
-    HRR_internal_juanalyser[test_name] = df_juanalyser.loc[
+
+    # save internal HRR data into independent data frame
+    results["HRR_internal_juanalyser"] = df_juanalyser.loc[
         :, ["testing_time","hrr_internal"]]
-    
-"""
-save velocities, neutral plane, mass flow and internal HRR to the processed
-data folder
-"""
-data_to_save = [Velocities, Neutral_Plane, Mass_Flow, Temperatures,
-                HRR_internal_massin, HRR_internal_juanalyser]
-
-for i, data_type in enumerate(data_to_save):
-    data_name = ["Velocities", "Neutral_Plane", "Mass_Flow",
-                 "Door_Temperatures", "HRR_internal_massin",
-                 "HRR_internal_juanalyser"][i]
-    file_address_save = (f"C:/Users/s1475174/Documents/Python_Projects/T"
-                         f"hermalRadiation_BREexperiments/processed_dat"
-                         f"a/{data_name}.pkl")
-    with open(file_address_save, 'wb') as handle:
-        pickle.dump(data_type, handle)
-
-# save dictionary with all the data
-address_doorframe_fulldata = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                              r"hermalRadiation_BREexperiments/processed_dat"
-                              r"a/doorframe_ALLdata.pkl")
-with open(address_doorframe_fulldata, "wb") as handle:
-    pickle.dump(DoorFrame_full, handle)
+
+    return results
+
+
+def doorframe_settings():
+    """
+    Returns the settings of the door frame analysis that are not in the
+    registry: the smoothing families and the default arguments of the
+    calculations (e.g. gamma and Cd)
+
+    Returns:
+    -------
+    settings: settings of the analysis
+        dict
+    """
+    settings = {"smoothing": {family: family_settings(family) for family in
+                              ["door_pressure", "gas_analysis"]},
+                "defaults": function_defaults(calculation_area,
+                                              calculation_velocity,
+                                              calculation_massflow,
+                                              calculation_HRR)}
+
+    return settings
+
+
+def doorframe_stage(test_name):
+    """
+    Returns the door frame analysis of one test, from the stage cache if
+    neither the raw data, the registry, the settings nor the code have
+    changed
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    results: see analyse_doorframe
+        dict
+    """
+    config = {**experiment_config(test_name, "door_frame"),
+              "settings": doorframe_settings()}
+    results = cached_stage("door_frame", test_name, config,
+                           [address_doorframe_raw], analyse_doorframe,
+                           test_name, code_files = stage_code(
+                               analyse_doorframe, calculation_velocity,
+                               repair_sensors, family_settings,
+                               alignment_plan))
+
+    return results
+
+
+def save_doorframe(experiments=None):
+    """
+    Saves velocities, neutral plane, mass flow, temperatures and internal
+    HRR of all the tests to the processed data folder, as well as a
+    dictionary with all the door frame data
+
+    Parameters:
+    ----------
+    experiments: only recalculate these experiments and keep the others
+                 from the saved files (None for all)
+        list
+
+    Returns:
+    -------
+    None
+    """
+    # dictionaries used to save the data separately in the data processed
+    # folder
+    DoorFrame_full = saved_results(address_doorframe_fulldata, experiments)
+    data_to_save = {}
+    for data_name in data_names:
+        data_to_save[data_name] = saved_results(os.path.join(
+            address_processed_data, f"{data_name}.pkl"), experiments)
+
+    # iterate over the tests to be analysed
+    for test_name in experiments_with("door_frame", experiments):
+
+        print(f"Analysing experiment {test_name}")
+        results = doorframe_stage(test_name)
+
+        DoorFrame_full[test_name] = results["DoorFrame_full"]
+        for data_name in data_names:
+            data_to_save[data_name][test_name] = results[data_name]
+
+    """
+    save velocities, neutral plane, mass flow and internal HRR to the
+    processed data folder
+    """
+    for data_name in data_names:
+        file_address_save = os.path.join(address_processed_data,
+                                         f"{data_name}.pkl")
+        with open(file_address_save, 'wb') as handle:
+            pickle.dump(data_to_save[data_name], handle)
+
+    # save dictionary with all the data
+    with open(address_doorframe_fulldata, "wb") as handle:
+        pickle.dump(DoorFrame_full, handle)
+
+    # save the same data into the columnar store (see data_store.py)
+    for data_name in data_names:
+        save_family(data_name, data_to_save[data_name])
+    save_family("doorframe_ALLdata", DoorFrame_full)
+
+    return None
+
+
+if __name__ == "__main__":
+    save_doorframe()
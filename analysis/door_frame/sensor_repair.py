@@ -0,0 +1,145 @@
+"""
+Functions used to substitute the data of damaged pressure probes
+and thermocouples by interpolating or extrapolating from the sensors at the
+other heights of the door frame
+
+Each repair is defined by the channel to substitute (target), the channels
+used to calculate it (sources) and the time windows (in minutes) where the
+substitution is applied. Repairs are applied in the order they are listed,
+so a repaired channel can be used as a source by the following repairs.
+The repairs of each test are listed in the door_frame section of the
+experiment registry (experiment_registry.py).
+"""
+
+import numpy as np
+
+
+def probe_height(column):
+    """
+    Returns the height (in cm) of the sensor from the column name
+    (e.g. PP_120 or TDD.40)
+
+    Parameters:
+    ----------
+    column: name of the column
+        str
+
+    Returns:
+    -------
+    height: height of the sensor in cm
+        int
+    """
+    height = int(column.replace(".", "_").split("_")[-1])
+
+    return height
+
+
+def repair_weights(heights, height_target):
+    """
+    Calculates the weights of the linear interpolation (or extrapolation)
+    at height_target from the values at heights.
+
+    Only the two sensors of the segment that contains height_target (or the
+    closest segment at either end if extrapolating) have a weight, which
+    gives the same result as interpolate.interp1d with
+    fill_value = 'extrapolate'.
+
+    Parameters:
+    ----------
+    heights: heights of the source sensors, in increasing order
+        list
+
+    height_target: height at which the value is required
+        float
+
+    Returns:
+    -------
+    (i_low, i_high): indices of the two sensors used
+        tuple
+
+    (w_low, w_high): weights of the two sensors used
+        tuple
+    """
+    heights = np.asarray(heights, dtype = "float64")
+
+    # find the segment, using the end segments when extrapolating
+    i_low = np.searchsorted(heights, height_target, side = "right") - 1
+    i_low = int(np.clip(i_low, 0, len(heights) - 2))
+    i_high = i_low + 1
+
+    delta = heights[i_high] - heights[i_low]
+    w_low = (heights[i_high] - height_target) / delta
+    w_high = (height_target - heights[i_low]) / delta
+
+    return (i_low, i_high), (w_low, w_high)
+
+
+def window_mask(testing_time, windows):
+    """
+    Creates a mask that selects the samples inside any of the time windows
+
+    Parameters:
+    ----------
+    testing_time: testing time in seconds
+        np.ndarray
+
+    windows: list of (start, end) tuples in minutes. None as start or end
+             leaves that side open. windows = None selects all samples
+        list
+
+    Returns:
+    -------
+    mask: True for the samples inside the windows
+        np.ndarray
+    """
+    testing_time = np.asarray(testing_time, dtype = "float64")
+    if windows is None:
+        return np.ones(testing_time.shape, dtype = bool)
+
+    mask = np.zeros(testing_time.shape, dtype = bool)
+    for start, end in windows:
+        mask_window = np.ones(testing_time.shape, dtype = bool)
+        if start is not None:
+            mask_window &= testing_time / 60 > start
+        if end is not None:
+            mask_window &= testing_time / 60 < end
+        mask |= mask_window
+
+    return mask
+
+
+def repair_sensors(df, repairs):
+    """
+    Substitutes the data of damaged sensors in the data frame.
+
+    Every repair is a single weighted sum of two columns over all the
+    masked rows.
+
+    Parameters:
+    ----------
+    df: pandas DataFrame with the test data. Modified in place
+        pd.DataFrame
+
+    repairs: list of repairs (see experiment_registry.py)
+        list
+
+    Returns:
+    -------
+    None
+    """
+    testing_time = df.loc[:, "testing_time"].to_numpy(dtype = "float64")
+
+    for repair in repairs:
+        sources = repair["sources"]
+        (i_low, i_high), (w_low, w_high) = repair_weights(
+            [probe_height(column) for column in sources],
+            probe_height(repair["target"]))
+
+        mask = window_mask(testing_time, repair["windows"])
+
+        values = df.loc[mask, [sources[i_low], sources[i_high]]].to_numpy(
+            dtype = "float64")
+        df.loc[mask, repair["target"]] = (w_low * values[:, 0] +
+                                          w_high * values[:, 1])
+
+    return None
@@ -1,29 +1,47 @@
 """
 This code uploads the door frame raw data from the summary spreadsheet,
 stores in a dictionary and saves it 
+
+The sheets of all the tests are read in one go through the ingestion cache
+(see excel_cache.py), so the spreadsheet is only parsed when it changes.
 """
 
-import pandas as pd
+import os
 import pickle
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import (address_doorframe_raw,
+                                 address_unprocessed_data,
+                                 experiments_with)
+from excel_cache import read_workbook
+
+# summary spreadsheet with the raw data of all the tests
+address_doorframe_summary = os.path.join(address_unprocessed_data,
+                                         "door_frame",
+                                         "Data_DoorAnalysis_Alltests.xlsx")
+
+
+def upload_doorframe():
+    """
+    Uploads the raw data of all the tests from the summary spreadsheet and
+    saves it as a pickle in the unprocessed data folder
 
-DoorFrame = {}
+    Returns:
+    -------
+    None
+    """
+    # upload the raw data of the tests to be analysed from the summary excel
+    # file (one sheet per test)
+    DoorFrame = read_workbook(address_doorframe_summary,
+                              experiments_with("door_frame"))
 
+    # save all the door frame data as a pickle in unprocessed data
+    with open(address_doorframe_raw, 'wb') as handle:
+        pickle.dump(DoorFrame, handle)
 
-# iterate over the four tests to be analysed
-for test_name in ["Alpha1", "Alpha2", "Beta1", "Beta2", "Gamma"]:
-    
-    # upload the data from the excel spreadsheets
-    file_address = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                    r"hermalRadiation_BREexperiments/unprocessed_data/do"
-                    "or_frame/Data_DoorAnalysis_Alltests.xlsx")
+    return None
 
-    # upload the raw data from the summary excel file
-    DoorFrame[test_name] = pd.read_excel(file_address,
-                                         sheet_name=test_name)
 
-# save all the door frame data as a pickle in processed data
-file_address_save = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                     r"hermalRadiation_BREexperiments/unprocessed_data/do"
-                     r"or_frame/DoorFrame_unprocessed.pkl")
-with open(file_address_save, 'wb') as handle:
-    pickle.dump(DoorFrame, handle)
+if __name__ == "__main__":
+    upload_doorframe()
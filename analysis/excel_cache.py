@@ -0,0 +1,218 @@
+"""
+Ingestion cache for the raw spreadsheets.
+
+Parsing the raw workbooks with pandas/openpyxl takes most of the time of the
+upload stages, so every sheet is only parsed once: the sheets requested from
+a workbook are read in a single open and each one is saved as an
+uncompressed Feather file under a key made of the hash of the workbook and
+the name of the sheet. Later reads of an unchanged workbook load those files
+and do not open the spreadsheet at all.
+
+The calamine engine (python-calamine) is used for parsing when installed,
+since it is much faster than openpyxl. Whether each read is a hit or a miss
+and the time it took are printed.
+"""
+
+import os
+import pickle
+import shutil
+import time
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from experiment_registry import address_processed_data
+from stage_cache import file_hash
+
+address_excel_cache = os.path.join(address_processed_data, "excel_cache")
+
+try:
+    import python_calamine # noqa: F401
+    excel_engine = "calamine"
+except ImportError:
+    excel_engine = "openpyxl"
+
+
+def workbook_folder(file_address):
+    """
+    Returns the folder with the cached sheets of the current version of a
+    workbook
+
+    Parameters:
+    ----------
+    file_address: address of the workbook
+        str
+
+    Returns:
+    -------
+    folder: address of the folder
+        str
+    """
+    name = os.path.splitext(os.path.basename(file_address))[0]
+    folder = os.path.join(address_excel_cache,
+                          f"{name}_{file_hash(file_address)[:16]}")
+
+    return folder
+
+
+def save_sheet(folder, sheet_name, df):
+    """
+    Saves one parsed sheet into the cache
+
+    Sheets that can not be stored as Arrow tables (e.g. columns that mix
+    text and numbers, or headers that are not text) are pickled instead.
+
+    Parameters:
+    ----------
+    folder: folder of the workbook (see workbook_folder)
+        str
+
+    sheet_name: name of the sheet
+        str
+
+    df: parsed sheet
+        pd.DataFrame
+
+    Returns:
+    -------
+    None
+    """
+    os.makedirs(folder, exist_ok = True)
+    try:
+        if not all(isinstance(column, str) for column in df.columns):
+            raise TypeError("column names are not text")
+        table = pa.Table.from_pandas(df, preserve_index = False)
+        feather.write_feather(table, os.path.join(folder,
+                                                  f"{sheet_name}.feather"),
+                              compression = "uncompressed")
+    except (TypeError, pa.ArrowException):
+        with open(os.path.join(folder, f"{sheet_name}.pkl"), "wb") as handle:
+            pickle.dump(df, handle)
+
+    return None
+
+
+def load_sheet(folder, sheet_name):
+    """
+    Loads one sheet from the cache
+
+    Parameters:
+    ----------
+    folder: folder of the workbook (see workbook_folder)
+        str
+
+    sheet_name: name of the sheet
+        str
+
+    Returns:
+    -------
+    df: sheet, or None if it is not in the cache
+        pd.DataFrame
+    """
+    address = os.path.join(folder, f"{sheet_name}.feather")
+    if os.path.exists(address):
+        return feather.read_table(address, memory_map = True).to_pandas()
+
+    address = os.path.join(folder, f"{sheet_name}.pkl")
+    if os.path.exists(address):
+        with open(address, "rb") as handle:
+            return pickle.load(handle)
+
+    return None
+
+
+def read_workbook(file_address, sheet_names):
+    """
+    Reads several sheets of a workbook, from the cache if the workbook has
+    not changed
+
+    The sheets missing from the cache are parsed in a single open of the
+    workbook. Cached versions of older contents of the workbook are removed.
+
+    Parameters:
+    ----------
+    file_address: address of the workbook
+        str
+
+    sheet_names: names of the sheets to read
+        list
+
+    Returns:
+    -------
+    sheets: data frame of each sheet (as pd.read_excel with the default
+            arguments)
+        dict
+    """
+    start = time.time()
+    file_name = os.path.basename(file_address)
+    folder = workbook_folder(file_address)
+
+    sheets = {sheet_name: load_sheet(folder, sheet_name)
+              for sheet_name in sheet_names}
+    missing = [sheet_name for sheet_name in sheet_names
+               if sheets[sheet_name] is None]
+
+    if not missing:
+        print(f" {file_name}: {len(sheet_names)} sheet(s) loaded from cache "
+              f"in {time.time() - start:.2f} seconds")
+        return sheets
+
+    # parse all the missing sheets at once
+    parsed = pd.read_excel(file_address, sheet_name = missing,
+                           engine = excel_engine)
+    print(f" {file_name}: {len(missing)} sheet(s) parsed with {excel_engine} "
+          f"in {time.time() - start:.2f} seconds")
+
+    # remove the outdated versions of the workbook and save the new sheets
+    prefix = os.path.basename(folder)[:-16]
+    if os.path.isdir(address_excel_cache):
+        for other in os.listdir(address_excel_cache):
+            if (other.startswith(prefix) and
+                    len(other) == len(prefix) + 16 and
+                    other != os.path.basename(folder)):
+                shutil.rmtree(os.path.join(address_excel_cache, other))
+    for sheet_name, df in parsed.items():
+        save_sheet(folder, sheet_name, df)
+        sheets[sheet_name] = df
+
+    return sheets
+
+
+def read_sheet(file_address, sheet_name, usecols=None, names=None):
+    """
+    Reads one sheet of a workbook, from the cache if the workbook has not
+    changed
+
+    The whole sheet is cached, so the same sheet can be read with different
+    columns without parsing the workbook again.
+
+    Parameters:
+    ----------
+    file_address: address of the workbook
+        str
+
+    sheet_name: name of the sheet
+        str
+
+    usecols: positions of the columns to return (None for all)
+        list
+
+    names: new names of the returned columns (None to keep the headers)
+        list
+
+    Returns:
+    -------
+    df: data of the sheet
+        pd.DataFrame
+    """
+    df = read_workbook(file_address, [sheet_name])[sheet_name]
+
+    if usecols is not None:
+        # rows that are empty in the selected columns are not read by
+        # pd.read_excel either
+        df = df.iloc[:, sorted(usecols)].dropna(how = "all")
+        df = df.reset_index(drop = True)
+    if names is not None:
+        df.columns = names
+
+    return df
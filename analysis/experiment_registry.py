@@ -0,0 +1,276 @@
+"""
+Registry with all the test-specific data of the BRE experiments.
+
+Every analysis stage takes its constants from here (probe groupings and
+sensor repairs of the door frame, time offsets of the gas analysis, video
+properties, TSC ambient temperatures and the layout of the temperature and
+HRR spreadsheets) instead of defining them inside the scripts.
+
+The registry is a plain dictionary, so it is loaded once on import.
+Use experiment_config to retrieve the section used by one stage, which is
+also what the stage cache hashes to decide whether a stage has to be
+recalculated (see stage_cache.py).
+"""
+
+import copy
+import os
+
+# folders of the repository
+address_repository = os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))
+address_unprocessed_data = os.path.join(address_repository,
+                                        "unprocessed_data")
+address_processed_data = os.path.join(address_repository, "processed_data")
+address_stage_cache = os.path.join(address_processed_data, "stage_cache")
+
+# raw data files shared by all the experiments
+address_doorframe_raw = os.path.join(address_unprocessed_data, "door_frame",
+                                     "DoorFrame_unprocessed.pkl")
+
+EXPERIMENTS = {
+    "Alpha1": {
+        "door_frame": {
+            # probes averaged at 0.4 m and 1.6 m
+            "probes_40": ["P2.40", "P3.40", "P4.40"],
+            "probes_160": ["P12.160"],
+            "temperature_repairs": [],
+            "pressure_repairs": [],
+            # time offset (s) of the gas analysis (juanalyser) data
+            "ignition_offset": 0},
+    },
+    "Alpha2": {
+        "door_frame": {
+            "probes_40": ["P2.40", "P3.40", "P4.40"],
+            "probes_160": ["P12.160"],
+            "temperature_repairs": [],
+            "pressure_repairs": [
+                # between 5 min and 15 min, interpolate PP120 and PP140
+                {"target": "PP_120",
+                 "sources": ["PP_100", "PP_160"],
+                 "windows": [(5, 15)]},
+                {"target": "PP_140",
+                 "sources": ["PP_100", "PP_160"],
+                 "windows": [(5, 15)]},
+                # between 0 and 6 min, then between 12 and 21 and after 40
+                # minutes extrapolate for PP180
+                {"target": "PP_180",
+                 "sources": ["PP_100", "PP_120", "PP_140", "PP_160"],
+                 "windows": [(0, 6), (12, 21), (40, None)]}],
+            "ignition_offset": 0},
+        "video": {
+            "door_height_px": 840,
+            "top_of_door": (990, 950), # (y_real, x_real) coordinates
+            "door_origin": 188,
+            "min_x_real": 200,
+            "max_x_real": 860,
+            "min_y_real": 250,
+            "max_y_real": 1920, # 1750
+            "start_externalflaming": 300,
+            "door_depth": 100,
+            "total_video_duration": 3900,
+            "threshold_value": 180,
+            "last_frame": None,
+            # video of the experiment (in unprocessed_data/video)
+            "video_file": "Alpha2.mp4"},
+        "tsc": {
+            # disc temperatures the IHF is calculated from (see
+            # tsc/tsc_ihf.py), and the file with the IHF already calculated
+            "raw_file_name": "Alpha2.pkl",
+            "file_name": "alpha2_TSC.pkl",
+            "ambient_temperature": 17},
+        "temperatures": {
+            "file_name": "Alpha2_GasPhaseTemperatures.xlsx",
+            "sheet_names": ["LoggerA", "LoggerB"]},
+        "hrr": {
+            "file_name": "Alpha2_HRR.xlsx",
+            "sheet_name": "Sheet1",
+            "usecols": [0, 3]},
+    },
+    "Beta1": {
+        "door_frame": {
+            "probes_40": ["P2.40", "P4.40"],
+            "probes_160": ["P10.160"],
+            "temperature_repairs": [],
+            "pressure_repairs": [
+                # between 10 min and 20 min extrapolate PP_20 and PP_40
+                {"target": "PP_20",
+                 "sources": ["PP_60", "PP_80"],
+                 "windows": [(10, 20)]},
+                {"target": "PP_40",
+                 "sources": ["PP_60", "PP_80"],
+                 "windows": [(10, 20)]},
+                # between 7 min and 11 min interpolate PP_100
+                {"target": "PP_100",
+                 "sources": ["PP_80", "PP_120"],
+                 "windows": [(7, 11)]},
+                # between 6 min and 60 min extrapolate PP_160 and PP_180
+                {"target": "PP_160",
+                 "sources": ["PP_20", "PP_40", "PP_60", "PP_80", "PP_100",
+                             "PP_120", "PP_140"],
+                 "windows": [(6, 60)]},
+                {"target": "PP_180",
+                 "sources": ["PP_20", "PP_40", "PP_60", "PP_80", "PP_100",
+                             "PP_120", "PP_140", "PP_160"],
+                 "windows": [(6, 60)]}],
+            # the ignition delay was not added to the spreadsheet
+            "ignition_offset": -4 * 60},
+        "video": {
+            "door_height_px": 830,
+            "door_origin": 110,
+            "top_of_door": (940, 900), # (y_real, x_real) coordinates
+            "min_x_real": 400,
+            "max_x_real": 900,
+            "min_y_real": 300,
+            "max_y_real": 1920,
+            "start_externalflaming": 509,
+            "total_video_duration": 2559,
+            "threshold_value": 180,
+            # flameout after 21 minutes (it doesn't re-ignite)
+            "last_frame": 6300,
+            "video_file": "Beta1.mp4"},
+        "temperatures": {
+            "file_name": "Beta1_GasPhaseTemperatures.xlsx",
+            "sheet_names": ["LoggerA", "LoggerB"]},
+        "hrr": {
+            "file_name": "Beta1_HRR.xlsx",
+            "sheet_name": "HRR",
+            "usecols": [0, 8]},
+    },
+    "Beta2": {
+        "door_frame": {
+            "probes_40": ["P2.40", "P3.40", "P4.40"],
+            "probes_160": ["P10.160", "P12.160"],
+            "temperature_repairs": [
+                # extrapolate to obtain temperature at 0.4 meters
+                {"target": "TDD.40",
+                 "sources": ["TDD.60", "TDD.80", "TDD.100", "TDD.120",
+                             "TDD.140", "TDD.160", "TDD.180"],
+                 "windows": None}],
+            "pressure_repairs": [
+                # between 0 min and 15 min extrapolate PP_180
+                {"target": "PP_180",
+                 "sources": ["PP_20", "PP_40", "PP_60", "PP_80", "PP_100",
+                             "PP_120", "PP_140", "PP_160"],
+                 "windows": [(0, 15)]},
+                # between 8 min and 10 min interpolate PP_100
+                {"target": "PP_100",
+                 "sources": ["PP_80", "PP_120"],
+                 "windows": [(8, 10)]}],
+            # the ignition delay was not added to the spreadsheet
+            "ignition_offset": -18 * 60},
+        "video": {
+            "door_height_px": 800,
+            "door_origin": 210,
+            "top_of_door": (915, 700), # (y_real, x_real) coordinates
+            "min_x_real": 200,
+            "max_x_real": 740,
+            "min_y_real": 350,
+            "max_y_real": 1920, # 1750
+            "start_externalflaming": 240,
+            "total_video_duration": 3750,
+            "threshold_value": 180,
+            "last_frame": None,
+            "video_file": "Beta2.mp4"},
+        "tsc": {
+            "raw_file_name": "Beta2.pkl",
+            "file_name": "beta2_TSC.pkl",
+            "ambient_temperature": 16},
+        "temperatures": {
+            "file_name": "Beta2_GasPhaseTemperatures.xlsx",
+            "sheet_names": ["LoggerA", "LoggerB"]},
+        "hrr": {
+            "file_name": "Beta2_HRR.xlsx",
+            "sheet_name": "Sheet1",
+            "usecols": [0, 1]},
+    },
+    "Gamma": {
+        "door_frame": {
+            "probes_40": ["P2.40", "P3.40", "P4.40"],
+            "probes_160": ["P10.160", "P11.160", "P12.160"],
+            "temperature_repairs": [],
+            "pressure_repairs": [
+                # between 7 min and 16 min interpolate PP_120 and PP_140
+                {"target": "PP_120",
+                 "sources": ["PP_100", "PP_160"],
+                 "windows": [(7, 16)]},
+                {"target": "PP_140",
+                 "sources": ["PP_100", "PP_160"],
+                 "windows": [(7, 16)]}],
+            "ignition_offset": 0},
+        "video": {
+            "door_height_px": 805,
+            "door_origin": 360,
+            "top_of_door": (1130, 1020), # (y_real, x_real) coordinates
+            "min_x_real": 500,
+            "max_x_real": 970,
+            "min_y_real": 450,
+            "max_y_real": 1920,
+            "start_externalflaming": 319,
+            "door_depth": 60,
+            "total_video_duration": 4677,
+            "threshold_value": 180,
+            "last_frame": None,
+            "video_file": "Gamma.mp4"},
+        "tsc": {
+            "raw_file_name": "Gamma.pkl",
+            "file_name": "gamma_TSC.pkl",
+            "ambient_temperature": 15},
+        "temperatures": {
+            "file_name": "Gamma_GasPhaseTemperatures.xlsx",
+            "sheet_names": ["LoggerA", "LoggerB"]},
+        "hrr": {
+            "file_name": "Gamma_HRR.xlsx",
+            "sheet_name": "Sheet1",
+            "usecols": [0, 3]},
+    },
+}
+
+
+def experiments_with(section, selected=None):
+    """
+    Returns the experiments that have data for a given stage
+
+    Parameters:
+    ----------
+    section: name of the section of the registry (e.g. "door_frame")
+        str
+
+    selected: only return these experiments (None for all)
+        list
+
+    Returns:
+    -------
+    experiments: names of the experiments, in the order of the registry
+        list
+    """
+    experiments = [name for name in EXPERIMENTS if section in EXPERIMENTS[name]
+                   and (selected is None or name in selected)]
+
+    return experiments
+
+
+def experiment_config(experiment, section):
+    """
+    Returns the data of one experiment used by one stage
+
+    A copy is returned so that a stage can not modify the registry.
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    section: name of the section of the registry (e.g. "door_frame")
+        str
+
+    Returns:
+    -------
+    config: test-specific data for the stage
+        dict
+    """
+    if section not in EXPERIMENTS[experiment]:
+        raise KeyError(f"No {section} data registered for {experiment}")
+
+    config = copy.deepcopy(EXPERIMENTS[experiment][section])
+
+    return config
@@ -1,54 +1,128 @@
 """
 This codes takes the external HRR data from the unprocessed_data folder and
 saves it as a pickle in the processed_data folder.
+
+The sheet and columns of each spreadsheet are taken from the hrr section of
+the experiment registry, and each test is cached (see stage_cache.py). The
+spreadsheets are read through the ingestion cache (see excel_cache.py).
 """
 
-import pandas as pd
+import os
 import pickle
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import (address_processed_data,
+                                 address_unprocessed_data,
+                                 experiment_config,
+                                 experiments_with)
+from data_store import save_family
+from excel_cache import read_sheet
+from stage_cache import cached_stage, saved_results, stage_code
+
+
+def hrr_file_address(test_name):
+    """
+    Returns the address of the HRR spreadsheet of a test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    file_address: address of the spreadsheet
+        str
+    """
+    config = experiment_config(test_name, "hrr")
+    file_address = os.path.join(address_unprocessed_data, "hrr_data",
+                                config["file_name"])
+
+    return file_address
+
+
+def upload_hrr(test_name):
+    """
+    Uploads the external HRR of one test
+
+    These files have already been modified and are not consistent, so the
+    sheet and columns to read are defined for each test in the registry.
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    df: testing time (s) and total HRR
+        pd.DataFrame
+    """
+    config = experiment_config(test_name, "hrr")
+
+    df = read_sheet(hrr_file_address(test_name),
+                    sheet_name=config["sheet_name"],
+                    usecols=config["usecols"],
+                    names=["testing_time", "THRR"])
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"] * 60
+
+    return df
+
+
+def hrr_stage(test_name):
+    """
+    Returns the external HRR of one test, from the stage cache if neither
+    the spreadsheet, the registry nor the code have changed
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    df: testing time (s) and total HRR
+        pd.DataFrame
+    """
+    df = cached_stage("hrr", test_name, experiment_config(test_name, "hrr"),
+                      [hrr_file_address(test_name)], upload_hrr, test_name,
+                      code_files = stage_code(upload_hrr, read_sheet))
+
+    return df
+
+
+def save_hrr(experiments=None):
+    """
+    Saves the external HRR data of all the tests as a pickle in the processed
+    data folder
+
+    Parameters:
+    ----------
+    experiments: only recalculate these experiments and keep the others
+                 from the saved files (None for all)
+        list
+
+    Returns:
+    -------
+    None
+    """
+    file_address_save = os.path.join(address_processed_data, "HRR_total.pkl")
+    HRR = saved_results(file_address_save, experiments)
+
+    # iterate over the tests to be analysed
+    for test_name in experiments_with("hrr", experiments):
+        HRR[test_name] = hrr_stage(test_name)
+
+    # save all the external HRR data as a pickle in processed data
+    with open(file_address_save, 'wb') as handle:
+        pickle.dump(HRR, handle)
+
+    # and into the columnar store (see data_store.py)
+    save_family("HRR_total", HRR)
+
+    return None
+
 
-HRR = {}
-
-# iterate over the four tests to be analysed
-for test_name in ["Alpha2", "Beta1", "Beta2", "Gamma"]:
-    
-    # create an address to upload the file into a pandas data frame
-    file_name = f"{test_name}_HRR.xlsx"
-    file_address = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                    r"hermalRadiation_BREexperiments/unprocessed_data/hrr_dat"
-                    f"a/{file_name}")
-
-    """
-    data uploading must be done independently since these files have already
-    been modified and are not consistent
-    """
-    if test_name == "Alpha2":
-        HRR[test_name] = pd.read_excel(file_address, sheet_name="Sheet1",
-                                        usecols=[0, 3],
-                                        names=["testing_time", "THRR"])
-        HRR[test_name].loc[:, "testing_time"] = HRR[test_name].loc[
-            :, "testing_time"] * 60
-    elif test_name == "Beta1":
-        HRR[test_name] = pd.read_excel(file_address, sheet_name="HRR",
-                                        usecols=[0, 8],
-                                        names=["testing_time", "THRR"])
-        HRR[test_name].loc[:, "testing_time"] = HRR[test_name].loc[
-            :, "testing_time"] * 60    
-    elif test_name == "Beta2":
-        HRR[test_name] = pd.read_excel(file_address, sheet_name="Sheet1",
-                                       usecols=[0, 1],
-                                       names=["testing_time", "THRR"])
-        HRR[test_name].loc[:, "testing_time"] = HRR[test_name].loc[
-            :, "testing_time"] * 60
-    elif test_name == "Gamma":
-        HRR[test_name] = pd.read_excel(file_address, sheet_name="Sheet1",
-                                       usecols=[0, 3],
-                                       names=["testing_time", "THRR"])
-        HRR[test_name].loc[:, "testing_time"] = HRR[test_name].loc[
-            :, "testing_time"] * 60
-
-# save all the external HRR data as a pickle in processed data
-file_address_save = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                     r"hermalRadiation_BREexperiments/processed_dat"
-                     r"a/HRR_total.pkl")
-with open(file_address_save, 'wb') as handle:
-    pickle.dump(HRR, handle)
+if __name__ == "__main__":
+    save_hrr()
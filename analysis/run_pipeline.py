@@ -0,0 +1,584 @@
+"""
+Runs the whole analysis of the BRE experiments in the right order.
+
+Every stage of the analysis is a function of one of the scripts in the
+analysis folders. Stages with a section of the experiment registry are run
+once per experiment, the others (which usually collect the results of all
+the experiments into one file) are run once. The stages and their
+dependencies form a graph (STAGES), and independent stages and experiments
+are run in parallel in a pool of processes.
+
+With --experiments, the per-experiment stages only run for the selected
+experiments, and the stages that collect their results (e.g.
+door_frame_save) only recalculate those and keep the others in their files.
+
+A stage is skipped if its fingerprint (registry section, input files, code
+and fingerprints of the stages it depends on) has not changed since it last
+ran and its output files exist. The fingerprints are kept in the stage
+cache folder. The code of a stage is every script in its folder and in the
+analysis folder (the settings outside the registry are defined in them),
+so a stage whose code may have changed is run again, and then recalculates
+only the experiments whose own cache key changed (see stage_cache.py).
+
+Usage:
+    python run_pipeline.py
+    python run_pipeline.py --stages consolidate --workers 4
+    python run_pipeline.py --stages door_frame_save --experiments Gamma
+    python run_pipeline.py --force
+"""
+
+import argparse
+import concurrent.futures
+import importlib.util
+import json
+import os
+import sys
+import time
+import traceback
+
+from experiment_registry import (address_doorframe_raw,
+                                 address_processed_data,
+                                 address_repository,
+                                 address_stage_cache,
+                                 address_unprocessed_data,
+                                 experiment_config,
+                                 experiments_with)
+from stage_cache import stage_key
+
+address_analysis = os.path.dirname(os.path.abspath(__file__))
+address_pipeline_state = os.path.join(address_stage_cache,
+                                      "pipeline_state.json")
+
+
+def processed(file_name):
+    """
+    Returns the address of a file in the processed data folder
+    """
+    return os.path.join(address_processed_data, file_name)
+
+
+def analysis(file_name):
+    """
+    Returns the address of a file relative to the analysis folder
+    """
+    return os.path.join(address_analysis, file_name)
+
+
+def video_input(experiment):
+    """
+    Returns the video of an experiment, or the folder of frames extracted
+    from it if the video is not available (see video_analysis/frame_source.py)
+    """
+    address = os.path.join(address_unprocessed_data, "video",
+                           experiment_config(experiment, "video")["video_file"])
+    if not os.path.exists(address):
+        address = analysis(f"video_analysis/{experiment}_frames")
+    return address
+
+
+"""
+Stages of the analysis.
+script and function: function called to run the stage
+section: section of the registry. The stage runs once per experiment that
+         has this section (None if the stage runs once)
+depends_on: stages that have to finish before this one
+inputs and outputs: functions of the experiment (None for stages that run
+                    once) that return the files read and written by the
+                    stage
+"""
+STAGES = {
+    # door frame
+    "doorframe_upload": {
+        "script": "door_frame/uploadraw_pickleandsave.py",
+        "function": "upload_doorframe",
+        "section": None,
+        "depends_on": [],
+        "inputs": lambda experiment: [os.path.join(
+            address_unprocessed_data, "door_frame",
+            "Data_DoorAnalysis_Alltests.xlsx")],
+        "outputs": lambda experiment: [address_doorframe_raw]},
+    "door_frame": {
+        "script": "door_frame/main_doorframe.py",
+        "function": "doorframe_stage",
+        "section": "door_frame",
+        "depends_on": ["doorframe_upload"],
+        "inputs": lambda experiment: [address_doorframe_raw],
+        "outputs": lambda experiment: []},
+    "door_frame_save": {
+        "script": "door_frame/main_doorframe.py",
+        "function": "save_doorframe",
+        "section": None,
+        "depends_on": ["door_frame"],
+        "inputs": lambda experiment: [],
+        "outputs": lambda experiment: [processed(f"{name}.pkl") for name in [
+            "Velocities", "Neutral_Plane", "Mass_Flow", "Door_Temperatures",
+            "HRR_internal_massin", "HRR_internal_juanalyser",
+            "doorframe_ALLdata"]]},
+    # external HRR
+    "hrr": {
+        "script": "hrr/main_hrr.py",
+        "function": "hrr_stage",
+        "section": "hrr",
+        "depends_on": [],
+        "inputs": lambda experiment: [os.path.join(
+            address_unprocessed_data, "hrr_data",
+            experiment_config(experiment, "hrr")["file_name"])],
+        "outputs": lambda experiment: []},
+    "hrr_save": {
+        "script": "hrr/main_hrr.py",
+        "function": "save_hrr",
+        "section": None,
+        "depends_on": ["hrr"],
+        "inputs": lambda experiment: [],
+        "outputs": lambda experiment: [processed("HRR_total.pkl")]},
+    # thin skin calorimeters
+    "tsc": {
+        "script": "tsc/main_tsc.py",
+        "function": "tsc_stage",
+        "section": "tsc",
+        "depends_on": [],
+        "inputs": lambda experiment: [os.path.join(
+            address_unprocessed_data, "tsc_data",
+            experiment_config(experiment, "tsc")["raw_file_name"])],
+        "outputs": lambda experiment: []},
+    "tsc_save": {
+        "script": "tsc/main_tsc.py",
+        "function": "save_tsc",
+        "section": None,
+        "depends_on": ["tsc"],
+        "inputs": lambda experiment: [],
+        "outputs": lambda experiment: [processed("TSC.pkl")]},
+    # gas phase temperatures
+    "temperatures": {
+        "script": "temperatures/0_upload_and_pickle.py",
+        "function": "temperatures_stage",
+        "section": "temperatures",
+        "depends_on": [],
+        "inputs": lambda experiment: [os.path.join(
+            address_unprocessed_data, "temperature",
+            experiment_config(experiment, "temperatures")["file_name"])],
+        "outputs": lambda experiment: []},
+    "temperatures_save": {
+        "script": "temperatures/0_upload_and_pickle.py",
+        "function": "save_temperatures",
+        "section": None,
+        "depends_on": ["temperatures"],
+        "inputs": lambda experiment: [],
+        "outputs": lambda experiment: [analysis(
+            "temperatures/temperatures_rawdata.pkl")]},
+    "temperatures_condense": {
+        "script": "temperatures/1_plot_rawdata.py",
+        "function": "condense_temperatures",
+        "section": None,
+        "depends_on": ["temperatures_save", "door_frame_save"],
+        "inputs": lambda experiment: [
+            analysis("temperatures/temperatures_rawdata.pkl"),
+            processed("Door_Temperatures.pkl")],
+        "outputs": lambda experiment: [processed(
+            "temperatures_condensed.pkl")]},
+    "temperatures_plot": {
+        "script": "temperatures/1_plot_rawdata.py",
+        "function": "plot_temperatures",
+        "section": "temperatures",
+        "depends_on": ["temperatures_save", "door_frame_save"],
+        "inputs": lambda experiment: [
+            analysis("temperatures/temperatures_rawdata.pkl"),
+            processed("Door_Temperatures.pkl")],
+        "outputs": lambda experiment: [os.path.join(
+            address_repository, "plotting", "onevariable_allexperiments",
+            "temperatures", f"{experiment}_temperatures.png")]},
+    # flame dimensions from the videos
+    "video": {
+        "script": "video_analysis/main_videoanalysis.py",
+        "function": "video_stage",
+        "section": "video",
+        "depends_on": [],
+        "inputs": lambda experiment: [video_input(experiment)],
+        "outputs": lambda experiment: []},
+    "video_save": {
+        "script": "video_analysis/main_videoanalysis.py",
+        "function": "save_video",
+        "section": None,
+        "depends_on": ["video"],
+        "inputs": lambda experiment: [],
+        "outputs": lambda experiment: [analysis(
+            "video_analysis/Flame_Dimensions_unsmoothed.pkl")]},
+    "video_smooth": {
+        "script": "video_analysis/smoothandsave_videoanalysis.py",
+        "function": "smooth_video",
+        "section": None,
+        "depends_on": ["video_save"],
+        "inputs": lambda experiment: [analysis(
+            "video_analysis/Flame_Dimensions_unsmoothed.pkl")],
+        "outputs": lambda experiment: [processed("Flame_Dimensions.pkl")]},
+    # all the data at 1 Hz
+    "consolidate": {
+        "script": "consolidate_all.py",
+        "function": "consolidate",
+        "section": None,
+        "depends_on": ["door_frame_save", "hrr_save", "tsc_save",
+                       "temperatures_condense", "video_smooth"],
+        "inputs": lambda experiment: [],
+        "outputs": lambda experiment: [
+            processed("all_data_BREexperiments.pkl"),
+            processed("all_data_BREexperiments.xlsx")]},
+}
+
+# modules of the stages already imported by this process
+_modules = {}
+
+
+def load_stage_module(script):
+    """
+    Imports the script of a stage (only once per process)
+
+    The folder of the script is added to the path so that it can import its
+    own functions. Scripts are imported from their address since some of
+    their names are not valid module names (e.g. 0_upload_and_pickle.py).
+
+    Parameters:
+    ----------
+    script: address of the script relative to the analysis folder
+        str
+
+    Returns:
+    -------
+    module: imported script
+        module
+    """
+    if script not in _modules:
+        address = analysis(script)
+        folder = os.path.dirname(address)
+        if folder not in sys.path:
+            sys.path.insert(0, folder)
+        name = "stage_" + os.path.splitext(script)[0].replace("/", "_")
+        spec = importlib.util.spec_from_file_location(name, address)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[script] = module
+
+    return _modules[script]
+
+
+def run_task(script, function, experiment, experiments=None):
+    """
+    Runs one stage for one experiment. Called in the worker processes
+
+    Parameters:
+    ----------
+    script: address of the script relative to the analysis folder
+        str
+
+    function: name of the function of the stage
+        str
+
+    experiment: name of the experiment (None for stages that run once)
+        str
+
+    experiments: selected experiments, passed to the stages that collect the
+                 results of the experiments (None for all)
+        list
+
+    Returns:
+    -------
+    time_taken: time taken by the stage in seconds
+        float
+    """
+    start = time.time()
+    module = load_stage_module(script)
+
+    # the scripts save some of their files in their own folder
+    os.chdir(os.path.dirname(analysis(script)))
+
+    arguments = [] if experiment is None else [experiment]
+    if experiments is not None:
+        arguments = [experiments]
+    getattr(module, function)(*arguments)
+
+    time_taken = time.time() - start
+
+    return time_taken
+
+
+def task_name(task):
+    """
+    Returns the name of a (stage, experiment) task used in the log and in the
+    pipeline state
+    """
+    stage, experiment = task
+    return stage if experiment is None else f"{stage}/{experiment}"
+
+
+def collects_experiments(stage):
+    """
+    Checks if a stage that runs once collects the results of a per-experiment
+    stage (e.g. door_frame_save), in which case it only recalculates the
+    selected experiments
+
+    Parameters:
+    ----------
+    stage: name of the stage
+        str
+
+    Returns:
+    -------
+    collects: True if the stage collects the results of the experiments
+        bool
+    """
+    collects = STAGES[stage]["section"] is None and any(
+        STAGES[dependency]["section"] is not None
+        for dependency in STAGES[stage]["depends_on"])
+
+    return collects
+
+
+def create_tasks(targets, experiments=None):
+    """
+    Creates the tasks needed to run the target stages and their
+    dependencies
+
+    Parameters:
+    ----------
+    targets: names of the stages to run
+        list
+
+    experiments: only run the per-experiment stages for these experiments
+                 (None for all)
+        list
+
+    Returns:
+    -------
+    dependencies: tasks (stage, experiment) that each task depends on
+        dict
+    """
+    # add all the stages the targets depend on
+    stages = []
+    to_visit = list(targets)
+    while to_visit:
+        stage = to_visit.pop()
+        if stage not in stages:
+            stages.append(stage)
+            to_visit.extend(STAGES[stage]["depends_on"])
+
+    def stage_tasks(stage):
+        section = STAGES[stage]["section"]
+        if section is None:
+            return [(stage, None)]
+        return [(stage, experiment) for experiment in experiments_with(section)
+                if experiments is None or experiment in experiments]
+
+    dependencies = {}
+    for stage in stages:
+        for task in stage_tasks(stage):
+            dependencies[task] = []
+            for dependency in STAGES[stage]["depends_on"]:
+                for dependency_task in stage_tasks(dependency):
+                    """
+                    a stage that runs per experiment only waits for the same
+                    experiment of a per-experiment dependency
+                    """
+                    if (task[1] is not None and dependency_task[1] is not None
+                            and task[1] != dependency_task[1]):
+                        continue
+                    dependencies[task].append(dependency_task)
+
+    return dependencies
+
+
+def stage_scripts(script):
+    """
+    Returns the scripts a stage may import: those of its folder and of the
+    analysis folder
+
+    Parameters:
+    ----------
+    script: address of the script relative to the analysis folder
+        str
+
+    Returns:
+    -------
+    scripts: addresses of the scripts
+        list
+    """
+    folders = sorted({address_analysis, os.path.dirname(analysis(script))})
+    scripts = [os.path.join(folder, file) for folder in folders
+               for file in sorted(os.listdir(folder)) if file.endswith(".py")]
+
+    return scripts
+
+
+def fingerprint(task, dependency_fingerprints, experiments=None):
+    """
+    Calculates the fingerprint of a task from the registry section, the
+    input files, the code and the fingerprints of the tasks it depends on
+    (and the selected experiments, for a stage that collects them)
+
+    Parameters:
+    ----------
+    task: (stage, experiment)
+        tuple
+
+    dependency_fingerprints: fingerprints of the tasks it depends on
+        list
+
+    experiments: selected experiments (None for all)
+        list
+
+    Returns:
+    -------
+    key: hexadecimal hash
+        str
+    """
+    stage, experiment = task
+    section = STAGES[stage]["section"]
+    config = {"section": (None if section is None else
+                          experiment_config(experiment, section)),
+              "dependencies": dependency_fingerprints}
+    if experiments is not None and collects_experiments(stage):
+        config["experiments"] = sorted(experiments)
+    key = stage_key(stage, str(experiment), config,
+                    STAGES[stage]["inputs"](experiment),
+                    stage_scripts(STAGES[stage]["script"]))
+
+    return key
+
+
+def run_pipeline(targets, experiments=None, workers=None, force=False):
+    """
+    Runs the tasks needed for the target stages, skipping the ones that have
+    not changed and running the independent ones in parallel
+
+    Parameters:
+    ----------
+    targets: names of the stages to run
+        list
+
+    experiments: only run the per-experiment stages for these experiments
+                 (None for all)
+        list
+
+    workers: number of processes (None for the number of cpus)
+        int
+
+    force: run all the tasks even if they have not changed
+        bool
+
+    Returns:
+    -------
+    failed: names of the tasks that failed (or depend on a failed task)
+        list
+    """
+    dependencies = create_tasks(targets, experiments)
+
+    # fingerprints of the tasks that already ran
+    state = {}
+    if os.path.exists(address_pipeline_state):
+        with open(address_pipeline_state, "r") as handle:
+            state = json.load(handle)
+
+    pending = set(dependencies)
+    fingerprints = {}
+    failed = set()
+    running = {}
+    start = time.time()
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        while pending or running:
+
+            # submit (or skip) all the tasks whose dependencies are done
+            progress = True
+            while progress:
+                progress = False
+                for task in sorted(pending, key = task_name):
+                    if any(dependency in failed
+                           for dependency in dependencies[task]):
+                        print(f"{task_name(task)}: not run (dependency "
+                              f"failed)")
+                        pending.remove(task)
+                        failed.add(task)
+                        progress = True
+                        continue
+                    if not all(dependency in fingerprints
+                               for dependency in dependencies[task]):
+                        continue
+
+                    pending.remove(task)
+                    progress = True
+                    try:
+                        key = fingerprint(task, [
+                            fingerprints[dependency] for dependency in
+                            sorted(dependencies[task], key = task_name)],
+                            experiments)
+                    except OSError as error:
+                        print(f"{task_name(task)}: failed ({error})")
+                        failed.add(task)
+                        continue
+
+                    outputs = STAGES[task[0]]["outputs"](task[1])
+                    if (not force and state.get(task_name(task)) == key
+                            and all(os.path.exists(output)
+                                    for output in outputs)):
+                        print(f"{task_name(task)}: unchanged, skipped")
+                        fingerprints[task] = key
+                        continue
+
+                    print(f"{task_name(task)}: started")
+                    selected = (experiments if collects_experiments(task[0])
+                                else None)
+                    future = pool.submit(run_task, STAGES[task[0]]["script"],
+                                         STAGES[task[0]]["function"], task[1],
+                                         selected)
+                    running[future] = (task, key)
+
+            # nothing is running, so the pending tasks can never be ready
+            if not running:
+                if pending:
+                    raise RuntimeError(
+                        "tasks waiting for stages that never run: " +
+                        ", ".join(sorted(task_name(task)
+                                         for task in pending)))
+                break
+
+            # wait for any task to finish
+            finished, _ = concurrent.futures.wait(
+                running, return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                task, key = running.pop(future)
+                try:
+                    time_taken = future.result()
+                except Exception:
+                    print(f"{task_name(task)}: failed\n"
+                          f"{traceback.format_exc()}")
+                    failed.add(task)
+                    continue
+                print(f"{task_name(task)}: done in {round(time_taken, 2)} s")
+                fingerprints[task] = key
+                state[task_name(task)] = key
+
+                # save the state after every task, in case the run stops
+                os.makedirs(address_stage_cache, exist_ok = True)
+                with open(address_pipeline_state, "w") as handle:
+                    json.dump(state, handle, indent = 1, sort_keys = True)
+
+    print(f"Pipeline finished in {round(time.time() - start, 2)} s. "
+          f"{len(failed)} tasks failed")
+
+    return sorted(task_name(task) for task in failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[1])
+    parser.add_argument("--stages", nargs = "+", default = ["consolidate"],
+                        choices = list(STAGES),
+                        help = "stages to run (with their dependencies)")
+    parser.add_argument("--experiments", nargs = "+", default = None,
+                        help = "experiments of the per-experiment stages")
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "number of processes")
+    parser.add_argument("--force", action = "store_true",
+                        help = "run all the stages even if unchanged")
+    arguments = parser.parse_args()
+
+    failed = run_pipeline(arguments.stages, arguments.experiments,
+                          arguments.workers, arguments.force)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,499 @@
+"""
+Smoothing of the measured time series (TSC, door frame and flame
+dimensions).
+
+Two smoothers share the same interface (see smooth and smooth_columns):
+
+savgol: Savitzky-Golay filter (scipy), for uniformly sampled series
+local_linear: locally weighted linear regression over the nearest
+              frac * n points with tricube weights, i.e. the same result as
+              statsmodels lowess(frac = frac, it = 0), which was used to
+              smooth the IHF of the TSCs
+
+Every column of a 2-D array (time x channels) is smoothed at once. The
+local linear smoother does not loop over the points: when the series is
+uniformly sampled, the points whose neighbourhood is centred on them share
+the same weights, so they are smoothed with one FFT convolution, and only
+the points near the ends of the series are fitted one by one. Otherwise the
+neighbourhoods of blocks of points are fitted as arrays.
+
+Each family of variables is smoothed with its own settings
+(smoothing_families), in one call for all its columns (smooth_family).
+
+Series too long to be held in memory can be smoothed with savgol in chunks
+(open_stream and smooth_stream): every chunk is returned as soon as the
+windows of its rows are complete, with the same values as smoothing the
+whole series at once.
+
+lowess_difference compares the local linear smoother with the output of
+lowess (statsmodels is only needed for this check, if no reference output
+is given).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.signal import fftconvolve, savgol_filter
+
+# number of points whose neighbourhoods are fitted together
+block_size = 256
+
+# smoother and settings of each family of variables (see smooth)
+smoothing_families = {
+    # pressure differences of the door frame probes
+    "door_pressure": {"method": "savgol", "window_length": 31,
+                      "polyorder": 2},
+    # CO2, CO and O2 of the gas analysis (juanalyser)
+    "gas_analysis": {"method": "savgol", "window_length": 31,
+                     "polyorder": 2},
+    # flame dimensions from the video analysis
+    "flame_dimensions": {"method": "savgol", "window_length": 61,
+                         "polyorder": 2},
+    # IHF of the TSCs (lowess in the original notebook)
+    "tsc_ihf": {"method": "local_linear", "frac": 0.05},
+}
+
+
+def savgol(values, window_length=31, polyorder=2):
+    """
+    Smooths the columns of an array with a Savitzky-Golay filter
+
+    Parameters:
+    ----------
+    values: series to smooth (time x channels, or a single series)
+        np.ndarray
+
+    window_length: length of the filter window (odd)
+        int
+
+    polyorder: order of the polynomial fitted to the samples of each window
+        int
+
+    Returns:
+    -------
+    smoothed: smoothed series (same shape as values)
+        np.ndarray
+    """
+    smoothed = savgol_filter(np.asarray(values, dtype = float),
+                             window_length, polyorder, axis = 0)
+
+    return smoothed
+
+
+def neighbourhoods(x, k):
+    """
+    Returns the first point of the neighbourhood of every point, i.e. of the
+    k consecutive points closest to it (as chosen by lowess)
+
+    Parameters:
+    ----------
+    x: sorted positions of the points
+        np.ndarray
+
+    k: number of points of each neighbourhood
+        int
+
+    Returns:
+    -------
+    left: index of the first point of each neighbourhood
+        np.ndarray
+    """
+    # the neighbourhood moves right while the point is closer to the next
+    # point than to its first point
+    midpoints = (x[:len(x) - k] + x[k:]) / 2
+    left = np.searchsorted(midpoints, x, side = "left")
+
+    return left
+
+
+def local_weights(x, points, left, k):
+    """
+    Calculates the weights of the local linear fit of some points: the fit
+    at each point is the sum of the weights times the values of its
+    neighbourhood
+
+    Parameters:
+    ----------
+    x: sorted positions of all the points
+        np.ndarray
+
+    points: indices of the points to fit
+        np.ndarray
+
+    left: first point of the neighbourhood of every point (see
+          neighbourhoods)
+        np.ndarray
+
+    k: number of points of each neighbourhood
+        int
+
+    Returns:
+    -------
+    columns: indices of the points of each neighbourhood (points x k)
+        np.ndarray
+
+    weights: weights of those points (points x k)
+        np.ndarray
+    """
+    columns = left[points, None] + np.arange(k)
+    distance = x[columns] - x[points, None]
+
+    # tricube weights within the distance to the furthest neighbour
+    radius = np.maximum(-distance[:, :1], distance[:, -1:])
+    weights = np.abs(distance)
+    weights /= np.where(radius > 0, radius, 1)
+    np.minimum(weights, 1, out = weights)
+    weights **= 3
+    np.subtract(1, weights, out = weights)
+    weights **= 3
+
+    # weighted linear regression evaluated at the point (distance 0)
+    total = weights.sum(axis = 1, keepdims = True)
+    mean = np.einsum("pk,pk->p", weights, distance)[:, None] / total
+    variance = np.einsum("pk,pk->p", weights,
+                         (distance - mean)**2)[:, None] / total
+    slope = np.divide(-mean, variance, out = np.zeros_like(mean),
+                      where = variance > 0)
+    distance -= mean
+    distance *= slope
+    distance += 1
+    weights *= distance
+    weights /= total
+
+    return columns, weights
+
+
+def local_linear(x, values, frac=0.05):
+    """
+    Smooths the columns of an array with a local linear regression (the same
+    as statsmodels lowess with it = 0 and delta = 0)
+
+    Parameters:
+    ----------
+    x: positions of the points (e.g. time), sorted
+        np.ndarray
+
+    values: series to smooth (time x channels, or a single series). Missing
+            values are left out of the neighbourhoods of their column, and
+            are missing in the output
+        np.ndarray
+
+    frac: fraction of the points in the neighbourhood of each point
+        float
+
+    Returns:
+    -------
+    smoothed: smoothed series (same shape as values)
+        np.ndarray
+    """
+    x = np.asarray(x, dtype = float)
+    values = np.asarray(values, dtype = float)
+    series = values.reshape(len(x), -1)
+    smoothed = np.full(series.shape, np.nan)
+
+    # the columns with missing values are smoothed over their own points
+    missing = np.isnan(series).any(axis = 0) | np.isnan(x).any()
+    for column in np.flatnonzero(missing):
+        valid = ~np.isnan(series[:, column]) & ~np.isnan(x)
+        if valid.sum() >= 2:
+            smoothed[valid, column] = local_linear(
+                x[valid], series[valid, column], frac)
+    complete = np.flatnonzero(~missing)
+    if len(complete) == 0:
+        return smoothed.reshape(values.shape)
+    series = series[:, complete]
+
+    n = len(x)
+    k = int(frac * n + 1e-10)
+    if k < 2:
+        raise ValueError("frac is too small: less than two points in each "
+                         "neighbourhood")
+    left = neighbourhoods(x, k)
+    fitted = np.empty(series.shape)
+    remaining = np.arange(n)
+
+    # uniformly sampled: the points with their neighbourhood in the same
+    # position share the same weights (one convolution)
+    steps = np.diff(x)
+    if n > 2 * k and np.all(np.abs(steps - steps.mean()) <=
+                            1e-6 * abs(steps.mean())):
+        offset = left - np.arange(n)
+        middle = n // 2
+        interior = np.flatnonzero(offset == offset[middle])
+        kernel = local_weights(x, np.array([middle]), left, k)[1][0]
+        convolved = fftconvolve(series, kernel[::-1, None], axes = 0)
+        fitted[interior] = convolved[interior + offset[middle] + k - 1]
+        remaining = np.flatnonzero(offset != offset[middle])
+
+    # the other points, fitted in blocks (as sparse rows of weights)
+    for start in range(0, len(remaining), block_size):
+        points = remaining[start:start + block_size]
+        columns, weights = local_weights(x, points, left, k)
+        rows = sparse.csr_matrix((weights.ravel(), columns.ravel(),
+                                  np.arange(0, weights.size + 1, k)),
+                                 shape = (len(points), n))
+        fitted[points] = rows @ series
+
+    smoothed[:, complete] = fitted
+
+    return smoothed.reshape(values.shape)
+
+
+# smoothers with a common interface (see smooth)
+smoothers = {"savgol": savgol,
+             "local_linear": local_linear}
+
+
+def smooth(values, method="savgol", x=None, **settings):
+    """
+    Smooths the columns of an array with one of the smoothers
+
+    Parameters:
+    ----------
+    values: series to smooth (time x channels, or a single series)
+        np.ndarray
+
+    method: "savgol" or "local_linear"
+        str
+
+    x: positions of the points (only used by local_linear)
+        np.ndarray
+
+    settings: settings of the smoother (window_length and polyorder for
+              savgol, frac for local_linear)
+
+    Returns:
+    -------
+    smoothed: smoothed series (same shape as values)
+        np.ndarray
+    """
+    if method not in smoothers:
+        raise ValueError(f"Unknown smoother {method}, use one of "
+                         f"{list(smoothers)}")
+    if method == "local_linear":
+        if x is None:
+            x = np.arange(len(values))
+        return local_linear(x, values, **settings)
+
+    return smoothers[method](values, **settings)
+
+
+def smooth_columns(df, columns, method="savgol", x_column=None,
+                   suffix="_smooth", **settings):
+    """
+    Smooths some columns of a data frame at once and adds the smoothed
+    columns to it (in place, in a single assignment)
+
+    Parameters:
+    ----------
+    df: data frame with the series
+        pd.DataFrame
+
+    columns: names of the columns to smooth
+        list
+
+    method: see smooth
+        str
+
+    x_column: column with the positions of the points (only used by
+              local_linear, None for equally spaced points)
+        str
+
+    suffix: added to the names of the smoothed columns (overwritten if they
+            already exist)
+        str
+
+    settings: see smooth
+
+    Returns:
+    -------
+    df: the same data frame, with the smoothed columns
+        pd.DataFrame
+    """
+    columns = list(columns)
+    if len(columns) == 0:
+        return df
+    x = None if x_column is None else df[x_column].to_numpy()
+    smoothed = smooth(df[columns].to_numpy(dtype = float), method, x,
+                      **settings)
+    df[[f"{column}{suffix}" for column in columns]] = smoothed
+
+    return df
+
+
+def family_settings(family, **settings):
+    """
+    Returns the smoother and settings of a family of variables
+
+    Parameters:
+    ----------
+    family: name of the family (see smoothing_families)
+        str
+
+    settings: settings that replace those of the family (ignored if None)
+
+    Returns:
+    -------
+    settings: "method" and the settings of the smoother (see smooth)
+        dict
+    """
+    if family not in smoothing_families:
+        raise ValueError(f"Unknown family {family}, use one of "
+                         f"{list(smoothing_families)}")
+    settings = {**smoothing_families[family],
+                **{name: value for name, value in settings.items()
+                   if value is not None}}
+
+    return settings
+
+
+def smooth_family(df, columns, family, x_column=None, suffix="_smooth",
+                  **settings):
+    """
+    Smooths some columns of a data frame with the settings of their family
+    of variables (see smooth_columns)
+
+    Parameters:
+    ----------
+    df, columns, x_column, suffix: see smooth_columns
+
+    family: name of the family (see smoothing_families)
+        str
+
+    settings: settings that replace those of the family (ignored if None)
+
+    Returns:
+    -------
+    df: the same data frame, with the smoothed columns
+        pd.DataFrame
+    """
+    df = smooth_columns(df, columns, x_column = x_column, suffix = suffix,
+                        **family_settings(family, **settings))
+
+    return df
+
+
+def open_stream(family, **settings):
+    """
+    Opens a stream to smooth a series with savgol in consecutive chunks
+
+    Parameters:
+    ----------
+    family: name of the family (see smoothing_families)
+        str
+
+    settings: settings that replace those of the family (ignored if None)
+
+    Returns:
+    -------
+    stream: state of the stream ("settings", "columns" smoothed, "buffer"
+            with the last rows received and "emitted", the number of those
+            rows already returned)
+        dict
+    """
+    settings = family_settings(family, **settings)
+    if settings.pop("method") != "savgol":
+        raise ValueError(f"The {family} family can not be smoothed in "
+                         "chunks (only savgol)")
+    stream = {"settings": settings,
+              "columns": None,
+              "buffer": None,
+              "emitted": 0}
+
+    return stream
+
+
+def smooth_stream(stream, df, columns, final=False, suffix="_smooth"):
+    """
+    Smooths the next chunk of a series (see smooth_columns). The last rows
+    received are held until the rows after them arrive (half the window),
+    so the rows returned may lag those of the chunk
+
+    Parameters:
+    ----------
+    stream: see open_stream
+        dict
+
+    df: next rows of the series (None if there are no more)
+        pd.DataFrame
+
+    columns: names of the columns to smooth (None for those of the previous
+             chunk)
+        list
+
+    final: True for the last chunk, to return all the rows held
+        bool
+
+    suffix: see smooth_columns
+        str
+
+    Returns:
+    -------
+    df: rows completed, with the smoothed columns (possibly empty)
+        pd.DataFrame
+    """
+    window_length = stream["settings"]["window_length"]
+    half = window_length // 2
+    if columns is None:
+        columns = stream["columns"]
+    stream["columns"] = columns
+    buffer = df if stream["buffer"] is None else (
+        stream["buffer"] if df is None else pd.concat([stream["buffer"], df]))
+    if buffer is None:
+        return pd.DataFrame()
+
+    # the first rows are only known once a whole window has been received
+    if len(buffer) < window_length:
+        if final and len(buffer) > stream["emitted"]:
+            raise ValueError("The series is shorter than the window")
+        stream["buffer"] = buffer
+        return buffer.iloc[:0]
+
+    # the rows whose window is complete (all of them at the end), smoothed
+    # with the rows before them as in the whole series
+    last = len(buffer) if final else len(buffer) - half
+    completed = smooth_columns(buffer.copy(), columns, suffix = suffix,
+                               **stream["settings"]).iloc[
+        stream["emitted"]:last].copy()
+
+    # keep the rows held and one window before them
+    stream["buffer"] = buffer.iloc[max(last - window_length + half, 0):]
+    stream["emitted"] = last - max(last - window_length + half, 0)
+
+    return completed
+
+
+def lowess_difference(x, values, frac=0.05, reference=None):
+    """
+    Compares the local linear smoother with statsmodels lowess
+
+    Parameters:
+    ----------
+    x, values, frac: see local_linear
+        np.ndarray
+
+    reference: output of lowess (same shape as values). None to calculate it
+               with statsmodels (lowess(..., it = 0, return_sorted = False)
+               for each column)
+        np.ndarray
+
+    Returns:
+    -------
+    difference: largest absolute difference of each column
+        np.ndarray
+    """
+    x = np.asarray(x, dtype = float)
+    values = np.asarray(values, dtype = float)
+    series = values.reshape(len(x), -1)
+    if reference is None:
+        from statsmodels.nonparametric.smoothers_lowess import lowess
+        reference = np.column_stack([
+            lowess(series[:, column], x, frac = frac, it = 0,
+                   return_sorted = False)
+            for column in range(series.shape[1])])
+    reference = np.asarray(reference, dtype = float).reshape(series.shape)
+
+    smoothed = local_linear(x, series, frac)
+    difference = np.nanmax(np.abs(smoothed - reference), axis = 0)
+
+    return difference
@@ -0,0 +1,284 @@
+"""
+Disk cache for the outputs of the analysis stages.
+
+The output of a stage for one experiment is pickled into the stage cache
+folder, under a key that hashes the name of the stage, the experiment, the
+settings used by the stage (its section of the registry and any setting
+outside it, e.g. the smoothing families or the default arguments of the
+functions it calls, see function_defaults), the contents of its input files
+and the source code of the stage (see stage_code). A stage is only
+recalculated when one of those changes, so changing one parameter of Gamma
+only recalculates the Gamma stages that use it.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+
+from experiment_registry import address_stage_cache
+
+# hashes of the files already read in this session, keyed by file state
+_file_hashes = {}
+
+
+def file_hash(file_address):
+    """
+    Calculates the sha256 hash of the contents of a file.
+
+    The hash is remembered for the current session as long as the size and
+    modification time of the file do not change. Folders (e.g. the frames
+    extracted from a video) are hashed from the name, size and modification
+    time of the files they contain, since reading every file would take as
+    long as the stage itself.
+
+    Parameters:
+    ----------
+    file_address: address of the file or folder
+        str
+
+    Returns:
+    -------
+    digest: hexadecimal hash of the file
+        str
+    """
+    if os.path.isdir(file_address):
+        sha = hashlib.sha256()
+        for file in sorted(os.listdir(file_address)):
+            status = os.stat(os.path.join(file_address, file))
+            sha.update(f"{file}:{status.st_size}:{status.st_mtime_ns}".encode(
+                "utf-8"))
+        return sha.hexdigest()
+
+    status = os.stat(file_address)
+    state = (os.path.abspath(file_address), status.st_size,
+             status.st_mtime_ns)
+    if state not in _file_hashes:
+        sha = hashlib.sha256()
+        with open(file_address, "rb") as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                sha.update(block)
+        _file_hashes[state] = sha.hexdigest()
+
+    return _file_hashes[state]
+
+
+def stage_code(*functions):
+    """
+    Returns the source files of the functions run by a stage, whose contents
+    are part of the key of the stage (see stage_key)
+
+    Parameters:
+    ----------
+    functions: functions run by the stage (one per module is enough)
+        callable
+
+    Returns:
+    -------
+    code_files: addresses of the source files
+        list
+    """
+    code_files = sorted({inspect.getsourcefile(function)
+                         for function in functions})
+
+    return code_files
+
+
+def function_defaults(*functions):
+    """
+    Returns the default arguments of the functions run by a stage (e.g. the
+    Cd of calculation_massflow), to add them to the settings of the stage
+
+    Parameters:
+    ----------
+    functions: functions run by the stage with some default arguments
+        callable
+
+    Returns:
+    -------
+    defaults: default value of every argument that has one, by function
+        dict
+    """
+    defaults = {function.__name__: {
+        name: parameter.default for name, parameter in
+        inspect.signature(function).parameters.items()
+        if parameter.default is not inspect.Parameter.empty}
+        for function in functions}
+
+    return defaults
+
+
+def stage_key(stage, experiment, config, input_files, code_files=()):
+    """
+    Calculates the key that identifies the output of a stage
+
+    Parameters:
+    ----------
+    stage: name of the stage
+        str
+
+    experiment: name of the experiment
+        str
+
+    config: settings used by the stage (its section of the registry, and
+            the settings outside it)
+        dict
+
+    input_files: addresses of the files read by the stage
+        list
+
+    code_files: source files of the stage (see stage_code)
+        list
+
+    Returns:
+    -------
+    key: hexadecimal hash
+        str
+    """
+    description = {"stage": stage,
+                   "experiment": experiment,
+                   "config": config,
+                   "inputs": [file_hash(file) for file in input_files],
+                   "code": [file_hash(file) for file in code_files]}
+    serialized = json.dumps(description, sort_keys = True, default = str)
+    key = hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    return key
+
+
+def cache_address(stage, experiment, key):
+    """
+    Returns the address of the cached output of a stage
+
+    Parameters:
+    ----------
+    stage: name of the stage
+        str
+
+    experiment: name of the experiment
+        str
+
+    key: key calculated with stage_key
+        str
+
+    Returns:
+    -------
+    address: address of the pickle file
+        str
+    """
+    address = os.path.join(address_stage_cache, stage,
+                           f"{experiment}_{key[:16]}.pkl")
+
+    return address
+
+
+def is_cached(stage, experiment, config, input_files, code_files=()):
+    """
+    Checks if the output of a stage is already in the cache
+
+    Parameters:
+    ----------
+    see cached_stage
+
+    Returns:
+    -------
+    cached: True if the stage does not need to be recalculated
+        bool
+    """
+    key = stage_key(stage, experiment, config, input_files, code_files)
+    cached = os.path.exists(cache_address(stage, experiment, key))
+
+    return cached
+
+
+def cached_stage(stage, experiment, config, input_files, function,
+                 *args, code_files=(), **kwargs):
+    """
+    Returns the output of a stage, either from the cache or by calling the
+    function that calculates it (and then saving it in the cache)
+
+    Older outputs of the same stage and experiment are removed, so the cache
+    only keeps the latest version.
+
+    Parameters:
+    ----------
+    stage: name of the stage
+        str
+
+    experiment: name of the experiment
+        str
+
+    config: settings used by the stage (its section of the registry, and
+            the settings outside it)
+        dict
+
+    input_files: addresses of the files read by the stage
+        list
+
+    function: function that calculates the output of the stage. Called as
+              function(*args, **kwargs)
+        callable
+
+    code_files: source files of the stage (see stage_code)
+        list
+
+    Returns:
+    -------
+    output: output of the stage
+        object
+    """
+    key = stage_key(stage, experiment, config, input_files, code_files)
+    address = cache_address(stage, experiment, key)
+
+    if os.path.exists(address):
+        print(f" {stage} for {experiment}: loaded from cache")
+        with open(address, "rb") as handle:
+            return pickle.load(handle)
+
+    print(f" {stage} for {experiment}: calculating")
+    output = function(*args, **kwargs)
+
+    # remove the outdated outputs and save the new one
+    folder = os.path.dirname(address)
+    os.makedirs(folder, exist_ok = True)
+    for file in os.listdir(folder):
+        if file.startswith(f"{experiment}_") and file.endswith(".pkl"):
+            os.remove(os.path.join(folder, file))
+    with open(address, "wb") as handle:
+        pickle.dump(output, handle)
+
+    return output
+
+
+def saved_results(file_address, experiments=None):
+    """
+    Returns the results of every experiment saved in a pickle by a previous
+    run, so that a stage which collects the results of all the experiments
+    only recalculates the selected ones and keeps the others
+
+    Parameters:
+    ----------
+    file_address: address of the pickle with a {experiment: results}
+                  dictionary
+        str
+
+    experiments: experiments that are recalculated (None for all, in which
+                 case nothing is kept)
+        list
+
+    Returns:
+    -------
+    results: results of the experiments that are not recalculated
+        dict
+    """
+    if experiments is None or not os.path.exists(file_address):
+        return {}
+
+    with open(file_address, "rb") as handle:
+        results = pickle.load(handle)
+
+    results = {experiment: results[experiment] for experiment in results
+               if experiment not in experiments}
+
+    return results
@@ -3,33 +3,76 @@ This script uploads temperatures from each test.
 This data is taken from Alastair's summary file, and it has already been
 cleaned to a point. It then renames the columns to distribute them by
 thermocouple tree and stores all the raw data into one picke file.
+
+Each test is cached (see stage_cache.py), and the spreadsheets are read
+through the ingestion cache (see excel_cache.py), so a spreadsheet is only
+parsed again when it changes.
 """
 
-import pandas as pd
-import numpy as np
+import os
 import pickle
+import sys
 import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import (address_unprocessed_data,
+                                 experiment_config,
+                                 experiments_with)
+from excel_cache import read_workbook
+from stage_cache import cached_stage, saved_results, stage_code
+
+# raw data of all the tests, saved in this same folder
+address_temperatures_raw = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "temperatures_rawdata.pkl")
+
+
+def temperatures_file_address(test_name):
+    """
+    Returns the address of the temperature spreadsheet of a test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
 
-all_raw_data = {}
+    Returns:
+    -------
+    file_address: address of the spreadsheet
+        str
+    """
+    config = experiment_config(test_name, "temperatures")
+    file_address = os.path.join(address_unprocessed_data, "temperature",
+                                config["file_name"])
 
-# iterate over all tests
-for test_name in ["Alpha2", "Beta1", "Beta2", "Gamma"]:
+    return file_address
+
+
+def upload_temperatures(test_name):
+    """
+    Uploads the temperatures of both data loggers of one test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    raw_data: data frame of each data logger
+        dict
+    """
     start = time.time()
-    
     print(f"Uploading and parsing data from {test_name}")
-    all_raw_data[test_name] = {}
-    
-    # upload the data from both data loggers
-    file_address = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                    r"hermalRadiation_BREexperiments/unprocessed_data/t"
-                    f"emperature/{test_name}_GasPhaseTemperatures.xlsx")
-
-    # two data loggers means two different data frames
-    df_A = pd.read_excel(file_address, sheet_name = "LoggerA")
-    df_B = pd.read_excel(file_address, sheet_name = "LoggerB")
-
-    # parse the data
-    for df in [df_A, df_B]:
+    config = experiment_config(test_name, "temperatures")
+    raw_data = {}
+
+    # two data loggers means two different data frames (read in one go)
+    sheets = read_workbook(temperatures_file_address(test_name),
+                           config["sheet_names"])
+    for sheet_name in config["sheet_names"]:
+        df = sheets[sheet_name]
+
         # convert time to seconds
         df.loc[:, "testing_time"] = df.loc[:, "testing_time"] * 60
 
@@ -38,11 +81,63 @@ for test_name in ["Alpha2", "Beta1", "Beta2", "Gamma"]:
             new_col_name = column.split("<")[1].split(">")[0]
             df.loc[:, new_col_name] = df.loc[:, column]
 
-    all_raw_data[test_name]["LoggerA"] = df_A
-    all_raw_data[test_name]["LoggerB"] = df_B
-    
+        raw_data[sheet_name] = df
+
     print(f" time taken: {np.round(time.time() - start,2)} seconds")
-    
-file_address = "temperatures_rawdata.pkl"
-with open(file_address, "wb") as handle:
-    pickle.dump(all_raw_data, handle)
+
+    return raw_data
+
+
+def temperatures_stage(test_name):
+    """
+    Returns the raw temperatures of one test, from the stage cache if
+    neither the spreadsheet, the registry nor the code have changed
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    raw_data: data frame of each data logger
+        dict
+    """
+    raw_data = cached_stage("temperatures", test_name,
+                            experiment_config(test_name, "temperatures"),
+                            [temperatures_file_address(test_name)],
+                            upload_temperatures, test_name,
+                            code_files = stage_code(upload_temperatures,
+                                                    read_workbook))
+
+    return raw_data
+
+
+def save_temperatures(experiments=None):
+    """
+    Saves the raw temperatures of all the tests into one pickle file
+
+    Parameters:
+    ----------
+    experiments: only recalculate these experiments and keep the others
+                 from the saved file (None for all)
+        list
+
+    Returns:
+    -------
+    None
+    """
+    all_raw_data = saved_results(address_temperatures_raw, experiments)
+
+    # iterate over all tests
+    for test_name in experiments_with("temperatures", experiments):
+        all_raw_data[test_name] = temperatures_stage(test_name)
+
+    with open(address_temperatures_raw, "wb") as handle:
+        pickle.dump(all_raw_data, handle)
+
+    return None
+
+
+if __name__ == "__main__":
+    save_temperatures()
@@ -8,75 +8,40 @@ This script also uploads and plots the data from the doorway.
 Finally, it condenses the data into one dictionary, where every entry is
 a data frame (per experiment) and saves it as temperatures.pkl in the
 processed data folder
+
+Condensing (condense_temperatures) and plotting each test
+(plot_temperatures) are independent, so the pipeline runner can run them
+separately. All the channels of a logger (and of the doorway) share a time
+base, so they are resampled together with one resampling plan, which is
+saved next to the raw data (see alignment.py).
 """
 
+import os
+import sys
 import matplotlib.pyplot as plt
 from matplotlib import cm
 import numpy as np
 import pickle
 import time
-import pandas as pd
-
-# import data
-file_address = "temperatures_rawdata.pkl"
-with open(file_address, "rb") as handle:
-    all_raw_data = pickle.load(handle)
-
-"""
-Import doorway data . It is assumed that air coming in is at ambient
-temperature
-"""
-file_address = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                r"hermalRadiation_BREexperiments/processed_data/Doo"
-                r"r_Temperatures.pkl")
-with open(file_address, "rb") as handle:
-    door_data = pickle.load(handle)
 
-list_of_experiments = list(all_raw_data.keys())
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from alignment import align_sources, time_grid
+from experiment_registry import (address_processed_data,
+                                 address_repository,
+                                 experiments_with)
+from data_store import save_family
 
-# condense the data from the TC trees and from the other into one dictionary
-all_condensed_data = {}
-for experiment in list_of_experiments:
-    start = time.time()
+# raw data (see 0_upload_and_pickle.py), doorway data and condensed data
+address_temperatures_raw = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "temperatures_rawdata.pkl")
+address_door_temperatures = os.path.join(address_processed_data,
+                                         "Door_Temperatures.pkl")
+address_condensed = os.path.join(address_processed_data,
+                                 "temperatures_condensed.pkl")
 
-    print(f"Condensing data of {experiment} into a single data frame")
-    all_condensed_data[experiment] = pd.DataFrame()
-    new_time = np.linspace(0, 3600, 3601)
-    all_condensed_data[experiment].loc[:, "testing_time"] = new_time
-
-    # interpolate door data to 1 Hz frequency
-    door_temperatures = door_data[experiment]
-    for column in door_temperatures:
-        if column != "testing_time":
-            old_time = door_temperatures["testing_time"]
-            old_temperature = door_temperatures[column]
-            new_temperature = np.interp(new_time, old_time,
-                                        old_temperature.astype("float64"))
-
-            # save the interpolated data in the condensed data frame
-            new_column_name = "TD" + column.split("_")[1]
-            all_condensed_data[experiment][new_column_name] = new_temperature
-
-    # interpolate the compartment data to 1Hz frequency
-    compartment_temperatures = all_raw_data[experiment]
-    for logger in compartment_temperatures:
-        for column in compartment_temperatures[logger]:
-            if column != "testing_time":
-                if "<" not in column:
-                    old_time = compartment_temperatures[logger]["testing_time"]
-                    old_temperature = compartment_temperatures[logger][column]
-                    new_temperature = np.interp(new_time, old_time,
-                                                old_temperature)
-
-                    # save the interpolated data in the condensed data frame
-                    all_condensed_data[experiment][column] = new_temperature
-
-# save all_condensed_data as a pickle
-condensed_address = (r"C:/Users/s1475174/Documents/Python_Projects/Thermal"
-                     r"Radiation_BREexperiments/processed_dat"
-                     r"a/temperatures_condensed.pkl")
-with open(condensed_address, "wb") as handle:
-    pickle.dump(all_condensed_data, handle)
+# resampling plans of the logger time bases (see alignment.cached_plan)
+address_resampling_plans = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "resampling_plans")
 
 list_useful_cols = [f"T{x}" for x in [11, 12, 13, 21, 22, 23, 31, 32, 33,
                                       "XX"]]
@@ -91,10 +56,94 @@ location_plot = {"TXX": (0,1),
 colors = cm.get_cmap('cividis', len(list_useful_cols))
 linestyles = ["-", "--", "-.", ":"] * 3
 
-# plot
-for test_name in ["Alpha1", "Alpha2", "Beta1", "Beta2", "Gamma"]:
-    if test_name == "Alpha1":
-        continue
+
+def load_data():
+    """
+    Uploads the raw temperatures and the doorway data.
+    It is assumed that air coming in is at ambient temperature
+
+    Returns:
+    -------
+    all_raw_data: data frame of each data logger for each test
+        dict
+
+    door_data: doorway temperatures of each test
+        dict
+    """
+    with open(address_temperatures_raw, "rb") as handle:
+        all_raw_data = pickle.load(handle)
+    with open(address_door_temperatures, "rb") as handle:
+        door_data = pickle.load(handle)
+
+    return all_raw_data, door_data
+
+
+def condense_temperatures():
+    """
+    Condenses the data from the TC trees and from the doorway of each test
+    into one data frame at 1 Hz and saves them as a pickle in the processed
+    data folder
+
+    Returns:
+    -------
+    None
+    """
+    all_raw_data, door_data = load_data()
+    list_of_experiments = list(all_raw_data.keys())
+
+    # condense the data from the TC trees and from the other into one
+    # dictionary
+    all_condensed_data = {}
+    new_time = time_grid(1, 0, 3600)
+    for experiment in list_of_experiments:
+
+        print(f"Condensing data of {experiment} into a single data frame")
+
+        # door data, with the names used in the condensed data frame
+        door_temperatures = door_data[experiment]
+        door_temperatures = door_temperatures.rename(columns = {
+            column: "TD" + column.split("_")[1]
+            for column in door_temperatures if column != "testing_time"})
+        sources = [(door_temperatures, [column for column in door_temperatures
+                                        if column != "testing_time"])]
+
+        # compartment data (one source per logger)
+        compartment_temperatures = all_raw_data[experiment]
+        for logger in compartment_temperatures:
+            df = compartment_temperatures[logger]
+            sources.append((df, [column for column in df
+                                 if column != "testing_time" and
+                                 "<" not in column]))
+
+        # interpolate all the data to 1 Hz frequency at once
+        all_condensed_data[experiment] = align_sources(
+            sources, new_time, plan_folder = address_resampling_plans)
+
+    # save all_condensed_data as a pickle
+    with open(address_condensed, "wb") as handle:
+        pickle.dump(all_condensed_data, handle)
+
+    # and into the columnar store (see data_store.py)
+    save_family("temperatures_condensed", all_condensed_data)
+
+    return None
+
+
+def plot_temperatures(test_name):
+    """
+    Plots the raw temperatures of the TC trees and the doorway of one test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    None
+    """
+    all_raw_data, door_data = load_data()
+
     start = time.time()
 
     print(f"Creating plot for {test_name}")
@@ -190,9 +239,18 @@ for test_name in ["Alpha1", "Alpha2", "Beta1", "Beta2", "Gamma"]:
     print(f" time taken: {np.round(time.time() - start,2)} seconds")
 
     # save and close
-    figure_address = (r"C:\Users\s1475174\Documents\Python_Projects\Thermal"
-                      r"Radiation_BREexperiments\plotting\onevariable_allexp"
-                      r"eriments\temperature"
-                      f"s\{test_name}_temperatures.png")
+    figure_address = os.path.join(address_repository, "plotting",
+                                  "onevariable_allexperiments", "temperatures",
+                                  f"{test_name}_temperatures.png")
     fig.savefig(figure_address, dpi = 600)
     plt.close(fig)
+
+    return None
+
+
+if __name__ == "__main__":
+    condense_temperatures()
+
+    # plot
+    for test_name in experiments_with("temperatures"):
+        plot_temperatures(test_name)
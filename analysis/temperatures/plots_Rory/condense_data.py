@@ -3,15 +3,25 @@ Plots for proposal. Rory. July 2020.
 This script takes the data from Alpha2, Beta 1 and Gamma.
 Condenses the data into one data frame.
 Saves the data as a condensed_data.pickle
+The channels of each logger are resampled together, with one resampling plan
+per time base saved in the same resampling_plans folder as 1_plot_rawdata.py
+(see alignment.py).
 """
 
 # import libraries
-import matplotlib.pyplot as plt
-from matplotlib import cm
-import numpy as np
+import os
 import pickle
-import time
-import pandas as pd
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+from alignment import align_sources, time_grid
+
+# resampling plans of the logger time bases (see alignment.cached_plan),
+# shared with 1_plot_rawdata.py
+address_resampling_plans = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "resampling_plans")
 
 # import data
 file_address = "Temperatures_Raw.pkl"
@@ -28,38 +38,28 @@ list_of_experiments = ["Alpha2", "Beta1", "Gamma"]
 height = 2 
 
 all_condensed_data = {}
+new_time = time_grid(1, 0, 3600)
 for experiment in list_of_experiments:
-    start = time.time()
     
     print(f"Condensing data of {experiment} into a single data frame")
-    all_condensed_data[experiment] = pd.DataFrame()
-    new_time = np.linspace(0,3600,3601)
-    all_condensed_data[experiment].loc[:,"testing_time"] = new_time
     
-    # interpolate door data to 1 Hz frequency
-    door_temperatures = door_data[experiment]
-    for column in door_temperatures:
-        if column != "testing_time":
-            old_time = door_temperatures["testing_time"]
-            old_temperature = door_temperatures[column]
-            new_temperature = np.interp(new_time, old_time, old_temperature)
-            
-            # save the interpolated data in the condensed data frame
-            new_column_name = "TD-" + column.split("_")[1]
-            all_condensed_data[experiment][new_column_name] = new_temperature
+    # door data, with the names used in the condensed data frame
+    door_temperatures = door_data[experiment].rename(columns = {
+        column: "TD-" + column.split("_")[1]
+        for column in door_data[experiment] if column != "testing_time"})
+    sources = [(door_temperatures, [column for column in door_temperatures
+                                    if column != "testing_time"])]
     
-    # interpolate the compartment data to 1Hz frequency
+    # compartment data (one source per logger)
     compartment_temperatures = all_raw_data[experiment]
     for logger in compartment_temperatures:
-        for column in compartment_temperatures[logger]:
-            if column != "testing_time":
-                if "<" not in column:
-                    old_time = compartment_temperatures[logger]["testing_time"]
-                    old_temperature = compartment_temperatures[logger][column]
-                    new_temperature = np.interp(new_time, old_time, old_temperature)
-                    
-                    # save the interpolated data in the condensed data frame
-                    all_condensed_data[experiment][column] = new_temperature
+        df = compartment_temperatures[logger]
+        sources.append((df, [column for column in df
+                             if column != "testing_time" and "<" not in column]))
+    
+    # interpolate all the data to 1Hz frequency at once
+    all_condensed_data[experiment] = align_sources(
+        sources, new_time, plan_folder = address_resampling_plans)
 
 with open("condensed_data.pickle", "wb") as handle:
     pickle.dump(all_condensed_data, handle)
\ No newline at end of file
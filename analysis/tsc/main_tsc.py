@@ -1,39 +1,114 @@
 """
-This code uploads the already pickled TSC data, operates on it, parses the
-data that is needed and then saves it as a dictionary in the processed data
-folder
+This code calculates the incident heat flux (IHF) of the thin-skin
+calorimeters of each test from the raw disc temperatures (see tsc_ihf.py),
+parses the data that is needed and then saves it as a dictionary in the
+processed data folder
 
+Each test is cached (see stage_cache.py), so it is only recalculated when
+its raw disc temperatures, its tsc section of the experiment registry, the
+smoothing of the IHF or the code change.
 """
 
+import os
 import pickle
+import sys
 
-TSC = {}
+# import my own functions
+from tsc_ihf import calculate_ihf, n_sensors, raw_file_address
 
-# iterate over the four tests to be analysed
-for test_name in ["Alpha2", "Beta2", "Gamma"]:
-    
-    # upload the pickled files from the unprocessed data folder
-    file_address = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                    r"hermalRadiation_BREexperiments/unprocessed_data/t"
-                    f"sc_data/{test_name}_TSC.pkl")
-    
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import (address_processed_data,
+                                 experiment_config,
+                                 experiments_with)
+from data_store import save_family
+from smoothing import family_settings
+from stage_cache import (cached_stage, function_defaults, saved_results,
+                         stage_code)
+
+
+def upload_tsc(test_name):
     """
-    data already processed by me previously (see the jupyter notebook in
-                                             the unprocesseded data folder)
+    Calculates the IHF of the TSCs of one test and only retains the smoothed
+    IHF
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    df: testing time (s) and smoothed IHF of each TSC
+        pd.DataFrame
     """
-    with open(file_address, "rb") as handle:
-        TSC[test_name] = pickle.load(handle)
-        
+    df = calculate_ihf(test_name)
+
     # only retain the columns of interest
-    TSC[test_name].drop(columns = TSC[test_name].columns[1:-8],
-                        inplace=True)
-    TSC[test_name].rename(columns = {"Elapsed_time": "testing_time"},
-                          inplace=True)
-    TSC[test_name].loc[:, "testing_time"] = TSC[test_name].loc[
-        :, "testing_time"] * 60
-
-# save all the external HRR data as a pickle in processed data
-file_address_save = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                     r"hermalRadiation_BREexperiments/processed_data/TSC.pkl")
-with open(file_address_save, 'wb') as handle:
-    pickle.dump(TSC, handle)
+    df = df.iloc[:, [0] + list(range(-n_sensors, 0))].copy()
+    df.rename(columns = {"Elapsed_time": "testing_time"}, inplace=True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"] * 60
+
+    return df
+
+
+def tsc_stage(test_name):
+    """
+    Returns the TSC data of one test, from the stage cache if neither the
+    raw disc temperatures, the registry, the smoothing nor the code have
+    changed
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    df: testing time (s) and smoothed IHF of each TSC
+        pd.DataFrame
+    """
+    config = {**experiment_config(test_name, "tsc"),
+              "settings": {"smoothing": family_settings("tsc_ihf"),
+                           "defaults": function_defaults(calculate_ihf)}}
+    df = cached_stage("tsc", test_name, config, [raw_file_address(test_name)],
+                      upload_tsc, test_name,
+                      code_files = stage_code(upload_tsc, calculate_ihf,
+                                              family_settings))
+
+    return df
+
+
+def save_tsc(experiments=None):
+    """
+    Saves the TSC data of all the tests as a pickle in the processed data
+    folder
+
+    Parameters:
+    ----------
+    experiments: only recalculate these experiments and keep the others
+                 from the saved files (None for all)
+        list
+
+    Returns:
+    -------
+    None
+    """
+    file_address_save = os.path.join(address_processed_data, "TSC.pkl")
+    TSC = saved_results(file_address_save, experiments)
+
+    # iterate over the tests to be analysed
+    for test_name in experiments_with("tsc", experiments):
+        TSC[test_name] = tsc_stage(test_name)
+
+    # save all the TSC data as a pickle in processed data
+    with open(file_address_save, 'wb') as handle:
+        pickle.dump(TSC, handle)
+
+    # and into the columnar store (see data_store.py)
+    save_family("TSC", TSC)
+
+    return None
+
+
+if __name__ == "__main__":
+    save_tsc()
@@ -3,21 +3,23 @@ This script plots the TSC data for all experiments and saves it in the
 plotting folder
 """
 
-import pickle
+import os
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import load
 
-# load TSC data
-file_address_load = (r"C:/Users/s1475174/Documents/Python_Projects/T"
-                     r"hermalRadiation_BREexperiments/processed_data/TSC.pkl")
-with open(file_address_load, 'rb') as handle:
-    all_data = pickle.load(handle)
+
+# load TSC data of the first hour from the store (see data_store.py)
+test_name = ["Alpha2", "Beta2", "Gamma"]
+all_data = {test: load("TSC", test, time_range = (0, 3600))
+            for test in test_name}
 
 
 
 # Plotting 
-test_name = ["Alpha2", "Beta2", "Gamma"]
 fontsize_legend = 6   
 heights = [0.6, 1.1, 1.6, 2.1]
 distances = ["2m", "4m"]
@@ -0,0 +1,245 @@
+"""
+Incident heat flux (IHF) measured by the thin-skin calorimeters (TSC).
+
+The IHF is calculated from an energy balance on the disc of each TSC, from
+its temperature and the rate at which it changes (calibrations performed in
+January 2018, see Radiation_analysis.ipynb in unprocessed_data/tsc_data).
+The eight TSCs of a test are calculated at once, as columns of an array, and
+their IHF is smoothed as in the notebook (lowess with frac = 0.05, see
+smoothing.local_linear).
+
+The ambient temperature of each test is taken from its tsc section of the
+experiment registry.
+"""
+
+import os
+import pickle
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import (address_unprocessed_data,
+                                 experiment_config,
+                                 experiments_with)
+from smoothing import local_linear, smoothing_families
+
+# constants used in the IHF equation
+ALPHA_disc = 0.8 # absorptivity (-)
+MASS_disc = 4.6566*10**(-6) # kg
+AREA_disc = 7.854*10**(-7) # m2
+GAMMA_factor = 0.7 # (-)
+EPSILON_disc = 0.75 # (-) emissivity
+STEFAN_BOLTZ = 5.670367*10**(-8) # W⋅m^−2⋅K^−4
+CONVEC_COEFF = 10 # assumed constant W⋅m^-2⋅K-1
+
+# number of TSCs of every test
+n_sensors = 8
+
+# schemes used to calculate the derivative of the temperature (see
+# temperature_derivative)
+derivative_schemes = ["forward", "backward", "central"]
+
+# fraction of the points used to smooth the IHF (lowess in the notebook)
+smoothing_frac = smoothing_families["tsc_ihf"]["frac"]
+
+
+def c_disc(x):
+    """
+    Calculates the correction factor as a function of the disc's temperature
+    """
+    return -5.5282e-4*x + 0.5520
+
+
+def heat_cap(x):
+    """
+    Calculates the heat capacity of the disc as a function of temperature
+    """
+    return (x+273.15)*0.2125 + 382.32
+
+
+def temperature_derivative(time, temperatures, scheme="forward"):
+    """
+    Calculates the rate of change of the temperature of the discs
+
+    Parameters:
+    ----------
+    time: time of each measurement in seconds
+        np.ndarray
+
+    temperatures: temperature of each disc (time x sensors) in Celsius
+        np.ndarray
+
+    scheme: "forward" (difference with the next measurement, zero for the
+            last one, as in the original notebook), "backward" (difference
+            with the previous measurement, zero for the first one) or
+            "central" (second order, see np.gradient)
+        str
+
+    Returns:
+    -------
+    dT: rate of change of the temperature (time x sensors) in Celsius per
+        second
+        np.ndarray
+    """
+    time = np.asarray(time, dtype = float)
+    temperatures = np.asarray(temperatures, dtype = float)
+    if scheme not in derivative_schemes:
+        raise ValueError(f"Unknown derivative scheme {scheme}, use one of "
+                         f"{derivative_schemes}")
+
+    dT = np.zeros_like(temperatures)
+    if len(time) < 2:
+        return dT
+
+    if scheme == "central":
+        return np.gradient(temperatures, time, axis = 0)
+
+    slopes = np.diff(temperatures, axis = 0) / np.diff(time)[:, None]
+    if scheme == "forward":
+        dT[:-1] = slopes
+    else:
+        dT[1:] = slopes
+
+    return dT
+
+
+def incident_hf(T, dT, amb_T):
+    """
+    Calculates the IHF from an energy balance on the disc (Juan's paper on
+    TSCs)
+
+    Parameters:
+    ----------
+    T: temperature of the discs in Celsius (any shape, e.g. time x sensors)
+        np.ndarray
+
+    dT: rate of change of the temperature in Celsius per second (same shape
+        as T)
+        np.ndarray
+
+    amb_T: ambient temperature in Celsius
+        float
+
+    Returns:
+    -------
+    IHF: incident heat flux in W/m2 (same shape as T)
+        np.ndarray
+    """
+    return (1/(ALPHA_disc*(1-c_disc(T))))*((GAMMA_factor*(MASS_disc/AREA_disc)*heat_cap(T)*dT) + \
+                                           (EPSILON_disc * STEFAN_BOLTZ*(T+273.15)**4) + CONVEC_COEFF*(T-amb_T))
+
+
+def raw_file_address(test_name):
+    """
+    Returns the address of the disc temperatures of a test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    file_address: address of the pickle file
+        str
+    """
+    config = experiment_config(test_name, "tsc")
+    file_address = os.path.join(address_unprocessed_data, "tsc_data",
+                                config["raw_file_name"])
+
+    return file_address
+
+
+def load_temperatures(test_name):
+    """
+    Loads the disc temperatures of a test
+
+    Parameters:
+    ----------
+    test_name: name of the test
+        str
+
+    Returns:
+    -------
+    df: elapsed time (min) and temperature of each TSC (eTSC_1 to eTSC_8)
+        pd.DataFrame
+    """
+    # pickled with Python 2
+    with open(raw_file_address(test_name), "rb") as handle:
+        df = pickle.load(handle, encoding = "latin1")
+
+    return df
+
+
+def calculate_ihf(test_name, scheme="forward", df=None, frac=smoothing_frac):
+    """
+    Calculates the rate of change of the temperature and the IHF of every
+    TSC of a test
+
+    Parameters:
+    ----------
+    test_name: name of the test (for its ambient temperature)
+        str
+
+    scheme: scheme of the derivative of the temperature (see
+            temperature_derivative)
+        str
+
+    df: elapsed time (min) and temperature of each TSC. None to load them
+        (see load_temperatures)
+        pd.DataFrame
+
+    frac: fraction of the points used to smooth the IHF (see
+          smoothing.local_linear). None not to smooth it
+        float
+
+    Returns:
+    -------
+    df: elapsed time, temperatures, dT/dt_1 to dT/dt_8, IHF_1 to IHF_8 and
+        sIHF_0 to sIHF_7 (the same columns as the original notebook)
+        pd.DataFrame
+    """
+    if df is None:
+        df = load_temperatures(test_name)
+    ambient_temperature = experiment_config(test_name,
+                                            "tsc")["ambient_temperature"]
+
+    temperatures = df.iloc[:, 1:1 + n_sensors].to_numpy(dtype = float)
+    dT = temperature_derivative(df["Elapsed_time"].to_numpy() * 60,
+                                temperatures, scheme)
+    IHF = incident_hf(temperatures, dT, ambient_temperature)
+
+    sensors = range(1, n_sensors + 1)
+    columns = [df.iloc[:, :1 + n_sensors].reset_index(drop = True),
+               pd.DataFrame(dT, columns = [f"dT/dt_{i}" for i in sensors]),
+               pd.DataFrame(IHF, columns = [f"IHF_{i}" for i in sensors])]
+
+    # the eight TSCs smoothed at once (numbered from 0 in the notebook)
+    if frac is not None:
+        sIHF = local_linear(df["Elapsed_time"].to_numpy(), IHF, frac)
+        columns.append(pd.DataFrame(sIHF, columns = [
+            f"sIHF_{i}" for i in range(n_sensors)]))
+    df = pd.concat(columns, axis = 1)
+
+    return df
+
+
+def calculate_all(scheme="forward"):
+    """
+    Calculates the IHF of every test with TSCs
+
+    Parameters:
+    ----------
+    scheme: see calculate_ihf
+        str
+
+    Returns:
+    -------
+    IHF: data frame of each test (see calculate_ihf)
+        dict
+    """
+    IHF = {test_name: calculate_ihf(test_name, scheme)
+           for test_name in experiments_with("tsc")}
+
+    return IHF
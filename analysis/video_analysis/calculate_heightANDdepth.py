@@ -1,4 +1,80 @@
 import cv2
+import numpy as np
+
+
+def flame_edges(flame, heights):
+    """
+    Finds the edges of the flame at several heights
+
+    The contour is rasterized once (only within its bounding box), and the
+    edges at each height are the first and last pixels of that column
+    inside the flame (or on its contour). This gives the same points as
+    testing every pixel of the column with cv2.pointPolygonTest.
+
+    Parameters:
+    ----------
+    flame: contour of the flame
+        np.ndarray
+
+    heights: heights (columns of the roi) at which to find the edges
+        list
+
+    Returns:
+    --------
+    first: first row in the flame at each height (-1 if the flame does not
+           reach that height)
+        np.ndarray
+
+    last: last row in the flame at each height (-1 if the flame does not
+          reach that height)
+        np.ndarray
+    """
+    heights = np.asarray(heights, dtype = int)
+    first = np.full(heights.shape, -1)
+    last = np.full(heights.shape, -1)
+
+    # rasterize the contour within its bounding box
+    x, y, width, length = cv2.boundingRect(flame)
+    mask = np.zeros((length, width), dtype = np.uint8)
+    cv2.drawContours(mask, [flame], 0, 1, -1, offset = (-x, -y))
+
+    # only the heights within the bounding box can be in the flame
+    inside = (heights >= x) & (heights < x + width)
+    columns = mask[:, heights[inside] - x].astype(bool)
+    found = columns.any(axis = 0)
+    first_inside = np.where(found, columns.argmax(axis = 0) + y, -1)
+    last_inside = np.where(found,
+                           length - 1 - columns[::-1].argmax(axis = 0) + y,
+                           -1)
+    first[inside] = first_inside
+    last[inside] = last_inside
+
+    return first, last
+
+
+def depth_profile(flame, heights):
+    """
+    Calculates the depth of the flame at several heights
+
+    Parameters:
+    ----------
+    flame: contour of the flame
+        np.ndarray
+
+    heights: heights (columns of the roi) at which to measure the depth
+        list
+
+    Returns:
+    --------
+    depths: depth of the flame in pixels at each height (0 if the flame does
+            not reach that height)
+        np.ndarray
+    """
+    first, last = flame_edges(flame, heights)
+    depths = np.where(first < 0, 0, last - first)
+
+    return depths
+
 
 def heightANDdepth(flame, pixel_to_meters, data, roi):
     """
@@ -16,7 +92,8 @@ def heightANDdepth(flame, pixel_to_meters, data, roi):
           from each experiment
         dict
         
-    roi: region of image. 
+    roi: region of image, where the measurements are drawn (None to not
+         draw them)
         np.ndarray
 
     Returns:
@@ -66,51 +143,37 @@ def heightANDdepth(flame, pixel_to_meters, data, roi):
         height_top = 0
         height_bottom = 0
         flame_projection = 0
-    else:
+    elif roi is not None:
         # draw on the frame the top and bottom heights as well as the projection
         cv2.circle(roi, top_point, 10, (0, 0, 255), 3)
         cv2.circle(roi, bottom_point, 10, (0, 0, 255), 3)
         cv2.arrowedLine(roi,pt2,pt1,color = (51,153,255),thickness = 3)
 
     # calculate the flame depth at three different heights
-    for i,height in enumerate([height_below, height_door, height_above]):
-        
+    first, last = flame_edges(flame, [height_below, height_door,
+                                      height_above])
+    depths = []
+    for height, y_first, y_last in zip(
+            [height_below, height_door, height_above], first, last):
+
         """
-        Initialize pt1 and pt2, otherwise the calculation of depth raises
-        an error
+        the edges of the flame are the first (from the edge of the roi) and
+        last (from the door) points in the flame. If the flame does not reach
+        this height both are (0, 0)
         """
-        pt1 = (0,0)
-        pt2 = (0,0)
-        
-        for y_coordinate in range(roi.shape[0]):
-            # start from the edge of roi and find where the flame ends
-            inside_flame = cv2.pointPolygonTest(flame, (height, y_coordinate),
-                                                False)
-            # if the point is in the flame
-            if inside_flame in [0,1]:
-                pt1 = (height, y_coordinate)
-                break
-            
-        for y_coordinate in range(roi.shape[0], 0, -1):
-            # start from the door and find where the flame starts
-            inside_flame = cv2.pointPolygonTest(flame, (height, y_coordinate),
-                                                False)
-            # if the point is in the flame
-            if inside_flame in [0,1]:
-                pt2 = (height, y_coordinate)
-                break
-            
+        if y_first < 0:
+            pt1 = (0, 0)
+            pt2 = (0, 0)
+        else:
+            pt1 = (height, int(y_first))
+            pt2 = (height, int(y_last))
+
         # draw the lines that indicate the depth that was measured on the image        
-        cv2.arrowedLine(roi,pt2,pt1,color = (51,153,255),thickness = 3)
-        depth = abs(pt2[1] - pt1[1])
-        
-        # assign the depth value to the corresponding variable        
-        if i == 0:
-            depth_below = depth
-        if i == 1:
-            depth_door = depth
-        if i == 2:
-            depth_above = depth
+        if roi is not None:
+            cv2.arrowedLine(roi,pt2,pt1,color = (51,153,255),thickness = 3)
+        depths.append(abs(pt2[1] - pt1[1]))
+
+    depth_below, depth_door, depth_above = depths
     
     return (height_top, height_bottom, flame_projection, depth_below,
             depth_door, depth_above)
@@ -0,0 +1,278 @@
+"""
+Checkpoints of the video analysis.
+
+The flame dimensions of an experiment are written into an array saved in
+the checkpoint folder ({experiment}_checkpoint/results.npy) and
+memory-mapped by every worker process, so they are never only in memory.
+Every process keeps a log of its own in the same folder:
+
+{name}.done: numbers of the frames already analysed (int64), written every
+             few frames after the results of those frames are flushed
+{name}.failures: one line per frame whose analysis raised an error
+                 (frame, then the error, separated by a tab)
+
+If the analysis is interrupted, it is resumed from the frames that are not
+in any .done file. The frames whose analysis raised an error are not marked
+as analysed either, so they are analysed again when resuming. The
+checkpoint is only resumed if it was created with the same key (see
+stage_cache.stage_key), i.e. the same video section of the registry,
+settings and video; otherwise it is started again.
+
+The contours of the frames analysed again after resuming are appended to
+the archive (see contour_archive.py), which keeps only one of them.
+"""
+
+import os
+import shutil
+import numpy as np
+
+
+def open_checkpoint(folder, key, shape, every=100):
+    """
+    Opens the checkpoint of an analysis, or creates a new one if it does not
+    exist or was created with a different key
+
+    Parameters:
+    ----------
+    folder: address of the checkpoint
+        str
+
+    key: key of the analysis (see stage_cache.stage_key)
+        str
+
+    shape: shape of the results array
+        tuple
+
+    every: number of frames analysed by a process between two flushes of
+           its results
+        int
+
+    Returns:
+    -------
+    checkpoint: "folder", "results" (address of the results array), "done"
+                (frames already analysed, in increasing order), "every" and
+                "resumed" (False if the checkpoint was created again)
+        dict
+    """
+    checkpoint = {"folder": folder,
+                  "results": os.path.join(folder, "results.npy"),
+                  "done": np.zeros(0, dtype = np.int64),
+                  "every": every,
+                  "resumed": False}
+
+    key_address = os.path.join(folder, "key")
+    if os.path.exists(key_address) and os.path.exists(checkpoint["results"]):
+        with open(key_address) as handle:
+            same_key = handle.read() == key
+        if same_key and np.load(checkpoint["results"],
+                                mmap_mode = "r").shape == tuple(shape):
+            checkpoint["done"] = completed_frames(folder)
+            checkpoint["resumed"] = True
+            print(f"Resuming from the checkpoint ({len(checkpoint['done'])} "
+                  "frames already analysed)")
+            return checkpoint
+
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    results = np.lib.format.open_memmap(checkpoint["results"], mode = "w+",
+                                        dtype = np.float64,
+                                        shape = tuple(shape))
+    results.flush()
+    del results
+
+    # the key is written last, so an incomplete checkpoint is not resumed
+    with open(key_address, "w") as handle:
+        handle.write(key)
+
+    return checkpoint
+
+
+def completed_frames(folder):
+    """
+    Returns the frames already analysed according to the logs of a
+    checkpoint
+
+    Parameters:
+    ----------
+    folder: address of the checkpoint
+        str
+
+    Returns:
+    -------
+    frames: frame numbers, in increasing order
+        np.ndarray
+    """
+    frames = []
+    for file in os.listdir(folder):
+        if file.endswith(".done"):
+            with open(os.path.join(folder, file), "rb") as handle:
+                done = handle.read()
+            frames.append(np.frombuffer(done[:len(done) // 8 * 8],
+                                        dtype = np.int64))
+    frames = np.unique(np.concatenate(frames)) if frames else np.zeros(
+        0, dtype = np.int64)
+
+    return frames
+
+
+def read_failures(folder):
+    """
+    Reads the failure logs of a checkpoint
+
+    Parameters:
+    ----------
+    folder: address of the checkpoint
+        str
+
+    Returns:
+    -------
+    failures: (frame, error) of every frame whose analysis raised an error
+              (the last one, if it was analysed again after resuming), in
+              the order of the frames
+        list
+    """
+    errors = {}
+    for file in sorted(os.listdir(folder)):
+        if file.endswith(".failures"):
+            with open(os.path.join(folder, file)) as handle:
+                for line in handle:
+                    if "\t" in line:
+                        frame, error = line.rstrip("\n").split("\t", 1)
+                        errors[int(frame)] = error
+    failures = sorted(errors.items())
+
+    return failures
+
+
+def open_log(folder, name, every):
+    """
+    Opens the log of a process
+
+    Parameters:
+    ----------
+    folder: address of the checkpoint
+        str
+
+    name: name of the log, different for every process writing at the same
+          time
+        str
+
+    every: number of frames analysed between two flushes of the results
+        int
+
+    Returns:
+    -------
+    log: state of the log
+        dict
+    """
+    # remove any incomplete frame number left by an interrupted analysis
+    done_address = os.path.join(folder, f"{name}.done")
+    if os.path.exists(done_address):
+        os.truncate(done_address, os.path.getsize(done_address) // 8 * 8)
+
+    log = {"done": open(done_address, "ab"),
+           "failures": open(os.path.join(folder, f"{name}.failures"), "a"),
+           "every": every,
+           "pending": []}
+
+    return log
+
+
+def log_failure(log, frame, error):
+    """
+    Writes the error raised by the analysis of a frame into a log
+
+    Parameters:
+    ----------
+    log: see open_log
+        dict
+
+    frame: number of the frame
+        int
+
+    error: error raised
+        Exception
+
+    Returns:
+    -------
+    None
+    """
+    message = " ".join(f"{type(error).__name__}: {error}".split())
+    log["failures"].write(f"{frame}\t{message}\n")
+
+    return None
+
+
+def log_frame(log, frame, results, writer=None):
+    """
+    Marks a frame as analysed, and flushes the log every few frames
+
+    Parameters:
+    ----------
+    log: see open_log
+        dict
+
+    frame: number of the frame
+        int
+
+    results: memory-mapped results array
+        np.memmap
+
+    writer: writer of the contour archive (see contour_archive.open_writer)
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    log["pending"].append(frame)
+    if len(log["pending"]) >= log["every"]:
+        flush_log(log, results, writer)
+
+    return None
+
+
+def flush_log(log, results, writer=None):
+    """
+    Saves the results and contours of the frames analysed since the last
+    flush, and then marks them as analysed
+
+    Parameters:
+    ----------
+    see log_frame
+
+    Returns:
+    -------
+    None
+    """
+    if isinstance(results, np.memmap):
+        results.flush()
+    if writer is not None:
+        writer["points"].flush()
+        writer["index"].flush()
+    log["failures"].flush()
+    log["done"].write(np.array(log["pending"], dtype = np.int64).tobytes())
+    log["done"].flush()
+    log["pending"] = []
+
+    return None
+
+
+def close_log(log, results, writer=None):
+    """
+    Flushes and closes the log of a process
+
+    Parameters:
+    ----------
+    see log_frame
+
+    Returns:
+    -------
+    None
+    """
+    flush_log(log, results, writer)
+    log["done"].close()
+    log["failures"].close()
+
+    return None
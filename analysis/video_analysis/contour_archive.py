@@ -0,0 +1,238 @@
+"""
+Archive of the contours of the flame.
+
+The contour of the flame of every analysed frame is saved in a folder
+({experiment}_flame_contours) as it is found, so the contours are never
+held in memory. Every process of the frame engine writes its own part of
+the archive (see frame_engine.py), made of two raw files:
+
+{part}.points: the points of all its contours, one after the other
+               (x, y as int16)
+{part}.index: one row per contour (frame, offset of its first point,
+              number of points) as int64
+
+The points are memory-mapped when the archive is opened, so the contour of
+any frame is loaded without reading the others.
+"""
+
+import os
+import shutil
+import numpy as np
+
+# columns of the rows of the index
+FRAME, OFFSET, LENGTH = range(3)
+
+
+def create_archive(folder):
+    """
+    Creates an empty archive (removing any previous one in the same folder)
+
+    Parameters:
+    ----------
+    folder: address of the archive
+        str
+
+    Returns:
+    -------
+    None
+    """
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+
+    return None
+
+
+def open_writer(folder, name):
+    """
+    Opens a part of an archive to write contours in it (after the contours
+    it already has, if it exists)
+
+    Parameters:
+    ----------
+    folder: address of the archive (see create_archive)
+        str
+
+    name: name of the part, different for every process writing at the same
+          time (e.g. the first frame of the chunk)
+        str
+
+    Returns:
+    -------
+    writer: state of the writer
+        dict
+    """
+    points_address = os.path.join(folder, f"{name}.points")
+    index_address = os.path.join(folder, f"{name}.index")
+
+    # remove any incomplete point or row left by an interrupted analysis
+    n_points = 0
+    if os.path.exists(points_address):
+        n_points = os.path.getsize(points_address) // 4
+        os.truncate(points_address, 4 * n_points)
+    if os.path.exists(index_address):
+        os.truncate(index_address, os.path.getsize(index_address) // 24 * 24)
+
+    writer = {"points": open(points_address, "ab"),
+              "index": open(index_address, "ab"),
+              "n_points": n_points}
+
+    return writer
+
+
+def write_contour(writer, frame, contour):
+    """
+    Appends the contour of a frame to a part of an archive
+
+    Parameters:
+    ----------
+    writer: see open_writer
+        dict
+
+    frame: number of the frame
+        int
+
+    contour: contour of the flame (as returned by cv2.findContours)
+        np.ndarray
+
+    Returns:
+    -------
+    None
+    """
+    points = contour.reshape(-1, 2).astype(np.int16)
+    writer["points"].write(points.tobytes())
+    writer["index"].write(np.array([frame, writer["n_points"], len(points)],
+                                   dtype = np.int64).tobytes())
+    writer["n_points"] += len(points)
+
+    return None
+
+
+def close_writer(writer):
+    """
+    Closes a part of an archive
+
+    Parameters:
+    ----------
+    writer: see open_writer
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    writer["points"].close()
+    writer["index"].close()
+
+    return None
+
+
+def open_archive(folder):
+    """
+    Opens an archive to read its contours
+
+    Parameters:
+    ----------
+    folder: address of the archive
+        str
+
+    Returns:
+    -------
+    archive: "frames" (frames with a contour, in increasing order), "points"
+             (memory-mapped points of each part) and "lookup" (part, offset
+             and number of points of the contour of each frame, -1 if the
+             frame has no contour). If a frame was analysed more than once
+             (see checkpoint.py), only one of its contours is kept
+        dict
+    """
+    names = sorted(file[:-len(".index")] for file in os.listdir(folder)
+                   if file.endswith(".index"))
+
+    points, indices = [], []
+    for part, name in enumerate(names):
+        n_points = os.path.getsize(os.path.join(folder,
+                                                f"{name}.points")) // 4
+        part_points = np.zeros((0, 2), dtype = np.int16)
+        if n_points > 0:
+            part_points = np.memmap(os.path.join(folder, f"{name}.points"),
+                                    dtype = np.int16, mode = "r",
+                                    shape = (n_points, 2))
+        points.append(part_points)
+
+        index = np.fromfile(os.path.join(folder, f"{name}.index"),
+                            dtype = np.int64)
+        index = index[:len(index) // 3 * 3].reshape(-1, 3)
+
+        # ignore contours that were not completely written
+        index = index[index[:, OFFSET] + index[:, LENGTH] <= n_points]
+        indices.append(np.column_stack([np.full(len(index), part), index]))
+
+    index = np.concatenate(indices) if indices else np.zeros((0, 4), np.int64)
+    frames = index[:, 1 + FRAME]
+    lookup = np.full((frames.max() + 1 if len(frames) else 0, 3), -1,
+                     dtype = np.int64)
+    lookup[frames] = index[:, [0, 1 + OFFSET, 1 + LENGTH]]
+
+    archive = {"frames": np.unique(frames),
+               "points": points,
+               "lookup": lookup}
+
+    return archive
+
+
+def load_contour(archive, frame):
+    """
+    Loads the contour of one frame from an archive
+
+    Parameters:
+    ----------
+    archive: see open_archive
+        dict
+
+    frame: number of the frame
+        int
+
+    Returns:
+    -------
+    contour: contour of the flame (as returned by cv2.findContours), None if
+             the frame has no contour
+        np.ndarray
+    """
+    if frame < 0 or frame >= len(archive["lookup"]):
+        return None
+    part, offset, length = archive["lookup"][frame]
+    if part < 0:
+        return None
+
+    points = archive["points"][part][offset:offset + length]
+    contour = points.astype(np.int32).reshape(-1, 1, 2)
+
+    return contour
+
+
+def iterate_contours(archive, first_frame=0, last_frame=None):
+    """
+    Replays the contours of an archive in the order of the frames
+
+    Parameters:
+    ----------
+    archive: see open_archive
+        dict
+
+    first_frame, last_frame: frames between which the contours are replayed
+                             (None until the last one)
+        int
+
+    Yields:
+    -------
+    frame: number of the frame
+        int
+
+    contour: contour of the flame (see load_contour)
+        np.ndarray
+    """
+    for frame in archive["frames"]:
+        if frame < first_frame or (last_frame is not None and
+                                   frame > last_frame):
+            continue
+        yield int(frame), load_contour(archive, frame)
@@ -1,6 +1,41 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import cv2
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+def measurements_text(heights, projection, depths):
+    """
+    Returns the lines of the note with the flame heights, projection and
+    depths (in meters) written on each diagnostic image
+    """
+    height_top, height_bottom = np.round(heights, 2)
+    projection = np.round(projection, 2)
+    depth_below, depth_topdoor, depth_above = np.round(depths, 2)
+
+    lines = [f"Top flame height = {height_top} m",
+             f"Bottom flame height = {height_bottom} m",
+             f"Top flame projection = {projection} m",
+             f"Depth 0.5 m below = {depth_below} m",
+             f"Depth top of door = {depth_topdoor} m",
+             f"Depth 0.5 m above = {depth_above} m"]
+
+    return lines
+
+
+def draw_flame(flame, roi):
+    """
+    Draws the contour of the flame and its ellipse on the roi (only if the
+    flame is large enough)
+    """
+    if cv2.contourArea(flame) > 4500:
+        cv2.drawContours(roi,[flame],0, (51,255,51),4)
+
+        ellipse = cv2.fitEllipse(flame)
+        cv2.ellipse(roi, ellipse, (0,255,0),3)
+
+    return None
+
 
 def createANDsave_plot(flame,roi,experiment, frame, image, heights, projection,
                        depths):
@@ -8,64 +43,96 @@ def createANDsave_plot(flame,roi,experiment, frame, image, heights, projection,
     Creates a plot that includes the flame, its contour, height and depth and
     saves it.
     This is used for evaluating the performance of the algorithm.
-    
+
+    The figure is created without pyplot, so plots can be saved from a
+    background thread (see diagnostics.py).
+
     Parameters:
     ----------
     flame: contour of the flame
         np.ndarray
-        
+
     roi: region of the image
-        np.ndarray    
-    
+        np.ndarray
+
     experiment: name of the experiment
         str
-    
+
     frame: number of the frame currently being analysed
         int
-        
+
     image: image currently being analysed
         np.ndarray
-        
+
     (height_top, height_bottom): tupple with top and bottom flame heights in pixels
         tuple
-    
+
     projection: projection of the top of the flame outwards
         float
-    
+
     (depth_below, depth_topdoor, depth_above): tupple with flame depths in pixels
         tuple
-    
+
     Returns:
     -------
     None
     """
-    
-    height_top, height_bottom = np.round(heights, 2)
-    projection = np.round(projection, 2)
-    depth_below, depth_topdoor, depth_above = np.round(depths, 2)
 
-    fig, ax = plt.subplots(1, 1, figsize=(16,9))
+    fig = Figure(figsize=(16,9))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots(1, 1)
     fig.tight_layout()
-    
+
     # add note that includes flame heights, projection and depths on each frame
-    ax.text(200, 400, 
-            (f"Top flame height = {height_top} m \nBottom flame heigh"
-             f"t = {height_bottom} m \nTop flame projection = {projection}"
-             f" m\nDepth 0.5 m below = {depth_below} m \nDepth top of doo"
-             f"r = {depth_topdoor} m \nDepth 0.5 m above = {depth_above} m"), 
+    ax.text(200, 400,
+            "\n".join(measurements_text(heights, projection, depths)),
             fontsize=18, bbox=dict(facecolor="red", alpha=0.5), ma="left",
             ha="left")
-    
-    # draw flame contour
-    if cv2.contourArea(flame) > 4500:
-        cv2.drawContours(roi,[flame],0, (51,255,51),4)
 
-        ellipse = cv2.fitEllipse(flame)
-        cv2.ellipse(roi, ellipse, (0,255,0),3)
+    # draw flame contour
+    draw_flame(flame, roi)
 
     ax.imshow(image)
 
-    plt.savefig(f"{experiment}_frames_processed/{frame}.png")
-    plt.close(fig)
-    
+    fig.savefig(f"{experiment}_frames_processed/{frame}.png")
+
     return None
+
+
+def create_overlay(flame, roi, heights, projection, depths, scale=0.5,
+                   frame=None):
+    """
+    Draws the flame, its contour, height and depth with OpenCV on a
+    downscaled copy of the region of interest. Much faster than
+    createANDsave_plot, and the images can be saved as a video.
+
+    Parameters:
+    ----------
+    flame, roi, heights, projection, depths: see createANDsave_plot
+
+    scale: scale of the image with respect to the roi
+        float
+
+    frame: number of the frame, written above the measurements (None to not
+           write it)
+        int
+
+    Returns:
+    -------
+    overlay: downscaled roi with the measurements (BGR)
+        np.ndarray
+    """
+    draw_flame(flame, roi)
+    overlay = cv2.resize(roi, None, fx = scale, fy = scale,
+                         interpolation = cv2.INTER_AREA)
+    overlay = cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR)
+
+    # add note that includes the frame, flame heights, projection and depths
+    lines = measurements_text(heights, projection, depths)
+    if frame is not None:
+        lines = [f"frame {frame}"] + list(lines)
+    for i, line in enumerate(lines):
+        cv2.putText(overlay, line, (10, 25 + 22 * i),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+    return overlay
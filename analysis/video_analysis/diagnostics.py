@@ -0,0 +1,317 @@
+"""
+Diagnostic images of the video analysis.
+
+One out of every few frames (100 by default) is drawn with its contour,
+flame height and depth to evaluate the performance of the algorithm. The
+images are rendered and saved by a background thread of each process, so
+the analysis of the frames never waits for them: if the thread falls
+behind, new diagnostic frames are dropped (and counted) instead.
+
+Settings (see default_settings):
+every: draw one out of every this many frames (None to not draw any)
+renderer: "matplotlib" for the full figure with the whole frame (see
+          createANDsave_plot) or "opencv" for a downscaled roi with the
+          measurements drawn on it (see create_overlay), which is much faster
+output: "png" (one image per frame) or "mp4" (one video per experiment, only
+        with the opencv renderer). Every process writes its images into its
+        own part of the video, and the parts are merged in the order of the
+        frames at the end of the analysis (see merge_videos)
+scale: scale of the opencv images with respect to the roi
+max_pending: number of images that can wait to be saved
+fps: frame rate of the mp4 videos
+"""
+
+import heapq
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+from contourplot_createANDsave import create_overlay, createANDsave_plot
+
+default_settings = {"every": 100,
+                    "renderer": "matplotlib",
+                    "output": "png",
+                    "scale": 0.5,
+                    "max_pending": 4,
+                    "fps": 5}
+
+
+def diagnostics_folder(experiment):
+    """
+    Returns the folder of the diagnostic images of an experiment, and the
+    folder of the parts of its video
+    """
+    folder = f"{experiment}_frames_processed"
+
+    return folder, os.path.join(folder, "video_parts")
+
+
+def start_renderer(experiment, settings=None, name="diagnostics"):
+    """
+    Starts the background thread that renders the diagnostic images of a
+    process
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    settings: see default_settings (missing keys take the default values)
+        dict
+
+    name: name of the part of the mp4 video of the process (e.g. the first
+          frame of the chunk)
+        str
+
+    Returns:
+    -------
+    renderer: state of the renderer
+        dict
+    """
+    settings = {**default_settings, **(settings or {})}
+    if settings["output"] == "mp4" and settings["renderer"] != "opencv":
+        raise ValueError("mp4 diagnostics need the opencv renderer")
+
+    folder, parts_folder = diagnostics_folder(experiment)
+    os.makedirs(folder, exist_ok = True)
+    if settings["output"] == "mp4":
+        os.makedirs(parts_folder, exist_ok = True)
+
+    # a resumed analysis does not replace the parts written before
+    video_address = os.path.join(parts_folder, f"{name}.mp4")
+    copy = 0
+    while os.path.exists(video_address):
+        copy += 1
+        video_address = os.path.join(parts_folder, f"{name}_{copy}.mp4")
+
+    renderer = {"experiment": experiment,
+                "settings": settings,
+                "executor": ThreadPoolExecutor(max_workers = 1),
+                "pending": [],
+                "dropped": 0,
+                "video_address": video_address,
+                "video": None,
+                "frames": []}
+
+    return renderer
+
+
+def is_diagnostic(frame, settings=None):
+    """
+    Checks if a diagnostic image is drawn for a frame
+
+    Parameters:
+    ----------
+    frame: number of the frame
+        int
+
+    settings: see default_settings
+        dict
+
+    Returns:
+    -------
+    diagnostic: True if the frame is drawn
+        bool
+    """
+    every = {**default_settings, **(settings or {})}["every"]
+    diagnostic = every is not None and frame % every == 0
+
+    return diagnostic
+
+
+def render(renderer, flame, roi, frame, image, heights, projection, depths):
+    """
+    Renders and saves one diagnostic image. Runs in the background thread
+    """
+    settings = renderer["settings"]
+    if settings["renderer"] == "matplotlib":
+        createANDsave_plot(flame, roi, renderer["experiment"], frame, image,
+                           heights, projection, depths)
+        return None
+
+    overlay = create_overlay(flame, roi, heights, projection, depths,
+                             settings["scale"], frame)
+    if settings["output"] == "png":
+        cv2.imwrite(f"{renderer['experiment']}_frames_processed/{frame}.png",
+                    overlay)
+    else:
+        if renderer["video"] is None:
+            renderer["video"] = cv2.VideoWriter(
+                renderer["video_address"], cv2.VideoWriter_fourcc(*"mp4v"),
+                settings["fps"], (overlay.shape[1], overlay.shape[0]))
+        renderer["video"].write(overlay)
+        renderer["frames"].append(frame)
+
+    return None
+
+
+def submit_frame(renderer, flame, roi, frame, image, heights, projection,
+                 depths):
+    """
+    Queues a diagnostic image to be rendered in the background, or drops it
+    if too many images are already waiting
+
+    The arrays must not be modified afterwards by the caller.
+
+    Parameters:
+    ----------
+    renderer: see start_renderer
+        dict
+
+    other parameters: see createANDsave_plot
+
+    Returns:
+    -------
+    None
+    """
+    for future in renderer["pending"]:
+        if future.done():
+            report_error(future)
+    renderer["pending"] = [future for future in renderer["pending"]
+                           if not future.done()]
+    if len(renderer["pending"]) >= renderer["settings"]["max_pending"]:
+        renderer["dropped"] += 1
+        return None
+
+    renderer["pending"].append(renderer["executor"].submit(
+        render, renderer, flame, roi, frame, image, heights, projection,
+        depths))
+
+    return None
+
+
+def report_error(future):
+    """
+    Prints the error raised while rendering a diagnostic image, if any (a
+    diagnostic image never stops the analysis)
+    """
+    if future.exception() is not None:
+        print("diagnostic image not saved:", future.exception())
+
+    return None
+
+
+def close_renderer(renderer):
+    """
+    Waits until all the diagnostic images are saved and closes the renderer
+
+    Parameters:
+    ----------
+    renderer: see start_renderer
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    renderer["executor"].shutdown(wait = True)
+    for future in renderer["pending"]:
+        report_error(future)
+    if renderer["video"] is not None:
+        renderer["video"].release()
+
+        # frames of the part, to merge it with the others (see merge_videos)
+        np.savetxt(f"{os.path.splitext(renderer['video_address'])[0]}.frames",
+                   renderer["frames"], fmt = "%d")
+    if renderer["dropped"]:
+        print(f"{renderer['dropped']} diagnostic images were dropped")
+
+    return None
+
+
+def clear_videos(experiment, settings=None):
+    """
+    Removes the parts of the mp4 video of an experiment left by a previous
+    analysis (before starting a new one, not when resuming it)
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    settings: see default_settings
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    settings = {**default_settings, **(settings or {})}
+    parts_folder = diagnostics_folder(experiment)[1]
+    if settings["output"] == "mp4" and os.path.isdir(parts_folder):
+        shutil.rmtree(parts_folder)
+
+    return None
+
+
+def part_frames(address):
+    """
+    Reads the images of a part of the mp4 video with their frame numbers
+    (see close_renderer), sorted by frame: a process of the pool can analyse
+    its chunks in any order
+    """
+    frames = np.atleast_1d(np.loadtxt(f"{os.path.splitext(address)[0]}.frames",
+                                      dtype = int))
+    images = []
+    video = cv2.VideoCapture(address)
+    for frame in frames:
+        read, image = video.read()
+        if not read:
+            break
+        images.append((int(frame), image))
+    video.release()
+
+    return sorted(images, key = lambda item: item[0])
+
+
+def merge_videos(experiment, settings=None):
+    """
+    Merges the parts of the mp4 video written by every process into one
+    video of the experiment, in the order of the frames, and removes the
+    parts
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    settings: see default_settings
+        dict
+
+    Returns:
+    -------
+    video_address: address of the video (None if there are no parts)
+        str
+    """
+    settings = {**default_settings, **(settings or {})}
+    folder, parts_folder = diagnostics_folder(experiment)
+    if settings["output"] != "mp4" or not os.path.isdir(parts_folder):
+        return None
+    parts = [os.path.join(parts_folder, file)
+             for file in sorted(os.listdir(parts_folder))
+             if file.endswith(".mp4") and os.path.exists(os.path.join(
+                 parts_folder, f"{os.path.splitext(file)[0]}.frames"))]
+    if not parts:
+        return None
+
+    # a frame analysed again after resuming is only written once
+    video_address = os.path.join(folder, f"{experiment}_diagnostics.mp4")
+    video = None
+    last_frame = None
+    for frame, image in heapq.merge(*[part_frames(part) for part in parts],
+                                    key = lambda item: item[0]):
+        if frame == last_frame:
+            continue
+        if video is None:
+            video = cv2.VideoWriter(
+                video_address, cv2.VideoWriter_fourcc(*"mp4v"),
+                settings["fps"], (image.shape[1], image.shape[0]))
+        video.write(image)
+        last_frame = frame
+    if video is not None:
+        video.release()
+    shutil.rmtree(parts_folder)
+
+    return video_address
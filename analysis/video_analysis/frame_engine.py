@@ -0,0 +1,1095 @@
+"""
+Frame analysis engine of the video analysis.
+
+The frames of a video are independent of each other, so they are split into
+chunks that are analysed by several worker processes. The flame dimensions
+of every frame are written directly into arrays in shared memory (allocated
+once for the whole video), or in a memory-mapped file to resume the
+analysis if it is interrupted (see checkpoint.py), and every worker saves
+the contours of the flame in its own part of the contour archive (see
+contour_archive.py).
+
+Besides the depth at three heights, the depth of the flame can be measured
+at regular intervals along the whole height of the region of interest (see
+profile_heights).
+
+The diagnostic images of every 100th frame are rendered in the background
+(see diagnostics.py), and a video of them is merged in the order of the
+frames at the end.
+
+Only the region of interest of each frame is processed (optionally, only a
+window around the flame of the previous frame, see tracking_window): its
+value channel is calculated directly from the BGR image (without converting
+it to RGB or HSV), and the intermediate images are kept in buffers that are
+reused for every frame. The full frame is only converted to RGB for the
+frames that are plotted. The time taken by each step is reported at the
+end. The window depends on the previous frame, so with tracking the frames
+are analysed in order by a single process.
+
+The frames are read from a video or from a folder of images (see
+frame_source.py). With a folder, every worker reads its own chunks of
+frames. A video is better decoded sequentially, so it can instead be
+decoded by one process that copies the region of interest of each frame
+into a ring of slots in shared memory, from which the workers analyse it in
+place. The decoder waits when all the slots are in use, so the memory used
+is fixed by the number of slots. This module is separate from
+main_videoanalysis.py so that the worker processes can import it.
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+# import my own functions
+from hsv_convertANDthreshold import thresholdANDcontours, value_channel
+from calculate_heightANDdepth import depth_profile, heightANDdepth
+from checkpoint import close_log, log_failure, log_frame, open_log
+from contour_archive import (close_writer, load_contour, open_archive,
+                             open_writer, write_contour)
+from diagnostics import (clear_videos, close_renderer, is_diagnostic,
+                         merge_videos, start_renderer, submit_frame)
+from frame_source import read_frames
+
+# flame dimensions calculated for every frame (rows of the results array)
+metrics = ["flame_height_top",
+           "flame_height_bottom",
+           "flame_projection",
+           "flame_depth_below",
+           "flame_depth_topdoor",
+           "flame_depth_above",
+           "flame_area",
+           "flame_perimeter",
+           "flame_characteristic_length",
+           "flame_ellipse_length",
+           "flame_ellipse_angle"]
+(HEIGHT_TOP, HEIGHT_BOTTOM, PROJECTION, DEPTH_BELOW, DEPTH_TOPDOOR,
+ DEPTH_ABOVE, AREA, PERIMETER, CHARACTERISTIC_LENGTH, ELLIPSE_LENGTH,
+ ELLIPSE_ANGLE) = range(len(metrics))
+
+# steps of the analysis of a frame whose time is reported
+steps = ["read", "value channel", "filters and contours", "measurements",
+         "plots"]
+
+# number of chunks per worker, so that all the workers finish together
+chunks_per_worker = 4
+
+# results array, shared memory block and frame source of a worker process
+_results = None
+_shared_memory = None
+_source = None
+
+
+def profile_heights(data, pixel_to_meters, spacing):
+    """
+    Returns the heights at which the depth profile of the flame is measured
+
+    Parameters:
+    ----------
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    pixel_to_meters: ratio of meters per pixel
+        float
+
+    spacing: distance between heights in meters
+        float
+
+    Returns:
+    -------
+    heights: heights above the bottom of the door in meters
+        np.ndarray
+
+    columns: columns of the roi that correspond to those heights
+        np.ndarray
+    """
+    # heights (m) of the bottom and top of the roi
+    bottom = (data["min_y_real"] - data["door_origin"]) * pixel_to_meters
+    top = (data["max_y_real"] - data["door_origin"]) * pixel_to_meters
+
+    heights = np.arange(np.ceil(bottom / spacing) * spacing, top, spacing)
+    heights = np.round(heights, 6)
+    columns = (heights / pixel_to_meters + data["door_origin"] -
+               data["min_y_real"]).astype(int)
+
+    return heights, columns
+
+
+def tracking_window(flame, shape, margin):
+    """
+    Returns the window of the roi where the flame is searched in the next
+    frame: the bounding box of the flame plus a margin
+
+    Parameters:
+    ----------
+    flame: contour of the flame in the previous frame (None if no flame was
+           found)
+        np.ndarray
+
+    shape: shape of the roi
+        tuple
+
+    margin: margin around the bounding box in pixels (None to not track the
+            flame)
+        int
+
+    Returns:
+    -------
+    window: first and last (excluded) rows and columns of the window, None
+            to search the whole roi
+        tuple
+    """
+    if flame is None or margin is None:
+        return None
+
+    x, y, width, length = cv2.boundingRect(flame)
+    window = (max(y - margin, 0), min(y + length + margin, shape[0]),
+              max(x - margin, 0), min(x + width + margin, shape[1]))
+
+    return window
+
+
+def inside_window(contours, window, shape, edge):
+    """
+    Checks if the flame found in a window can be trusted: it must be found
+    and not touch the sides of the window (except the sides of the roi)
+
+    Parameters:
+    ----------
+    contours: contours found in the window, largest first
+        list
+
+    window: see tracking_window
+        tuple
+
+    shape: shape of the roi
+        tuple
+
+    edge: distance to the sides of the window (in pixels) at which the
+          flame is considered to touch them
+        int
+
+    Returns:
+    -------
+    inside: True if the flame is inside the window
+        bool
+    """
+    if len(contours) == 0:
+        return False
+
+    row_first, row_last, column_first, column_last = window
+    x, y, width, length = cv2.boundingRect(contours[0])
+    touches = [row_first > 0 and y - edge < row_first,
+               row_last < shape[0] and y + length + edge > row_last,
+               column_first > 0 and x - edge < column_first,
+               column_last < shape[1] and x + width + edge > column_last]
+
+    return not any(touches)
+
+
+def find_contours(roi, data, buffers, timings, window=None):
+    """
+    Finds the contours of the value channel of the roi, or of a window of it
+
+    Parameters:
+    ----------
+    roi: region of interest of the frame (BGR)
+        np.ndarray
+
+    window: see tracking_window (None for the whole roi)
+        tuple
+
+    other parameters: see analyse_frame
+
+    Returns:
+    -------
+    contours: contours found, largest first, in the coordinates of the roi
+        list
+    """
+    start = time.perf_counter()
+
+    # extract the value channel (same as converting to hsv and splitting)
+    offset = (0, 0)
+    if window is not None:
+        roi = roi[window[0]:window[1], window[2]:window[3]]
+        offset = (window[2], window[0])
+    if "value" not in buffers or buffers["value"].shape != roi.shape[:2]:
+        buffers["value"] = np.empty(roi.shape[:2], dtype = np.uint8)
+    value = value_channel(roi, buffers["value"])
+    timings["value channel"] += time.perf_counter() - start
+    start = time.perf_counter()
+
+    # apply the filters and find contours
+    thresh, contours = thresholdANDcontours(
+        value, threshold_value=data["threshold_value"], buffers=buffers,
+        kernel_size=data.get("kernel_size", 11),
+        erode_iterations=data.get("erode_iterations", 2),
+        dilate_iterations=data.get("dilate_iterations", 4), offset=offset)
+    timings["filters and contours"] += time.perf_counter() - start
+
+    return contours
+
+
+def analyse_frame(image, frame, data, pixel_to_meters, results,
+                  profile=None, buffers=None, timings=None, roi=None,
+                  diagnostics=None, window=None):
+    """
+    Calculates the flame dimensions of one frame and writes them into the
+    results array
+
+    Parameters:
+    ----------
+    image: frame under analysis (BGR, as read by cv2.imread). Only needed
+           for the frames that are plotted if roi is given
+        np.ndarray
+
+    frame: number of the frame
+        int
+
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    pixel_to_meters: ratio of meters per pixel
+        float
+
+    results: flame dimensions of every frame (metrics x frames). The depth
+             profile is saved in the rows after the metrics
+        np.ndarray
+
+    profile: columns of the roi where the depth profile is measured (None
+             to not measure it)
+        np.ndarray
+
+    buffers: arrays reused between frames (see thresholdANDcontours)
+        dict
+
+    timings: time taken by each step (see steps), to which the time taken
+             for this frame is added
+        dict
+
+    roi: region of interest of the frame (BGR). None to cut it from image
+        np.ndarray
+
+    diagnostics: settings of the diagnostic images (see diagnostics.py)
+        dict
+
+    window: window of the roi where the flame is searched (see
+            tracking_window). The whole roi is searched if the flame is not
+            found inside it. None to search the whole roi
+        tuple
+
+    Returns:
+    -------
+    image: frame with the measurements drawn on it (RGB). Only for the
+           frames that are plotted (see diagnostics.py), otherwise the BGR
+           frame
+        np.ndarray
+
+    roi: region of interest of the image (None if it is not plotted)
+        np.ndarray
+
+    flame: contour of the flame (None if no flame was found)
+        np.ndarray
+
+    error: error raised while measuring the flame (None if there was none or
+           no contour was found)
+        Exception
+    """
+    if buffers is None:
+        buffers = {}
+    if timings is None:
+        timings = dict.fromkeys(steps, 0.0)
+
+    # define region of interest
+    if roi is None:
+        roi = image[data["min_x_real"]:data["max_x_real"],
+                    data["min_y_real"]:data["max_y_real"], :]
+
+    """
+    search the flame in the window around the flame of the previous frame,
+    and in the whole roi if it is lost or touches the sides of the window
+    (within the distance that the filters spread)
+    """
+    contours = find_contours(roi, data, buffers, timings, window)
+    edge = (data.get("kernel_size", 11) // 2 +
+            data.get("erode_iterations", 2) +
+            data.get("dilate_iterations", 4) + 1)
+    if window is not None and not inside_window(contours, window,
+                                                roi.shape[:2], edge):
+        contours = find_contours(roi, data, buffers, timings)
+    start = time.perf_counter()
+
+    # only the frames that are plotted are converted to RGB, and the
+    # measurements are drawn on them
+    if is_diagnostic(frame, diagnostics) and image is not None:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        roi = image[data["min_x_real"]:data["max_x_real"],
+                    data["min_y_real"]:data["max_y_real"], :]
+    else:
+        roi = None
+
+    flame, error = measure_flame(contours, frame, data, pixel_to_meters,
+                                 results, profile, roi)
+
+    timings["measurements"] += time.perf_counter() - start
+
+    return image, roi, flame, error
+
+
+def measure_flame(contours, frame, data, pixel_to_meters, results,
+                  profile=None, roi=None):
+    """
+    Measures the flame dimensions from the contours of a frame and writes
+    them into the results array
+
+    Parameters:
+    ----------
+    contours: contours of the frame, largest first (see
+              thresholdANDcontours). The flame is the largest one
+        list
+
+    frame: number of the frame (column of the results array)
+        int
+
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    pixel_to_meters: ratio of meters per pixel
+        float
+
+    results: flame dimensions (metrics x frames), followed by the depth
+             profile
+        np.ndarray
+
+    profile: columns of the roi where the depth profile is measured (None
+             to not measure it)
+        np.ndarray
+
+    roi: region of interest (RGB) where the measurements are drawn (None to
+         not draw them)
+        np.ndarray
+
+    Returns:
+    -------
+    flame: contour of the flame (None if no flame was found)
+        np.ndarray
+
+    error: error raised while measuring the flame (None if there was none or
+           no contour was found)
+        Exception
+    """
+    flame = None
+    error = None
+
+    # try except to handle error if no contour is found
+    try:
+        # if contours are found, flame is the largest contour detected
+        results[AREA, frame] = cv2.contourArea(
+            contours[0]) * pixel_to_meters**2
+        results[PERIMETER, frame] = cv2.arcLength(
+            contours[0], True) * pixel_to_meters
+        results[CHARACTERISTIC_LENGTH, frame] = results[
+            AREA, frame] / results[PERIMETER, frame]
+        flame = contours[0]
+
+        # retrieve ellipse major axis and angle
+        ellipse = cv2.fitEllipse(flame)
+        ellipse_majoraxis = ellipse[1][0]
+        results[ELLIPSE_LENGTH, frame] = ellipse_majoraxis * pixel_to_meters
+        results[ELLIPSE_ANGLE, frame] = ellipse[2]
+
+        # calculate flame height, flame projection and flame depth
+        (height_top, height_bottom, projection, depth_below,
+         depth_topdoor, depth_above) = heightANDdepth(
+                flame, pixel_to_meters, data, roi)
+
+        """
+        for Alpha2 (angle of the camera) and Gamma (frame) I removed the
+        door from the analysis, so I need to include it into the depth
+        calculation
+        """
+        if "door_depth" in data:
+            depth_below += data["door_depth"]
+            depth_topdoor += data["door_depth"]
+            depth_above += data["door_depth"]
+            projection -= data["door_depth"]
+
+        """
+        convert all to meters (adding the height that hasn't been analysed
+                               img -> roi) and removing the height to
+        the bottom of the door
+        """
+        if height_top == 0:
+            results[HEIGHT_TOP, frame] = 0
+            results[HEIGHT_BOTTOM, frame] = 0
+        else:
+            results[HEIGHT_TOP, frame] = (
+                height_top + data["min_y_real"] -
+                data["door_origin"]) * pixel_to_meters
+            results[HEIGHT_BOTTOM, frame] = (
+                height_bottom + data["min_y_real"] -
+                data["door_origin"]) * pixel_to_meters
+            results[PROJECTION, frame] = (projection) * pixel_to_meters
+
+        results[DEPTH_BELOW, frame] = depth_below * pixel_to_meters
+        results[DEPTH_TOPDOOR, frame] = depth_topdoor * pixel_to_meters
+        results[DEPTH_ABOVE, frame] = depth_above * pixel_to_meters
+
+        # depth along the whole height of the roi
+        if profile is not None:
+            depths = depth_profile(flame, profile)
+            if "door_depth" in data:
+                depths = depths + data["door_depth"]
+            results[len(metrics):, frame] = depths * pixel_to_meters
+
+    except Exception as e:
+        # if no contours are found or an error is raised (only the errors
+        # are recorded, see record_frame)
+        if len(contours) > 0:
+            error = e
+
+    return flame, error
+
+
+def record_frame(log, frame, error, results, writer=None):
+    """
+    Records that a frame was analysed in the log of the checkpoint, or the
+    error raised by its analysis (printed if there is no checkpoint)
+
+    Parameters:
+    ----------
+    log: log of the process (see checkpoint.open_log). None if there is no
+         checkpoint
+        dict
+
+    frame: number of the frame
+        int
+
+    error: error raised by the analysis of the frame (see analyse_frame)
+        Exception
+
+    results: flame dimensions of every frame (metrics x frames)
+        np.ndarray
+
+    writer: writer of the contour archive of the process
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    if log is None:
+        if error is not None:
+            print(frame, error)
+    elif error is None:
+        log_frame(log, frame, results, writer)
+    else:
+        log_failure(log, frame, error)
+
+    return None
+
+
+def plot_frame(renderer, flame, roi, frame, image, results):
+    """
+    Queues the diagnostic image of a frame with its contour, flame height
+    and depth (see diagnostics.py)
+    """
+    submit_frame(renderer,
+                 flame,
+                 roi,
+                 frame,
+                 image,
+                 (results[HEIGHT_TOP, frame],
+                  results[HEIGHT_BOTTOM, frame]),
+                 results[PROJECTION, frame],
+                 (results[DEPTH_BELOW, frame],
+                  results[DEPTH_TOPDOOR, frame],
+                  results[DEPTH_ABOVE, frame]))
+
+    return None
+
+
+def analyse_chunk(frames, experiment, data, pixel_to_meters, profile=None,
+                  results=None, source=None, diagnostics=None, archive=None,
+                  checkpoint=None, tracking_margin=None, previous_flame=None):
+    """
+    Analyses a list of frames
+
+    Parameters:
+    ----------
+    frames: numbers of the frames to analyse
+        list
+
+    experiment: name of the experiment
+        str
+
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    pixel_to_meters: ratio of meters per pixel
+        float
+
+    profile: columns of the roi where the depth profile is measured (None
+             to not measure it)
+        np.ndarray
+
+    results: flame dimensions of every frame (metrics x frames). None to use
+             the shared array of the worker process
+        np.ndarray
+
+    source: source of the frames (see frame_source.py). None to use the
+            source of the worker process
+        dict
+
+    diagnostics: settings of the diagnostic images (see diagnostics.py)
+        dict
+
+    archive: folder of the archive where the contour of the flame of every
+             frame in which one is found is saved (see contour_archive.py).
+             None to not save them
+        str
+
+    checkpoint: checkpoint where the analysed frames and their errors are
+                logged (see checkpoint.py). None to not log them
+        dict
+
+    tracking_margin: margin (in pixels) around the flame of the previous
+                     frame where the flame is searched (see
+                     tracking_window). None to search the whole roi. The
+                     frames must be consecutive frames of the analysis
+        int
+
+    previous_flame: contour of the flame in the frame analysed before the
+                    first one, to continue tracking it (None to search the
+                    whole roi in the first frame)
+        np.ndarray
+
+    Returns:
+    -------
+    timings: time taken by each step (see steps)
+        dict
+    """
+    if results is None:
+        results = _results
+    if source is None:
+        source = _source
+
+    # the flame of the last frame in which one was found, and of the previous
+    # frame
+    flame = None
+    frame_flame = previous_flame
+    roi_shape = (data["max_x_real"] - data["min_x_real"],
+                 data["max_y_real"] - data["min_y_real"])
+    buffers = {}
+    timings = dict.fromkeys(steps, 0.0)
+    name = f"{experiment}_{frames[0] if frames else 0}"
+    renderer = start_renderer(experiment, diagnostics, name)
+    writer = None if archive is None else open_writer(archive, name)
+    log = None if checkpoint is None else open_log(
+        checkpoint["folder"], name, checkpoint["every"])
+    try:
+        start = time.perf_counter()
+        for frame, image in read_frames(source, frames):
+            timings["read"] += time.perf_counter() - start
+
+            # show the frame under analysis
+            print(frame)
+
+            # calculate the flame dimensions
+            image, roi, frame_flame, error = analyse_frame(
+                image, frame, data, pixel_to_meters, results, profile,
+                buffers, timings, diagnostics = diagnostics,
+                window = tracking_window(frame_flame, roi_shape,
+                                         tracking_margin))
+            if frame_flame is not None:
+                flame = frame_flame
+                if writer is not None:
+                    write_contour(writer, frame, flame)
+            record_frame(log, frame, error, results, writer)
+            start = time.perf_counter()
+
+            """
+            save every 100th contour as well as flame height and depth
+            (mostly for evaluating the code's performance)
+            """
+            if is_diagnostic(frame, diagnostics) and flame is not None:
+                plot_frame(renderer, flame, roi, frame, image, results)
+                timings["plots"] += time.perf_counter() - start
+            start = time.perf_counter()
+    finally:
+        # save what was analysed even if the analysis is interrupted
+        close_renderer(renderer)
+        if log is not None:
+            close_log(log, results, writer)
+        if writer is not None:
+            close_writer(writer)
+
+    return timings
+
+
+def print_timings(timings, n_frames):
+    """
+    Prints the time taken by each step of the analysis
+
+    Parameters:
+    ----------
+    timings: time taken by each step (see steps), added over all the workers
+        dict
+
+    n_frames: number of frames analysed
+        int
+
+    Returns:
+    -------
+    None
+    """
+    print(f"Time taken by each step ({n_frames} frames, all workers):")
+    for step in steps:
+        print(f" {step}: {timings[step]:.2f} seconds "
+              f"({1000 * timings[step] / max(n_frames, 1):.2f} ms per frame)")
+
+    return None
+
+
+def open_results(name, shape):
+    """
+    Opens the results array shared between processes
+
+    Parameters:
+    ----------
+    name: name of the shared memory block, or address of the memory-mapped
+          results of a checkpoint (.npy, see checkpoint.py)
+        str
+
+    shape: shape of the results array
+        tuple
+
+    Returns:
+    -------
+    results: results array
+        np.ndarray
+
+    memory: shared memory block (None for a checkpoint), to be closed when
+            the array is no longer used
+        multiprocessing.shared_memory.SharedMemory
+    """
+    if name.endswith(".npy"):
+        return np.load(name, mmap_mode = "r+"), None
+
+    memory = shared_memory.SharedMemory(name = name)
+    results = np.ndarray(shape, dtype = np.float64, buffer = memory.buf)
+
+    return results, memory
+
+
+def attach_results(name, shape, source):
+    """
+    Attaches a worker process to the shared results array and to the source
+    of the frames
+
+    Parameters:
+    ----------
+    name: name of the shared memory block, or address of the results of a
+          checkpoint (see open_results)
+        str
+
+    shape: shape of the results array
+        tuple
+
+    source: source of the frames (see frame_source.py)
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    global _results, _shared_memory, _source
+    _results, _shared_memory = open_results(name, shape)
+    _source = source
+
+    return None
+
+
+def decode_to_ring(source, frames, data, ring_name, ring_shape, free_slots,
+                   filled, n_workers, diagnostics=None):
+    """
+    Decodes frames and copies their region of interest into the free slots
+    of the ring. Runs in its own process
+
+    Parameters:
+    ----------
+    source: source of the frames (see frame_source.py)
+        dict
+
+    frames: numbers of the frames to analyse
+        list
+
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    ring_name: name of the shared memory block of the ring
+        str
+
+    ring_shape: shape of the ring (slots, height, width, 3)
+        tuple
+
+    free_slots: slots that can be filled
+        multiprocessing.Queue
+
+    filled: (frame, slot, shape of the roi, full image or None) of the
+            filled slots, followed by one None per worker at the end
+        multiprocessing.Queue
+
+    n_workers: number of workers that analyse the slots
+        int
+
+    diagnostics: settings of the diagnostic images (see diagnostics.py)
+        dict
+
+    Returns:
+    -------
+    None
+    """
+    ring_memory = shared_memory.SharedMemory(name = ring_name)
+    ring = np.ndarray(ring_shape, dtype = np.uint8, buffer = ring_memory.buf)
+    try:
+        for frame, image in read_frames(source, frames):
+            roi = image[data["min_x_real"]:data["max_x_real"],
+                        data["min_y_real"]:data["max_y_real"], :]
+
+            # wait until a slot is free
+            slot = free_slots.get()
+            ring[slot, :roi.shape[0], :roi.shape[1]] = roi
+
+            # the full image is only needed for the frames that are plotted
+            filled.put((frame, slot, roi.shape[:2],
+                        image if is_diagnostic(frame, diagnostics) else None))
+    finally:
+        for worker in range(n_workers):
+            filled.put(None)
+        del ring
+        ring_memory.close()
+
+    return None
+
+
+def analyse_ring(experiment, data, pixel_to_meters, profile, results_name,
+                 results_shape, ring_name, ring_shape, free_slots, filled,
+                 output, diagnostics=None, archive=None, checkpoint=None):
+    """
+    Analyses the frames in the filled slots of the ring until the decoder
+    finishes. Runs in its own process
+
+    Parameters:
+    ----------
+    results_name, results_shape: shared results array (see open_results)
+
+    ring_name, ring_shape, free_slots, filled: see decode_to_ring
+
+    output: where the time taken by each step is put at the end
+        multiprocessing.Queue
+
+    other parameters: see analyse_chunk
+
+    Returns:
+    -------
+    None
+    """
+    results, results_memory = open_results(results_name, results_shape)
+    ring_memory = shared_memory.SharedMemory(name = ring_name)
+    ring = np.ndarray(ring_shape, dtype = np.uint8, buffer = ring_memory.buf)
+
+    flame = None
+    buffers = {}
+    timings = dict.fromkeys(steps, 0.0)
+    name = f"{experiment}_worker{os.getpid()}"
+    renderer = start_renderer(experiment, diagnostics, name)
+    writer = None if archive is None else open_writer(archive, name)
+    log = None if checkpoint is None else open_log(
+        checkpoint["folder"], name, checkpoint["every"])
+    try:
+        start = time.perf_counter()
+        while True:
+            item = filled.get()
+            timings["read"] += time.perf_counter() - start
+            if item is None:
+                break
+            frame, slot, (height, width), image = item
+
+            # show the frame under analysis
+            print(frame)
+
+            # calculate the flame dimensions from the slot, then free it
+            image, roi, frame_flame, error = analyse_frame(
+                image, frame, data, pixel_to_meters, results, profile,
+                buffers, timings, roi = ring[slot, :height, :width],
+                diagnostics = diagnostics)
+            free_slots.put(slot)
+            if frame_flame is not None:
+                flame = frame_flame
+                if writer is not None:
+                    write_contour(writer, frame, flame)
+            record_frame(log, frame, error, results, writer)
+            start = time.perf_counter()
+
+            # save every 100th contour as well as flame height and depth
+            if is_diagnostic(frame, diagnostics) and flame is not None:
+                plot_frame(renderer, flame, roi, frame, image, results)
+                timings["plots"] += time.perf_counter() - start
+            start = time.perf_counter()
+    finally:
+        # save what was analysed even if the analysis is interrupted
+        close_renderer(renderer)
+        if log is not None:
+            close_log(log, results, writer)
+        if writer is not None:
+            close_writer(writer)
+
+    output.put(timings)
+    del results, ring
+    if results_memory is not None:
+        results_memory.close()
+    ring_memory.close()
+
+    return None
+
+
+def run_ring(source, frames, experiment, data, pixel_to_meters, workers,
+             profile, results_name, results_shape, ring_slots,
+             diagnostics=None, archive=None, checkpoint=None):
+    """
+    Analyses the frames with one decoder process and several workers that
+    share a ring of slots (see decode_to_ring and analyse_ring)
+
+    Parameters:
+    ----------
+    ring_slots: number of slots of the ring
+        int
+
+    other parameters: see analyse_frames and analyse_ring
+
+    Returns:
+    -------
+    timings: time taken by each step, added over all the workers
+        dict
+    """
+    ring_shape = (ring_slots, data["max_x_real"] - data["min_x_real"],
+                  data["max_y_real"] - data["min_y_real"], 3)
+    ring_memory = shared_memory.SharedMemory(
+        create = True, size = int(np.prod(ring_shape)))
+    context = multiprocessing.get_context()
+    free_slots = context.Queue()
+    filled = context.Queue()
+    output = context.Queue()
+    for slot in range(ring_slots):
+        free_slots.put(slot)
+
+    processes = [context.Process(
+        target = decode_to_ring,
+        args = (source, frames, data, ring_memory.name, ring_shape,
+                free_slots, filled, workers, diagnostics))]
+    processes += [context.Process(
+        target = analyse_ring,
+        args = (experiment, data, pixel_to_meters, profile, results_name,
+                results_shape, ring_memory.name, ring_shape, free_slots,
+                filled, output, diagnostics, archive, checkpoint))
+        for worker in range(workers)]
+
+    try:
+        for process in processes:
+            process.start()
+
+        # collect the output of every worker (checking that none failed)
+        outputs = []
+        while len(outputs) < workers:
+            try:
+                outputs.append(output.get(timeout = 1))
+            except queue.Empty:
+                if any(process.exitcode not in [None, 0]
+                       for process in processes):
+                    raise RuntimeError("A process of the frame ring failed")
+        for process in processes:
+            process.join()
+
+        # the workers also finish cleanly if the decoder failed, so that
+        # the frames it did not decode are not left silently at zero
+        if any(process.exitcode != 0 for process in processes):
+            raise RuntimeError("A process of the frame ring failed")
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        ring_memory.close()
+        ring_memory.unlink()
+
+    timings = dict.fromkeys(steps, 0.0)
+    for worker_timings in outputs:
+        for step in steps:
+            timings[step] += worker_timings[step]
+
+    return timings
+
+
+def analyse_frames(source, frames, experiment, data, pixel_to_meters,
+                   workers=None, profile=None, ring_slots=None,
+                   diagnostics=None, archive=None, checkpoint=None,
+                   tracking_margin=None):
+    """
+    Calculates the flame dimensions of a list of frames, in parallel if more
+    than one worker is used
+
+    The results are the same regardless of the number of workers. With
+    tracking_margin the window of each frame depends on the previous frame,
+    so the frames are then analysed in order in this process (whatever the
+    number of workers), continuing the tracking from the archive when a
+    checkpoint is resumed.
+
+    Parameters:
+    ----------
+    source: source of the frames (see frame_source.py)
+        dict
+
+    frames: numbers of the frames to analyse. The results have one column
+            per frame of the source
+        list
+
+    experiment: name of the experiment
+        str
+
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    pixel_to_meters: ratio of meters per pixel
+        float
+
+    workers: number of worker processes (None for one per CPU, 1 to analyse
+             the frames in this process)
+        int
+
+    profile: columns of the roi where the depth profile is measured (None
+             to not measure it)
+        np.ndarray
+
+    ring_slots: number of slots of the ring used to share the decoded frames
+                of a video with the workers (None for every worker to
+                decode its own chunks). Not used with a folder of frames
+        int
+
+    diagnostics: settings of the diagnostic images (see diagnostics.py)
+        dict
+
+    archive: folder of an empty archive where the contours of the flame are
+             saved (see contour_archive.py). None to not save them
+        str
+
+    checkpoint: checkpoint where the results are saved while the frames are
+                analysed (see checkpoint.open_checkpoint). The frames it
+                already has are not analysed again. None to keep the results
+                in memory
+        dict
+
+    tracking_margin: margin (in pixels) around the flame of the previous
+                     frame where the flame is searched (see
+                     tracking_window). None to search the whole roi in
+                     parallel
+        int
+
+    Returns:
+    -------
+    results: flame dimensions of every frame (metrics x frames) followed by
+             the depth profile, zero for the frames that were not analysed
+        np.ndarray
+    """
+    n_profile = 0 if profile is None else len(profile)
+    shape = (len(metrics) + n_profile, source["n_frames"])
+    if workers is None:
+        workers = os.cpu_count()
+    if tracking_margin is not None:
+        workers = 1
+    if checkpoint is None or not checkpoint["resumed"]:
+        clear_videos(experiment, diagnostics)
+
+    previous_flame = None
+    if checkpoint is not None:
+        done = set(checkpoint["done"].tolist())
+        remaining = [frame for frame in frames if frame not in done]
+
+        # continue tracking the flame of the last frame analysed
+        if (tracking_margin is not None and archive is not None and
+                remaining and remaining[0] != frames[0]):
+            previous_flame = load_contour(
+                open_archive(archive), frames[frames.index(remaining[0]) - 1])
+        frames = remaining
+
+    if workers == 1 or len(frames) < 2:
+        if checkpoint is None:
+            results = np.zeros(shape)
+        else:
+            results = np.load(checkpoint["results"], mmap_mode = "r+")
+        timings = analyse_chunk(frames, experiment, data, pixel_to_meters,
+                                profile, results, source, diagnostics,
+                                archive, checkpoint, tracking_margin,
+                                previous_flame)
+        print_timings(timings, len(frames))
+        merge_videos(experiment, diagnostics)
+        return np.array(results)
+
+    # results array shared with the workers (the checkpoint itself if there
+    # is one)
+    block = None
+    if checkpoint is None:
+        block = shared_memory.SharedMemory(
+            create = True, size = max(8 * shape[0] * shape[1], 1))
+        results_name = block.name
+    else:
+        results_name = checkpoint["results"]
+    try:
+        if checkpoint is None:
+            shared_results = np.ndarray(shape, dtype = np.float64,
+                                        buffer = block.buf)
+            shared_results[:] = 0
+        else:
+            shared_results = np.load(results_name, mmap_mode = "r+")
+
+        if source["backend"] == "video" and ring_slots is not None:
+            timings = run_ring(
+                source, frames, experiment, data, pixel_to_meters, workers,
+                profile, results_name, shape, ring_slots, diagnostics,
+                archive, checkpoint)
+        else:
+            # contiguous chunks of frames (a video is only sought once per
+            # chunk)
+            chunk_size = -(-len(frames) // (workers * chunks_per_worker))
+            chunks = [frames[i:i + chunk_size]
+                      for i in range(0, len(frames), chunk_size)]
+
+            with ProcessPoolExecutor(max_workers = workers,
+                                     initializer = attach_results,
+                                     initargs = (results_name, shape,
+                                                 source)) as executor:
+                futures = [executor.submit(analyse_chunk, chunk, experiment,
+                                           data, pixel_to_meters, profile,
+                                           diagnostics = diagnostics,
+                                           archive = archive,
+                                           checkpoint = checkpoint)
+                           for chunk in chunks]
+                timings = dict.fromkeys(steps, 0.0)
+                for future in futures:
+                    chunk_timings = future.result()
+                    for step in steps:
+                        timings[step] += chunk_timings[step]
+        print_timings(timings, len(frames))
+        merge_videos(experiment, diagnostics)
+
+        results = np.array(shared_results)
+        del shared_results
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+
+    return results
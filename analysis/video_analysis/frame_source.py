@@ -0,0 +1,176 @@
+"""
+Sources of the frames analysed by the video analysis.
+
+Frames can be decoded directly from the video of the experiment with
+cv2.VideoCapture ("video" backend), or read from a folder of images
+extracted from the video beforehand ("folder" backend, the original
+layout: {experiment}_frames/...-frame{number}.png).
+
+In both cases frame k is the image at k / effective_fps seconds of the
+video, so the frame numbers (and start_externalflaming and last_frame in
+the registry) mean the same for both backends. With the video backend only
+the frames that are analysed are decoded; the ones in between are skipped
+without being converted to images.
+
+A source is a dictionary, so it can be sent to the worker processes of
+the frame engine (see frame_engine.py).
+"""
+
+import os
+import cv2
+
+
+def folder_source(folder):
+    """
+    Creates a source that reads the frames from a folder of images
+
+    Parameters:
+    ----------
+    folder: address of the folder
+        str
+
+    Returns:
+    -------
+    source: description of the source
+        dict
+    """
+    # file of each frame, in the order listed by the operating system
+    files = {}
+    for frame_name in os.listdir(folder):
+        frame = int(frame_name.split(".")[0].split("-")[1].split("e")[1])
+        files[frame] = frame_name
+
+    source = {"backend": "folder",
+              "address": folder,
+              "n_frames": len(files),
+              "files": files}
+
+    return source
+
+
+def video_source(video_address, effective_fps):
+    """
+    Creates a source that decodes the frames from a video
+
+    Parameters:
+    ----------
+    video_address: address of the video
+        str
+
+    effective_fps: number of frames analysed per second of video
+        float
+
+    Returns:
+    -------
+    source: description of the source
+        dict
+    """
+    capture = cv2.VideoCapture(video_address)
+    if not capture.isOpened():
+        raise IOError(f"Could not open the video {video_address}")
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    n_video_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+
+    source = {"backend": "video",
+              "address": video_address,
+              "n_frames": int(n_video_frames * effective_fps / fps),
+              "fps": fps,
+              "effective_fps": effective_fps}
+
+    return source
+
+
+def select_frames(source, first_frame=0, last_frame=None):
+    """
+    Returns the numbers of the frames of a source between two frames
+
+    Parameters:
+    ----------
+    source: see folder_source and video_source
+        dict
+
+    first_frame: first frame to analyse
+        int
+
+    last_frame: last frame to analyse (None until the end of the video)
+        int
+
+    Returns:
+    -------
+    frames: frame numbers, in time order
+        list
+    """
+    if source["backend"] == "folder":
+        frames = sorted(frame for frame in source["files"]
+                        if frame >= first_frame and (
+                            last_frame is None or frame <= last_frame))
+    else:
+        end = source["n_frames"] - 1
+        if last_frame is not None:
+            end = min(end, last_frame)
+        frames = list(range(first_frame, end + 1))
+
+    return frames
+
+
+def read_frames(source, frames):
+    """
+    Reads frames from a source
+
+    Frames that can not be read are skipped (and printed).
+
+    Parameters:
+    ----------
+    source: see folder_source and video_source
+        dict
+
+    frames: numbers of the frames to read. With the video backend they are
+            decoded fastest in increasing order
+        list
+
+    Yields:
+    -------
+    frame: frame number
+        int
+
+    image: image of the frame (BGR, as read by cv2.imread)
+        np.ndarray
+    """
+    if source["backend"] == "folder":
+        for frame in frames:
+            image = cv2.imread(os.path.join(source["address"],
+                                            source["files"][frame]))
+            if image is None:
+                print(frame, "could not be read")
+                continue
+            yield frame, image
+        return
+
+    capture = cv2.VideoCapture(source["address"])
+    step = source["fps"] / source["effective_fps"]
+
+    # index of the next frame of the video that will be decoded
+    position = 0
+    try:
+        for frame in frames:
+            target = int(round(frame * step))
+
+            # seek if the frame is behind or far ahead, otherwise skip the
+            # frames in between without decoding them into images
+            if target < position or target - position > 2 * step + 1:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+            while position < target and capture.grab():
+                position += 1
+
+            success = False
+            if position == target:
+                success, image = capture.read()
+                position += 1
+            if not success:
+                print(frame, "could not be decoded")
+                continue
+            yield frame, image
+    finally:
+        capture.release()
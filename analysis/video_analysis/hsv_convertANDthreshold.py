@@ -1,10 +1,180 @@
 import cv2
+import numpy as np
+
+
+def value_channel(roi, out=None):
+    """
+    This function calculates the value channel of the HSV color space of an
+    image (the maximum of its three channels), without converting the whole
+    image to HSV.
+
+    The order of the channels does not matter, so it can be used directly on
+    the BGR image read by OpenCV.
+
+    Parameters:
+    ----------
+    roi: BGR or RGB image
+        np.ndarray
+
+    out: array where the value channel is saved (same height and width as
+         roi, uint8). None to create a new one
+        np.ndarray
+
+    Returns:
+    --------
+    value: value channel
+        np.ndarray
+    """
+    if out is None:
+        out = np.empty(roi.shape[:2], dtype = np.uint8)
+    np.maximum(roi[:, :, 0], roi[:, :, 1], out = out)
+    np.maximum(out, roi[:, :, 2], out = out)
+
+    return out
+
+
+def get_buffers(buffers, names, shape):
+    """
+    Returns a dictionary of uint8 arrays reused between calls, creating the
+    missing ones (or the ones with a different shape)
+    """
+    if buffers is None:
+        buffers = {}
+    for name in names:
+        if name not in buffers or buffers[name].shape != shape:
+            buffers[name] = np.empty(shape, dtype = np.uint8)
+
+    return buffers
+
+
+def blur(value, kernel_size = 11, out = None):
+    """
+    This function applies the Gaussian filter to the value channel of an
+    image
+
+    Parameters:
+    ----------
+    value: value channel of the image (see value_channel)
+        np.ndarray
+
+    kernel_size: size of the (square) kernel of the filter, odd
+        int
+
+    out: array where the filtered image is saved. None to create a new one
+        np.ndarray
+
+    Returns:
+    --------
+    blurred: filtered value channel
+        np.ndarray
+    """
+    if out is None:
+        out = np.empty_like(value)
+    cv2.GaussianBlur(value, (kernel_size, kernel_size), 0, dst = out)
+
+    return out
+
+
+def segment(blurred, threshold_value = 230, erode_iterations = 2,
+            dilate_iterations = 4, buffers = None, offset = (0, 0)):
+    """
+    This function applies the threshold and the morphological filters to the
+    filtered value channel of an image and determines the contours
+
+    Parameters:
+    ----------
+    blurred: filtered value channel (see blur)
+        np.ndarray
+
+    threshold_value: threshold to be applied to the value channel
+        int
+
+    erode_iterations, dilate_iterations: iterations of the erosion and of
+                                         the dilation that follows it
+        int
+
+    buffers: arrays reused between calls ("thresh" and "morphology", same
+             shape as blurred). Missing ones are created and added
+        dict
+
+    offset: (x, y) added to the points of the contours, e.g. the position of
+            blurred within a larger image
+        tuple
+
+    Returns:
+	--------
+	thresh: binary image thresholded
+        np.ndarray
+    contours: all identified contours, largest first
+        list
+    """
+    buffers = get_buffers(buffers, ["thresh", "morphology"], blurred.shape)
+    thresh = buffers["thresh"]
+    morphology = buffers["morphology"]
+
+    # apply threshold and morphological filters
+    cv2.threshold(blurred, threshold_value, 255, cv2.THRESH_BINARY,
+                  dst = thresh)
+    cv2.erode(thresh, None, dst = morphology, iterations = erode_iterations)
+    cv2.dilate(morphology, None, dst = thresh,
+               iterations = dilate_iterations)
+
+    # find contours
+    # (OpenCV 3 also returns the image, so take the contours from the end)
+    contours = cv2.findContours(thresh, cv2.RETR_LIST,
+                                cv2.CHAIN_APPROX_SIMPLE,
+                                offset = offset)[-2]
+    contours = sorted(contours, key=lambda x: cv2.contourArea(x), reverse=True)
+
+    return thresh, contours
+
+
+def thresholdANDcontours(value, threshold_value = 230, buffers = None,
+                         kernel_size = 11, erode_iterations = 2,
+                         dilate_iterations = 4, offset = (0, 0)):
+    """
+    This function applies the filters and the threshold to the value channel
+    of an image and determines the contours (see blur and segment)
+
+    Parameters:
+    ----------
+    value: value channel of the image (see value_channel)
+        np.ndarray
+
+    threshold_value: threshold to be applied to the value channel
+        int
+
+    buffers: arrays reused between calls ("blurred", "thresh" and
+             "morphology", same shape as value). Missing ones are created
+             and added
+        dict
+
+    kernel_size, erode_iterations, dilate_iterations: see blur and segment
+        int
+
+    offset: see segment
+        tuple
+
+    Returns:
+	--------
+	thresh: binary image thresholded
+        np.ndarray
+    contours: all identified contours, largest first
+        list
+    """
+    buffers = get_buffers(buffers, ["blurred", "thresh", "morphology"],
+                          value.shape)
+    blurred = blur(value, kernel_size, buffers["blurred"])
+
+    return segment(blurred, threshold_value, erode_iterations,
+                   dilate_iterations, buffers, offset)
+
 
 def convertANDthreshold(roi, threshold_value = 230):
     """
     This function takes an RGB image (roi), converts the image to HSV,
     applies a threshold and determines the contours
-    
+
     The threshold is hard-coded to optimize the identification of a flame in
     the videos.
 
@@ -12,11 +182,11 @@ def convertANDthreshold(roi, threshold_value = 230):
     ----------
     img: skimage array. RGB  image.
         np.ndarray
-        
+
     threshold_value: threshold to be applied to the value channel after
                      conversion to the HSV color space
         int
-        
+
     Returns:
 	--------
 	img: binary image (roi) threhsolded
@@ -24,21 +194,8 @@ def convertANDthreshold(roi, threshold_value = 230):
     flame: all identified contours
         list
     """
-    
-    # convert to hsv and extract value channel
-    hsv_image = cv2.cvtColor(roi,cv2.COLOR_BGR2HSV)
-    _,_,value_channel = cv2.split(hsv_image)
-    
-    # apply filters and threshold
-    blurred = cv2.GaussianBlur(value_channel, (11, 11), 0)
-    _, thresh = cv2.threshold(blurred, threshold_value, 255,
-                              cv2.THRESH_BINARY)
-    thresh = cv2.erode(thresh, None, iterations=2)
-    thresh = cv2.dilate(thresh, None, iterations=4)
-    
-    # find contours
-    _,contours, _ = cv2.findContours(thresh, cv2.RETR_LIST,
-                                     cv2.CHAIN_APPROX_SIMPLE)
-    contours = sorted(contours, key=lambda x: cv2.contourArea(x), reverse=True)
-    
-    return thresh, contours
+
+    # extract value channel (same as converting to hsv and splitting)
+    value = value_channel(roi)
+
+    return thresholdANDcontours(value, threshold_value)
@@ -1,36 +1,246 @@
 """
 Main video analysis.
-Calculates flame height and depth from the videos (converted to one image
-                                                   per frame)
+Calculates flame height and depth from the videos (decoded directly, or
+converted beforehand to one image per frame, see frame_source.py)
 
 image = np.array(:,:,3) --> image(depth_dimension, height_dimension, RGB)
 Saves it in this same folder as un-smoothed data
+
+Each experiment is cached (see stage_cache.py), so it is only analysed again
+when its video (or frames), its video section of the experiment registry,
+the settings of this script or the code of the analysis change. While it is
+analysed, the results are checkpointed (see checkpoint.py), so an
+interrupted analysis is resumed where it stopped.
 """
 
-import cv2
 import numpy as np
 import os
 import pickle
+import sys
 import pandas as pd
 
 # import my own functions
 from observed_data import properties
-from hsv_convertANDthreshold import convertANDthreshold
+from frame_engine import analyse_frames, metrics, profile_heights
+from frame_source import folder_source, select_frames, video_source
+from contour_archive import create_archive
+from checkpoint import open_checkpoint, read_failures
+from hsv_convertANDthreshold import thresholdANDcontours
 from calculate_heightANDdepth import heightANDdepth
-from contourplot_createANDsave import createANDsave_plot
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import (address_unprocessed_data, experiment_config,
+                                 experiments_with)
+from stage_cache import cached_stage, saved_results, stage_code, stage_key
 
 # initialize variables
-experiments = ["Alpha2", "Beta1", "Beta2", "Gamma"]
-threshold_value = [180, 180, 180, 180]
+experiments = list(properties.keys())
 door_height = 2.15
 
 # only analyse one out of every 5 frames to decrease the computational cost
 effective_fps = 5
 
-# Create universal dictionary to contain all the data (except for contours)
-Flame_Dimensions = {}
+# spacing (m) of the heights at which the depth profile of the flame is
+# measured (None to only measure the depth at three heights)
+depth_profile_spacing = 0.05
+
+# read the frames from the "video" or from the "folder" of extracted frames
+# (None to use the video if it exists and the folder otherwise)
+frame_backend = None
+
+# number of decoded frames that can wait in shared memory to be analysed
+# when reading a video with several workers (None for every worker to
+# decode its own part of the video, see frame_engine.py)
+ring_slots = 16
+
+# margin (in pixels) around the flame of the previous frame where the flame
+# is searched, instead of the whole roi (see frame_engine.tracking_window).
+# The frames are then analysed in order by one process. None to always
+# search the whole roi (in parallel)
+tracking_margin = None
+
+# diagnostic images drawn during the analysis (see diagnostics.py), e.g.
+# {"renderer": "opencv", "output": "mp4"} for a video of downscaled overlays
+diagnostics = {"every": 100, "renderer": "matplotlib", "output": "png"}
+
+# number of frames analysed by each process between two checkpoints (None
+# to not checkpoint the analysis, which then starts again if interrupted)
+checkpoint_every = 100
+
+# folder of this script, where the frames and the results are saved
+address_video_analysis = os.path.dirname(os.path.abspath(__file__))
+address_flame_unsmoothed = os.path.join(address_video_analysis,
+                                        "Flame_Dimensions_unsmoothed.pkl")
+
+
+def frames_folder(experiment):
+    """
+    Returns the folder with the frames extracted from the video of an
+    experiment
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    folder: address of the folder
+        str
+    """
+    folder = os.path.join(address_video_analysis, f"{experiment}_frames")
+
+    return folder
+
+
+def video_address(experiment):
+    """
+    Returns the address of the video of an experiment
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    address: address of the video
+        str
+    """
+    address = os.path.join(address_unprocessed_data, "video",
+                           properties[experiment]["video_file"])
+
+    return address
+
+
+def open_frame_source(experiment):
+    """
+    Returns the source of the frames of an experiment (see frame_source.py)
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    source: source of the frames
+        dict
+    """
+    backend = frame_backend
+    if backend is None:
+        backend = ("video" if os.path.exists(video_address(experiment))
+                   else "folder")
+
+    if backend == "video":
+        source = video_source(video_address(experiment), effective_fps)
+    else:
+        source = folder_source(frames_folder(experiment))
+
+    return source
+
+
+def contours_folder(experiment):
+    """
+    Returns the folder of the archive with the contours of the flame of an
+    experiment (see contour_archive.py)
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    folder: address of the archive
+        str
+    """
+    folder = os.path.join(address_video_analysis,
+                          f"{experiment}_flame_contours")
+
+    return folder
+
+
+def checkpoint_folder(experiment):
+    """
+    Returns the folder of the checkpoint of the analysis of an experiment
+    (see checkpoint.py)
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    folder: address of the checkpoint
+        str
+    """
+    folder = os.path.join(address_video_analysis, f"{experiment}_checkpoint")
+
+    return folder
+
 
-for i, experiment in enumerate(experiments):
+def video_config(experiment, source):
+    """
+    Returns the settings the analysis of an experiment depends on: its video
+    section of the registry and the settings of this script
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    source: source of the frames (see open_frame_source)
+        dict
+
+    Returns:
+    -------
+    config: settings of the analysis
+        dict
+    """
+    config = experiment_config(experiment, "video")
+    config["effective_fps"] = effective_fps
+    config["depth_profile_spacing"] = depth_profile_spacing
+    config["frame_backend"] = source["backend"]
+    if tracking_margin is not None:
+        config["tracking_margin"] = tracking_margin
+
+    return config
+
+
+def video_code():
+    """
+    Returns the source files of the video analysis (see stage_cache.py)
+    """
+    return stage_code(analyse_video, analyse_frames, select_frames,
+                      thresholdANDcontours, heightANDdepth)
+
+
+def analyse_video(experiment, workers=None):
+    """
+    Calculates the flame dimensions in every analysed frame of one
+    experiment and saves the contours of the flame in this same folder (see
+    contour_archive.py)
+
+    The frames are analysed in parallel (see frame_engine.py), and the
+    results are the same as analysing them one by one. With tracking_margin
+    set they are analysed in order by a single process, since the window
+    searched in each frame depends on the previous one.
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    workers: number of worker processes (None for one per CPU)
+        int
+
+    Returns:
+    -------
+    df: un-smoothed flame dimensions
+        pd.DataFrame
+    """
     print(f"Calculating for experiment ... {experiment}")
     
     # extract the properties for this experiment
@@ -38,170 +248,120 @@ for i, experiment in enumerate(experiments):
 
     # determine ratio of pixels per meter
     pixel_to_meters = door_height / data["door_height_px"]
-    
-    # initialize the variables for this experiment
-    flame_contours = []
-    flame_height_top = np.zeros(len(os.listdir(f"{experiment}_frames/")))
-    flame_height_bottom = np.zeros_like(flame_height_top)
-    flame_projection = np.zeros_like(flame_height_top)
-    flame_area = np.zeros_like(flame_height_top)
-    
-    flame_depth_below = np.zeros_like(flame_height_top)
-    flame_depth_above = np.zeros_like(flame_height_top)
-    flame_depth_topdoor = np.zeros_like(flame_height_top)
-    flame_depth_above = np.zeros_like(flame_height_top)
-    flame_characteristic_length = np.zeros_like(flame_height_top)
-    flame_perimeter = np.zeros_like(flame_height_top)
-    flame_ellipse_length = np.zeros_like(flame_height_top)
-    flame_ellipse_angle = np.zeros_like(flame_height_top)
-    
-    # iterate over every frame
-    for frame_name in os.listdir(f"{experiment}_frames/"):
-        frame = int(frame_name.split(".")[0].split("-")[1].split("e")[1])
-        
-        # don't do anything before flashover
-        if frame < data["start_externalflaming"] * effective_fps:
-            continue
-        
-        """
-        don't do anything for Beta1 after flameout (it doesn't
-        re-ignite) - 21 minutes
-        """
-        if experiment == "Beta1" and frame > 6300:
-            continue
-        
-        # show the frame under analysis
-        print(frame)
-        
-        # ---- for debugging
-#        if frame < 3000:
-#            continue
-#        if frame > 5000:
-#            break
-        # ----
-        
-        # load image
-        image = cv2.imread(f"{experiment}_frames/{frame_name}")
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # define region of interest
-        roi = image[data["min_x_real"]:data["max_x_real"],
-                    data["min_y_real"]:data["max_y_real"], :]
-        
-        # convert to hsv and find contours
-        thresh, contours = convertANDthreshold(
-            roi, threshold_value=threshold_value[i])
-        
-        # try except to handle error if no contour is found
-        try:
-            # if contours are found, flame is the largest contour detected
-            flame_area[frame] = cv2.contourArea(
-                contours[0]) * pixel_to_meters**2
-            flame_perimeter[frame] = cv2.arcLength(
-                contours[0], True) * pixel_to_meters
-            flame_characteristic_length[frame] = flame_area[
-                frame] / flame_perimeter[frame]
-            flame = contours[0]
-            flame_contours.append(flame)
-            
-            # retrieve ellipse major axis and angle
-            ellipse = cv2.fitEllipse(flame)
-            ellipse_majoraxis = ellipse[1][0]
-            flame_ellipse_length[frame] = ellipse_majoraxis * pixel_to_meters
-            flame_ellipse_angle[frame] = ellipse[2]
-            
-            # calculate flame height, flame projection and flame depth
-            (height_top, height_bottom, projection, depth_below,
-             depth_topdoor, depth_above) = heightANDdepth(
-                    flame, pixel_to_meters, data, roi)
-            
-            """
-            for Alpha2 (angle of the camera) and Gamma (frame) I removed the
-            door from the analysis, so I need to include it into the depth
-            calculation
-            """
-            if experiment == "Alpha2" or experiment == "Gamma":
-                depth_below += data["door_depth"]
-                depth_topdoor += data["door_depth"]
-                depth_above += data["door_depth"]
-                projection -= data["door_depth"]
-                
-            """
-            convert all to meters (adding the height that hasn't been analysed
-                                   img -> roi) and removing the height to
-            the bottom of the door
-            """
-            if height_top == 0:
-                flame_height_top[frame] = 0
-                flame_height_bottom[frame] = 0
-            else:
-                flame_height_top[frame] = (
-                    height_top + data["min_y_real"] -
-                    data["door_origin"]) * pixel_to_meters
-                flame_height_bottom[frame] = (
-                    height_bottom + data["min_y_real"] -
-                    data["door_origin"]) * pixel_to_meters
-                flame_projection[frame] = (projection) * pixel_to_meters
-
-            flame_depth_below[frame] = depth_below * pixel_to_meters
-            flame_depth_topdoor[frame] = depth_topdoor * pixel_to_meters
-            flame_depth_above[frame] =  depth_above * pixel_to_meters
-            
-        except Exception as e:
-            # if no contours are found or an error is raised
-            print(frame, e)
-            pass
-        
-        """
-        save every 100th contour as well as flame height and depth
-        (mostly for evaluating the code's performance)
-        """
-        if frame % 100 == 0: 
-            createANDsave_plot(flame,
-                               roi,
-                               experiment,
-                               frame,
-                               image,
-                               (flame_height_top[frame],
-                                flame_height_bottom[frame]),
-                               flame_projection[frame],
-                               (flame_depth_below[frame],
-                                flame_depth_topdoor[frame],
-                                flame_depth_above[frame]))
-        
-        
-    # save the contours separately for each test
-    with open(f'{experiment}_flame_contours.pickle', 'wb') as handle:
-        pickle.dump(flame_contours, handle)
-        
+
+    """
+    select the frames to analyse: don't do anything before flashover or
+    after flameout if the flame doesn't re-ignite (Beta1 - 21 minutes)
+    """
+    source = open_frame_source(experiment)
+    frames = select_frames(source,
+                           data["start_externalflaming"] * effective_fps,
+                           data["last_frame"])
+
+    # heights of the depth profile
+    heights, profile = None, None
+    if depth_profile_spacing is not None:
+        heights, profile = profile_heights(data, pixel_to_meters,
+                                           depth_profile_spacing)
+
+    """
+    resume the analysis from the checkpoint if it was interrupted (the
+    checkpoint is started again if the video or the settings changed)
+    """
+    checkpoint = None
+    archive = contours_folder(experiment)
+    if checkpoint_every is not None:
+        n_rows = len(metrics) + (0 if heights is None else len(heights))
+        checkpoint = open_checkpoint(
+            checkpoint_folder(experiment),
+            stage_key("video", experiment, video_config(experiment, source),
+                      [source["address"]], video_code()),
+            (n_rows, source["n_frames"]), checkpoint_every)
+    if checkpoint is None or not checkpoint["resumed"]:
+        create_archive(archive)
+
+    # calculate the flame dimensions of every frame, saving the contours
+    # separately for each test as they are found
+    results = analyse_frames(source, frames, experiment, data,
+                             pixel_to_meters, workers, profile, ring_slots,
+                             diagnostics, archive, checkpoint,
+                             tracking_margin)
+
+    if checkpoint is not None:
+        failures = read_failures(checkpoint["folder"])
+        if failures:
+            print(f"{len(failures)} frames could not be analysed (see the "
+                  f"failure logs in {checkpoint['folder']})")
+
     # create data frames with the data calculated
-    df = pd.DataFrame(columns = ["testing_time",
-                                 "flame_height_top",
-                                 "flame_height_bottom",
-                                 "flame_projection",
-                                 "flame_depth_below",
-                                 "flame_depth_topdoor",
-                                 "flame_depth_above", 
-                                 "flame_area",
-                                 "flame_perimeter",
-                                 "flame_characteristic_length",
-                                 "flame_ellipse_length",
-                                 "flame_ellipse_angle"])
+    df = pd.DataFrame(columns = ["testing_time"] + metrics)
     
     # populate the data frame
     df["testing_time"] = np.linspace(0, data["total_video_duration"],
-                                     len(flame_height_top))
+                                     source["n_frames"])
+    for j, column in enumerate(metrics):
+        df[column] = results[j]
 
-    for j,column in enumerate(df.columns[1:]):
-        df[column] = [flame_height_top, flame_height_bottom, flame_projection,
-          flame_depth_below, flame_depth_topdoor, flame_depth_above,
-          flame_area, flame_perimeter, 
-          flame_characteristic_length, flame_ellipse_length, flame_ellipse_angle][j]
+    # add the depth profile (one column per height)
+    if heights is not None:
+        profile_columns = {f"flame_depth_profile_{height:.2f}":
+                           results[len(metrics) + j]
+                           for j, height in enumerate(heights)}
+        df = pd.concat([df, pd.DataFrame(profile_columns)], axis = 1)
 
-    # add the data frame to the central dictionary
-    Flame_Dimensions[experiment] = df
+    return df
 
-file_address_save = "Flame_Dimensions_unsmoothed.pkl"
-with open(file_address_save, 'wb') as handle:
-    pickle.dump(Flame_Dimensions, handle)
-    
+
+def video_stage(experiment):
+    """
+    Returns the un-smoothed flame dimensions of one experiment, from the
+    stage cache if neither the video (or frames), the registry, the settings
+    nor the code have changed
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    Returns:
+    -------
+    df: un-smoothed flame dimensions
+        pd.DataFrame
+    """
+    source = open_frame_source(experiment)
+    config = video_config(experiment, source)
+    df = cached_stage("video", experiment, config, [source["address"]],
+                      analyse_video, experiment, code_files = video_code())
+
+    return df
+
+
+def save_video(selected=None):
+    """
+    Saves the un-smoothed flame dimensions of all the experiments in this
+    same folder
+
+    Parameters:
+    ----------
+    selected: only recalculate these experiments and keep the others from
+              the saved file (None for all)
+        list
+
+    Returns:
+    -------
+    None
+    """
+    # Create universal dictionary to contain all the data (except for
+    # contours)
+    Flame_Dimensions = saved_results(address_flame_unsmoothed, selected)
+    for experiment in experiments_with("video", selected):
+        Flame_Dimensions[experiment] = video_stage(experiment)
+
+    with open(address_flame_unsmoothed, 'wb') as handle:
+        pickle.dump(Flame_Dimensions, handle)
+
+    return None
+
+
+if __name__ == "__main__":
+    save_video()
@@ -5,33 +5,54 @@ processed data folder
 
 """
 # import libraries
+import os
 import pickle
-from scipy.signal import savgol_filter
-
-# import the unsmoothed flame dimensions data
-file_address_save = "Flame_Dimensions_unsmoothed.pkl"
-with open(file_address_save, 'rb') as handle:
-    Flame_Dimensions = pickle.load(handle)
-    
-# define the smoothing parameters
-window_length = 61
-polyorder = 2
-
-# smooth the data of each column
-for experiment in Flame_Dimensions:
-    for column in Flame_Dimensions[experiment]:
-        if "time" in column:
-            continue
-        else:
-            smooth_column_name = f"{column}_smooth"
-            Flame_Dimensions[experiment].loc[
-                :, smooth_column_name] = savgol_filter(
-                    Flame_Dimensions[experiment].loc[:, column],
-                    window_length, polyorder)
-
-# save into the processed data folder
-file_address_save = (r"C:/Users/s1475174/Documents/Python_Projects/ThermalRad"
-                     r"iation_BREexperiments/processed_data/Flame_Dimens"
-                     r"ions.pkl")
-with open(file_address_save, 'wb') as handle:
-    pickle.dump(Flame_Dimensions, handle)
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiment_registry import address_processed_data
+from data_store import save_family
+from smoothing import smooth_family
+
+# un-smoothed flame dimensions (see main_videoanalysis.py)
+address_flame_unsmoothed = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "Flame_Dimensions_unsmoothed.pkl")
+address_flame_dimensions = os.path.join(address_processed_data,
+                                        "Flame_Dimensions.pkl")
+
+# the smoothing parameters are those of this family (see smoothing.py)
+family = "flame_dimensions"
+
+
+def smooth_video():
+    """
+    Smoothes every column of the flame dimensions of all the experiments and
+    saves them into the processed data folder
+
+    Returns:
+    -------
+    None
+    """
+    # import the unsmoothed flame dimensions data
+    with open(address_flame_unsmoothed, 'rb') as handle:
+        Flame_Dimensions = pickle.load(handle)
+
+    # smooth all the columns of each experiment at once
+    for experiment in Flame_Dimensions:
+        columns = [column for column in Flame_Dimensions[experiment]
+                   if "time" not in column]
+        smooth_family(Flame_Dimensions[experiment], columns, family)
+
+    # save into the processed data folder
+    with open(address_flame_dimensions, 'wb') as handle:
+        pickle.dump(Flame_Dimensions, handle)
+
+    # and into the columnar store (see data_store.py)
+    save_family("Flame_Dimensions", Flame_Dimensions)
+
+    return None
+
+
+if __name__ == "__main__":
+    smooth_video()
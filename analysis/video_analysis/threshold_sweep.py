@@ -0,0 +1,221 @@
+"""
+Sweep of the threshold and morphology settings of the flame segmentation.
+
+Evaluates a grid of settings (threshold value, size of the Gaussian kernel,
+iterations of the erosion and of the dilation) on a sample of the frames of
+an experiment, in a single pass over its video: every sampled frame is
+decoded once and its value channel is blurred once per kernel size, and
+then every threshold and morphology setting is applied to the blurred
+image. The flame dimensions are measured as in the analysis (see
+frame_engine.measure_flame).
+
+The sensitivity of the flame area and height to each setting is reported
+with respect to the current settings of the experiment (the baseline,
+always included in the grid). A setting can then be used in the analysis
+by adding it to the video section of the registry (threshold_value,
+kernel_size, erode_iterations and dilate_iterations).
+
+The report of each experiment is saved in this same folder
+({experiment}_threshold_sweep.csv).
+"""
+
+import itertools
+import os
+import numpy as np
+import pandas as pd
+
+# import my own functions
+from frame_engine import AREA, HEIGHT_TOP, measure_flame, metrics
+from frame_source import read_frames, select_frames
+from hsv_convertANDthreshold import blur, get_buffers, segment, value_channel
+from main_videoanalysis import (address_video_analysis, door_height,
+                                effective_fps, experiments, open_frame_source)
+from observed_data import properties
+
+# settings of the segmentation, in the order of the columns of the report
+settings_columns = ["threshold_value", "kernel_size", "erode_iterations",
+                    "dilate_iterations"]
+
+# default values of the settings that are not in the registry
+default_settings = {"kernel_size": 11, "erode_iterations": 2,
+                    "dilate_iterations": 4}
+
+# grid evaluated when this script is run
+thresholds = [140, 160, 180, 200, 220]
+kernel_sizes = [11]
+erode_iterations = [1, 2]
+dilate_iterations = [2, 4]
+
+# analyse one out of every this many frames (of the effective frames)
+sample_every = 25
+
+
+def baseline_settings(data):
+    """
+    Returns the current settings of the segmentation of an experiment
+
+    Parameters:
+    ----------
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    Returns:
+    -------
+    settings: threshold_value, kernel_size, erode_iterations and
+              dilate_iterations
+        tuple
+    """
+    settings = tuple(data.get(column, default_settings.get(column))
+                     for column in settings_columns)
+
+    return settings
+
+
+def sweep_frames(source, frames, data, pixel_to_meters, grid):
+    """
+    Measures the flame in a list of frames with every setting of a grid,
+    decoding and blurring each frame only once
+
+    Parameters:
+    ----------
+    source: source of the frames (see frame_source.py)
+        dict
+
+    frames: numbers of the frames to analyse
+        list
+
+    data: video properties of the experiment (see observed_data.py)
+        dict
+
+    pixel_to_meters: ratio of meters per pixel
+        float
+
+    grid: settings to evaluate, as (threshold_value, kernel_size,
+          erode_iterations, dilate_iterations)
+        list
+
+    Returns:
+    -------
+    results: flame dimensions of every setting and frame (settings x metrics
+             x frames), zero for the frames that could not be read
+        np.ndarray
+    """
+    results = np.zeros((len(grid), len(metrics), len(frames)))
+    position = {frame: i for i, frame in enumerate(frames)}
+    kernels = sorted(set(setting[1] for setting in grid))
+    buffers = {}
+
+    for frame, image in read_frames(source, frames):
+        print(frame)
+        roi = image[data["min_x_real"]:data["max_x_real"],
+                    data["min_y_real"]:data["max_y_real"], :]
+        buffers = get_buffers(buffers, ["value"] + [
+            f"blurred_{kernel}" for kernel in kernels], roi.shape[:2])
+        value = value_channel(roi, buffers["value"])
+
+        # blur once per kernel size
+        blurred = {kernel: blur(value, kernel, buffers[f"blurred_{kernel}"])
+                   for kernel in kernels}
+
+        # threshold, filter and measure with every setting
+        for i, (threshold, kernel, erode, dilate) in enumerate(grid):
+            thresh, contours = segment(blurred[kernel], threshold, erode,
+                                       dilate, buffers)
+            measure_flame(contours, position[frame], data, pixel_to_meters,
+                          results[i])
+
+    return results
+
+
+def sensitivity_report(results, grid, baseline):
+    """
+    Summarises the flame area and height measured with every setting, and
+    their change with respect to the baseline setting
+
+    Parameters:
+    ----------
+    results: see sweep_frames
+        np.ndarray
+
+    grid: see sweep_frames
+        list
+
+    baseline: baseline setting (must be in grid)
+        tuple
+
+    Returns:
+    -------
+    report: one row per setting, with the fraction of the frames where a
+            flame was found and the mean, standard deviation and mean
+            absolute change with respect to the baseline (relative to the
+            mean of the baseline) of the flame area and top height
+        pd.DataFrame
+    """
+    reference = results[grid.index(baseline)]
+    report = pd.DataFrame(grid, columns = settings_columns)
+    report["baseline"] = [setting == baseline for setting in grid]
+    report["flame_found"] = (results[:, AREA] > 0).mean(axis = 1)
+
+    for row, name in [(AREA, "flame_area"), (HEIGHT_TOP, "flame_height_top")]:
+        report[f"{name}_mean"] = results[:, row].mean(axis = 1)
+        report[f"{name}_std"] = results[:, row].std(axis = 1)
+        change = np.abs(results[:, row] - reference[row]).mean(axis = 1)
+        report[f"{name}_change"] = change / max(reference[row].mean(),
+                                                np.finfo(float).tiny)
+
+    return report
+
+
+def sweep_experiment(experiment, grid=None, sample_every=sample_every):
+    """
+    Evaluates a grid of settings of the segmentation on a sample of the
+    frames of an experiment
+
+    Parameters:
+    ----------
+    experiment: name of the experiment
+        str
+
+    grid: settings to evaluate, as (threshold_value, kernel_size,
+          erode_iterations, dilate_iterations). None for the grid of this
+          script. The baseline setting is added if it is not in it
+        list
+
+    sample_every: analyse one out of every this many frames
+        int
+
+    Returns:
+    -------
+    report: see sensitivity_report
+        pd.DataFrame
+    """
+    print(f"Sweeping the segmentation settings of ... {experiment}")
+    data = properties[experiment]
+    pixel_to_meters = door_height / data["door_height_px"]
+
+    if grid is None:
+        grid = list(itertools.product(thresholds, kernel_sizes,
+                                      erode_iterations, dilate_iterations))
+    grid = [tuple(setting) for setting in grid]
+    baseline = baseline_settings(data)
+    if baseline not in grid:
+        grid.append(baseline)
+
+    # the same frames as the analysis, sampled
+    source = open_frame_source(experiment)
+    frames = select_frames(source,
+                           data["start_externalflaming"] * effective_fps,
+                           data["last_frame"])[::sample_every]
+
+    results = sweep_frames(source, frames, data, pixel_to_meters, grid)
+    report = sensitivity_report(results, grid, baseline)
+
+    return report
+
+
+if __name__ == "__main__":
+    for experiment in experiments:
+        report = sweep_experiment(experiment)
+        report.to_csv(os.path.join(address_video_analysis,
+                                   f"{experiment}_threshold_sweep.csv"),
+                      index = False)